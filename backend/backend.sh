@@ -31,6 +31,9 @@ pip freeze > requirements.txt && echo " - Updated" || echo "[Warning] Could not
 # Test DB connection
 python3 database.py || { echo "[ERROR] DB init failed."; deactivate; exit 1; }
 
+# Apply pending database migrations
+python3 migrate.py || { echo "[ERROR] DB migrations failed."; deactivate; exit 1; }
+
 # Run FastAPI app
 echo
 echo "-------- RUNNING FASTAPI APP --------"
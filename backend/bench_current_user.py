@@ -0,0 +1,126 @@
+"""
+Authenticated endpoint latency with and without the identity cache (`utils/current_user.py`).
+
+Drives the app in process through httpx's ASGI transport against the configured
+database and reports requests per second and p50/p99 latency for:
+- GET /users/me  : profile with location (`current_user_loader`)
+- GET /posts/me  : the user's posts (`get_current_user`)
+
+Each endpoint runs twice:
+- "uncached": the identity cache is cleared before every request, so every request
+  looks the user up by Firebase UID, as before the cache existed.
+- "cached": the identity cache is used as in production.
+
+Tokens are real RS256 JWTs signed by a local key that the Firebase token verifier is
+told to trust, so verification runs locally and Google is never contacted. A bench user
+is created for the run and deleted afterwards. The lifespan is not run, so no Redis or
+background tasks are needed; the backend .env and Firebase service account file must be
+present because `main.py` is imported. Use a local database only.
+
+Usage:
+- python3 bench_current_user.py                                  # 3000 requests, 10 concurrent
+- python3 bench_current_user.py --requests 10000 --concurrency 50
+"""
+
+import asyncio
+import logging
+import sys
+import time
+import uuid
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from sqlalchemy import delete
+import main
+from database import SessionLocal
+from models import User
+from utils import current_user
+from utils.firebase_token import token_verifier
+
+logging.getLogger("httpx").setLevel(logging.WARNING) # httpx logs every request at INFO
+
+WARMUP_REQUESTS = 200
+ENDPOINTS = ("/users/me", "/posts/me")
+PROJECT_ID = "hobbymatch-bench"
+
+def bench_token(firebase_uid: str) -> str:
+    """
+    Make the token verifier trust a fresh local key and return a token it signed.
+    """
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    token_verifier.project_id = PROJECT_ID
+    token_verifier.public_keys = {"bench": key.public_key()}
+    token_verifier.keys_expire_at = float("inf")
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID, "sub": firebase_uid,
+        "iat": now, "exp": now + 3600, "email_verified": True,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": "bench"})
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, cached: bool) -> tuple[float, float, float]:
+    """
+    Send `requests` GETs to `path` from `concurrency` workers.
+
+    Returns:
+    - tuple: (requests per second, p50 ms, p99 ms)
+    """
+
+    async def get():
+        if not cached:
+            current_user._user_cache.clear()
+        response = await client.get(path)
+        response.raise_for_status()
+
+    for _ in range(WARMUP_REQUESTS):
+        await get()
+
+    latencies = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await get()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 0.50), percentile(latencies, 0.99)
+
+async def run(requests: int, concurrency: int):
+    firebase_uid = f"bench-{uuid.uuid4().hex}"
+    async with SessionLocal() as session:
+        user = User(firebase_uid=firebase_uid, name="Bench User", email=f"{firebase_uid}@example.edu")
+        session.add(user)
+        await session.commit()
+
+    headers = {"Authorization": f"Bearer {bench_token(firebase_uid)}"}
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            print(f"{requests} requests per run, {concurrency} concurrent, via httpx.ASGITransport")
+            for path in ENDPOINTS:
+                print(f"\nGET {path}")
+                for name, cached in (("uncached", False), ("cached", True)):
+                    rps, p50, p99 = await measure(client, path, requests, concurrency, cached)
+                    print(f"{name:>9}: {rps:8.0f} req/s, p50 {p50:6.2f} ms, p99 {p99:6.2f} ms")
+    finally:
+        async with SessionLocal() as session:
+            await session.execute(delete(User).where(User.firebase_uid == firebase_uid))
+            await session.commit()
+
+# Run the benchmark when executed as a script
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--requests") + 1]) if "--requests" in sys.argv else 3_000
+    c = int(sys.argv[sys.argv.index("--concurrency") + 1]) if "--concurrency" in sys.argv else 10
+    asyncio.run(run(n, c))
@@ -0,0 +1,158 @@
+"""
+HTTP middleware overhead benchmark: BaseHTTPMiddleware vs. pure ASGI middleware.
+
+Drives the app in process through httpx's ASGI transport (no server, no sockets) and
+reports requests per second and p50/p99 latency for each middleware stack:
+- "bare": the routes with no middleware, as a floor.
+- "old": CORS plus the previous `CORPMiddleware` (a `BaseHTTPMiddleware` subclass).
+- "asgi": CORS plus `CrossOriginIsolationMiddleware`, the pure ASGI replacement doing
+  the same work as "old".
+- "new": the app's current stack (`main.app`): CORS plus the pure ASGI middleware
+  in `utils/middleware.py` (request IDs and timing, COOP/COEP headers, ETags and
+  compression).
+
+Each stack is measured on:
+- GET /          : health check, no dependencies.
+- GET /users/me  : authenticated profile. The auth dependency is overridden with a
+  fixed user, so neither Firebase nor the database is contacted and only the HTTP
+  stack (routing, validation, serialization, middleware) is measured.
+
+The lifespan is not run, so no Redis, database or background tasks are needed; the
+backend .env must still be present because `main.py` is imported.
+
+Usage:
+- python3 bench_middleware.py                                  # 5000 requests, 10 concurrent
+- python3 bench_middleware.py --requests 20000 --concurrency 100
+"""
+
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+import main
+from models import User, UserRole
+from routes.users import get_current_user_with_location
+from utils.middleware import CrossOriginIsolationMiddleware
+
+logging.getLogger("httpx").setLevel(logging.WARNING) # httpx logs every request at INFO
+
+WARMUP_REQUESTS = 200
+ENDPOINTS = ("/", "/users/me")
+HEADERS = {"Authorization": "Bearer bench", "Accept-Encoding": "gzip, br", "Origin": "http://localhost:5173"}
+
+class CORPMiddleware(BaseHTTPMiddleware):
+    """
+    The previous COOP/COEP middleware from main.py, kept here as the baseline.
+    """
+
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
+        response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
+        return response
+
+def bench_user() -> User:
+    """
+    Build a detached user for the overridden auth dependency.
+    """
+
+    now = datetime.now(timezone.utc)
+    return User(
+        id=uuid.uuid4(), firebase_uid="bench", name="Bench User", email="bench@example.edu",
+        age=30, bio="Benchmarking", role=UserRole.user, is_verified=True, is_private=False,
+        created_at=now, updated_at=now, location=None,
+    )
+
+def override_auth(app: FastAPI):
+    """
+    Make the profile route's auth dependency return a fixed user.
+    """
+
+    user = bench_user()
+
+    async def current_user():
+        return user
+
+    app.dependency_overrides[get_current_user_with_location] = current_user
+
+def with_routes(*middleware) -> FastAPI:
+    """
+    Build an app with the routes of main.app, the CORS settings of main.py, and `middleware` (innermost first).
+    """
+
+    app = FastAPI()
+    app.router.routes.extend(main.app.router.routes)
+    override_auth(app)
+    if middleware:
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=main.origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+        )
+    for cls in middleware:
+        app.add_middleware(cls)
+    return app
+
+def build_stacks() -> dict:
+    override_auth(main.app)
+    return {
+        "bare": with_routes(),
+        "old": with_routes(CORPMiddleware),
+        "asgi": with_routes(CrossOriginIsolationMiddleware),
+        "new": main.app,
+    }
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> tuple[float, float, float]:
+    """
+    Send `requests` GETs to `path` from `concurrency` workers.
+
+    Returns:
+    - tuple: (requests per second, p50 ms, p99 ms)
+    """
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=HEADERS) as client:
+        for _ in range(WARMUP_REQUESTS):
+            (await client.get(path)).raise_for_status()
+
+        latencies = []
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 0.50), percentile(latencies, 0.99)
+
+async def run(requests: int, concurrency: int):
+    stacks = build_stacks()
+    print(f"{requests} requests per run, {concurrency} concurrent, via httpx.ASGITransport")
+    for path in ENDPOINTS:
+        print(f"\nGET {path}")
+        for name, app in stacks.items():
+            rps, p50, p99 = await measure(app, path, requests, concurrency)
+            print(f"{name:>6}: {rps:8.0f} req/s, p50 {p50:6.2f} ms, p99 {p99:6.2f} ms")
+
+# Run the benchmark when executed as a script
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--requests") + 1]) if "--requests" in sys.argv else 5_000
+    c = int(sys.argv[sys.argv.index("--concurrency") + 1]) if "--concurrency" in sys.argv else 10
+    asyncio.run(run(n, c))
@@ -0,0 +1,178 @@
+"""
+Counter reconciliation benchmark: `utils/post_stats.reconcile_post_stats` at 1k, 10k and 100k reactions.
+
+For each size, seeds posts with REACTIONS_PER_POST likes and COMMENTS_PER_POST comments
+each into the configured database, with every counter row zeroed (all drifted), then:
+- "drifted": reconciles with every row needing a repair.
+- "clean": reconciles again with nothing to repair (the steady-state cost).
+- "bumps": reconciles the drifted data again while another session keeps adding
+  reactions through `bump_reaction_count`, and reports the bump latency (bumps wait
+  for the batch holding their counter row) and whether any increment was lost.
+
+Seeded users, posts, reactions and comments are deleted after each size. Reconciliation
+covers every unexpired post in the database, so use a local database only.
+
+Usage:
+- python3 bench_post_stats.py                      # 1000, 10000 and 100000 reactions
+- python3 bench_post_stats.py --sizes 1000,500000
+- python3 bench_post_stats.py --batch-size 2000
+"""
+
+import asyncio
+import random
+import sys
+import time
+import uuid
+from sqlalchemy import text
+from database import engine, SessionLocal
+from models import ReactionType
+from utils.post_stats import reconcile_post_stats, bump_reaction_count, RECONCILE_BATCH_SIZE
+
+REACTIONS_PER_POST = 10
+COMMENTS_PER_POST = 3
+EMAIL_DOMAIN = "bench-post-stats.example.edu" # Marks seeded users for cleanup
+
+SEED_SQL = [
+    # One author plus REACTIONS_PER_POST reacting users (reactions are unique per post, user and type)
+    f"""
+    INSERT INTO users (id, firebase_uid, name, email)
+    SELECT gen_random_uuid(), 'bench-post-stats-' || g, 'Bench', 'user' || g || '@{EMAIL_DOMAIN}'
+    FROM generate_series(0, {REACTIONS_PER_POST}) AS g
+    """,
+    f"""
+    INSERT INTO user_posts (id, user_id, content, created_at, expires_at)
+    SELECT gen_random_uuid(), (SELECT id FROM users WHERE email = 'user0@{EMAIL_DOMAIN}'), 'bench post',
+           now(), now() + interval '1 day'
+    FROM generate_series(1, :posts)
+    """,
+    f"""
+    INSERT INTO post_stats (post_id, post_expires_at)
+    SELECT p.id, p.expires_at FROM user_posts p JOIN users u ON u.id = p.user_id
+    WHERE u.email LIKE '%@{EMAIL_DOMAIN}'
+    """,
+    f"""
+    INSERT INTO post_reactions (id, post_id, post_expires_at, user_id, type)
+    SELECT gen_random_uuid(), p.id, p.expires_at, r.id, 'like'
+    FROM user_posts p JOIN users a ON a.id = p.user_id
+    CROSS JOIN users r
+    WHERE a.email LIKE '%@{EMAIL_DOMAIN}' AND r.email LIKE '%@{EMAIL_DOMAIN}' AND r.email <> 'user0@{EMAIL_DOMAIN}'
+    """,
+    f"""
+    INSERT INTO post_comments (id, post_id, post_expires_at, user_id, content, created_at)
+    SELECT gen_random_uuid(), p.id, p.expires_at, p.user_id, 'bench comment', now()
+    FROM user_posts p JOIN users u ON u.id = p.user_id
+    CROSS JOIN generate_series(1, {COMMENTS_PER_POST})
+    WHERE u.email LIKE '%@{EMAIL_DOMAIN}'
+    """,
+    "ANALYZE user_posts",
+    "ANALYZE post_reactions",
+    "ANALYZE post_comments",
+    "ANALYZE post_stats",
+]
+
+ZERO_SQL = f"""
+UPDATE post_stats s SET like_count = 0, comment_count = 0
+FROM user_posts p JOIN users u ON u.id = p.user_id
+WHERE s.post_id = p.id AND u.email LIKE '%@{EMAIL_DOMAIN}'
+"""
+
+CLEANUP_SQL = f"DELETE FROM users WHERE email LIKE '%@{EMAIL_DOMAIN}'" # Posts and their rows cascade
+
+async def execute(*statements: str, **params):
+    async with engine.connect() as conn:
+        await conn.execute(text("SET statement_timeout = 0"))
+        for statement in statements:
+            await conn.execute(text(statement), params)
+        await conn.commit()
+
+async def post_keys() -> list:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT p.id, p.expires_at FROM user_posts p JOIN users u ON u.id = p.user_id "
+            f"WHERE u.email LIKE '%@{EMAIL_DOMAIN}'"
+        ))
+        return result.all()
+
+async def total_likes() -> tuple[int, int]:
+    """
+    Return (like reactions, stored like counters) over the seeded posts.
+    """
+
+    async with engine.connect() as conn:
+        row = (await conn.execute(text(
+            "SELECT (SELECT count(*) FROM post_reactions r JOIN user_posts p ON p.id = r.post_id "
+            f"        JOIN users u ON u.id = p.user_id WHERE u.email LIKE '%@{EMAIL_DOMAIN}' AND r.type = 'like'), "
+            "       (SELECT coalesce(sum(s.like_count), 0) FROM post_stats s JOIN user_posts p ON p.id = s.post_id "
+            f"        JOIN users u ON u.id = p.user_id WHERE u.email LIKE '%@{EMAIL_DOMAIN}')"
+        ))).first()
+        return int(row[0]), int(row[1])
+
+async def timed_reconcile(batch_size: int) -> tuple[float, int]:
+    started = time.perf_counter()
+    repaired = await reconcile_post_stats(batch_size)
+    return time.perf_counter() - started, repaired
+
+async def bump_while(done: asyncio.Event, posts: list) -> list:
+    """
+    Add reactions from fresh users, each with its counter bump, until `done` is set; return bump latencies in ms.
+    """
+
+    latencies = []
+    while not done.is_set():
+        post_id, expires_at = random.choice(posts)
+        async with SessionLocal() as session:
+            user_id = uuid.uuid4()
+            await session.execute(text(
+                "INSERT INTO users (id, firebase_uid, name, email) VALUES (:id, :uid, 'Bench', :email)"
+            ), {"id": user_id, "uid": f"bench-post-stats-{user_id}", "email": f"{user_id}@{EMAIL_DOMAIN}"})
+            await session.execute(text(
+                "INSERT INTO post_reactions (id, post_id, post_expires_at, user_id, type) "
+                "VALUES (gen_random_uuid(), :post_id, :expires_at, :user_id, 'like')"
+            ), {"post_id": post_id, "expires_at": expires_at, "user_id": user_id})
+            started = time.perf_counter()
+            await bump_reaction_count(session, post_id, expires_at, ReactionType.like, 1)
+            await session.commit()
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+async def run_size(reactions: int, batch_size: int):
+    posts = max(1, reactions // REACTIONS_PER_POST)
+    await execute(CLEANUP_SQL)
+    await execute(*SEED_SQL, posts=posts)
+    try:
+        print(f"\n{posts * REACTIONS_PER_POST} reactions, {posts * COMMENTS_PER_POST} comments on {posts} posts")
+
+        elapsed, repaired = await timed_reconcile(batch_size)
+        print(f"  drifted: {elapsed * 1000:9.1f} ms, {repaired} rows repaired")
+        elapsed, repaired = await timed_reconcile(batch_size)
+        print(f"    clean: {elapsed * 1000:9.1f} ms, {repaired} rows repaired")
+
+        await execute(ZERO_SQL)
+        done = asyncio.Event()
+        bumper = asyncio.create_task(bump_while(done, await post_keys()))
+        elapsed, repaired = await timed_reconcile(batch_size)
+        done.set()
+        latencies = sorted(await bumper)
+        likes, counted = await total_likes()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+        print(
+            f"    bumps: {elapsed * 1000:9.1f} ms, {len(latencies)} concurrent bumps, "
+            f"p99 {p99:.1f} ms, max {(latencies[-1] if latencies else 0.0):.1f} ms, "
+            f"{likes} likes vs {counted} counted"
+        )
+    finally:
+        await execute(CLEANUP_SQL)
+
+async def main(sizes: list[int], batch_size: int):
+    print(f"Reconciling in batches of {batch_size} posts")
+    for reactions in sizes:
+        await run_size(reactions, batch_size)
+    await engine.dispose()
+
+# Run the benchmark when executed as a script
+if __name__ == "__main__":
+    sizes = [1_000, 10_000, 100_000]
+    if "--sizes" in sys.argv:
+        sizes = [int(size) for size in sys.argv[sys.argv.index("--sizes") + 1].split(",")]
+    batch = int(sys.argv[sys.argv.index("--batch-size") + 1]) if "--batch-size" in sys.argv else RECONCILE_BATCH_SIZE
+    asyncio.run(main(sizes, batch))
@@ -0,0 +1,232 @@
+"""
+Reap-cost benchmark: row deletes vs. partition drops.
+
+Builds two copies of the post tables in a scratch `bench_reaper` schema of the
+configured database, fills each with the same expired posts (with comments,
+reactions and counters), then reaps them:
+- "rows": batched `DELETE ... RETURNING` with `ON DELETE CASCADE`, REAPER_BATCH_SIZE
+  posts per transaction, as `utils/clean_up.delete_expired_batch` does in row storage.
+- "partitioned": drop the bucket's child partitions, then detach and drop its posts
+  partition, as `utils/post_partitions.drop_expired_partitions` does.
+
+For each mode it prints the reap time, the WAL generated, the dead tuples left
+behind for autovacuum, and the disk still held by the tables afterwards. The
+scratch schema is dropped at the end; application tables are not touched.
+
+Intended for a local Postgres only (13+ for gen_random_uuid).
+
+Usage:
+- python3 bench_reaper.py                 # 20000 posts, 3 comments and 5 reactions each
+- python3 bench_reaper.py --posts 100000
+"""
+
+import asyncio
+import sys
+import time
+from sqlalchemy import text
+from database import engine
+from utils.clean_up import REAPER_BATCH_SIZE
+
+COMMENTS_PER_POST = 3
+REACTIONS_PER_POST = 5
+BUCKET = "2000-01-01 00:00" # Expired bucket every seeded post falls in
+BUCKET_END = "2000-01-01 01:00"
+
+SCHEMA_SQL = [
+    "DROP SCHEMA IF EXISTS bench_reaper CASCADE",
+    "CREATE SCHEMA bench_reaper",
+    # Row storage: plain tables, children cascade from posts
+    """
+    CREATE TABLE bench_reaper.rows_posts (
+        id UUID PRIMARY KEY, user_id UUID NOT NULL, content TEXT NOT NULL,
+        image_public_id VARCHAR, created_at TIMESTAMP NOT NULL, expires_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX ON bench_reaper.rows_posts (expires_at)",
+    "CREATE INDEX ON bench_reaper.rows_posts (created_at DESC, id DESC)",
+    """
+    CREATE TABLE bench_reaper.rows_comments (
+        id UUID PRIMARY KEY, post_id UUID NOT NULL REFERENCES bench_reaper.rows_posts(id) ON DELETE CASCADE,
+        post_expires_at TIMESTAMP NOT NULL, user_id UUID NOT NULL, content TEXT NOT NULL, created_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX ON bench_reaper.rows_comments (post_id, created_at)",
+    """
+    CREATE TABLE bench_reaper.rows_reactions (
+        id UUID PRIMARY KEY, post_id UUID NOT NULL REFERENCES bench_reaper.rows_posts(id) ON DELETE CASCADE,
+        post_expires_at TIMESTAMP NOT NULL, user_id UUID NOT NULL, type TEXT NOT NULL,
+        UNIQUE (post_id, user_id, type)
+    )
+    """,
+    """
+    CREATE TABLE bench_reaper.rows_stats (
+        post_id UUID PRIMARY KEY REFERENCES bench_reaper.rows_posts(id) ON DELETE CASCADE,
+        post_expires_at TIMESTAMP NOT NULL, like_count INTEGER NOT NULL DEFAULT 0, comment_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Partitioned storage: same columns, keys include the partition key (as in db_partitioned_posts.sql)
+    """
+    CREATE TABLE bench_reaper.part_posts (
+        id UUID NOT NULL, user_id UUID NOT NULL, content TEXT NOT NULL,
+        image_public_id VARCHAR, created_at TIMESTAMP NOT NULL, expires_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (id, expires_at)
+    ) PARTITION BY RANGE (expires_at)
+    """,
+    "CREATE INDEX ON bench_reaper.part_posts (expires_at)",
+    "CREATE INDEX ON bench_reaper.part_posts (created_at DESC, id DESC)",
+    """
+    CREATE TABLE bench_reaper.part_comments (
+        id UUID NOT NULL, post_id UUID NOT NULL, post_expires_at TIMESTAMP NOT NULL,
+        user_id UUID NOT NULL, content TEXT NOT NULL, created_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (id, post_expires_at),
+        FOREIGN KEY (post_id, post_expires_at) REFERENCES bench_reaper.part_posts(id, expires_at) ON DELETE CASCADE
+    ) PARTITION BY RANGE (post_expires_at)
+    """,
+    "CREATE INDEX ON bench_reaper.part_comments (post_id, created_at)",
+    """
+    CREATE TABLE bench_reaper.part_reactions (
+        id UUID NOT NULL, post_id UUID NOT NULL, post_expires_at TIMESTAMP NOT NULL,
+        user_id UUID NOT NULL, type TEXT NOT NULL,
+        PRIMARY KEY (id, post_expires_at),
+        UNIQUE (post_id, post_expires_at, user_id, type),
+        FOREIGN KEY (post_id, post_expires_at) REFERENCES bench_reaper.part_posts(id, expires_at) ON DELETE CASCADE
+    ) PARTITION BY RANGE (post_expires_at)
+    """,
+    """
+    CREATE TABLE bench_reaper.part_stats (
+        post_id UUID NOT NULL, post_expires_at TIMESTAMP NOT NULL,
+        like_count INTEGER NOT NULL DEFAULT 0, comment_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (post_id, post_expires_at),
+        FOREIGN KEY (post_id, post_expires_at) REFERENCES bench_reaper.part_posts(id, expires_at) ON DELETE CASCADE
+    ) PARTITION BY RANGE (post_expires_at)
+    """,
+    *[
+        f"CREATE TABLE bench_reaper.part_{table}_b PARTITION OF bench_reaper.part_{table} "
+        f"FOR VALUES FROM ('{BUCKET}') TO ('{BUCKET_END}')"
+        for table in ("posts", "comments", "reactions", "stats")
+    ],
+]
+
+def seed_sql(prefix: str) -> list[str]:
+    """
+    Statements filling one table set with :posts expired posts and their children.
+    """
+
+    return [
+        f"""
+        INSERT INTO bench_reaper.{prefix}_posts (id, user_id, content, image_public_id, created_at, expires_at)
+        SELECT gen_random_uuid(), gen_random_uuid(), repeat('post ', 20), 'posts/bench-' || g,
+               timestamp '{BUCKET}' - interval '1 day', timestamp '{BUCKET}' + (g % 3600) * interval '1 second'
+        FROM generate_series(1, :posts) AS g
+        """,
+        f"""
+        INSERT INTO bench_reaper.{prefix}_stats (post_id, post_expires_at, like_count, comment_count)
+        SELECT id, expires_at, {REACTIONS_PER_POST}, {COMMENTS_PER_POST} FROM bench_reaper.{prefix}_posts
+        """,
+        f"""
+        INSERT INTO bench_reaper.{prefix}_comments (id, post_id, post_expires_at, user_id, content, created_at)
+        SELECT gen_random_uuid(), p.id, p.expires_at, gen_random_uuid(), repeat('comment ', 10), p.created_at
+        FROM bench_reaper.{prefix}_posts p CROSS JOIN generate_series(1, {COMMENTS_PER_POST})
+        """,
+        f"""
+        INSERT INTO bench_reaper.{prefix}_reactions (id, post_id, post_expires_at, user_id, type)
+        SELECT gen_random_uuid(), p.id, p.expires_at, gen_random_uuid(), 'like'
+        FROM bench_reaper.{prefix}_posts p CROSS JOIN generate_series(1, {REACTIONS_PER_POST})
+        """,
+        f"ANALYZE bench_reaper.{prefix}_posts",
+    ]
+
+async def reap_rows(conn):
+    """
+    Delete every expired post in REAPER_BATCH_SIZE batches, one transaction each.
+    """
+
+    while True:
+        result = await conn.execute(text(
+            "DELETE FROM bench_reaper.rows_posts WHERE id IN ("
+            "SELECT id FROM bench_reaper.rows_posts WHERE expires_at <= now() "
+            f"ORDER BY expires_at LIMIT {REAPER_BATCH_SIZE} FOR UPDATE SKIP LOCKED) "
+            "RETURNING id, image_public_id"
+        ))
+        deleted = len(result.all())
+        await conn.commit()
+        if deleted < REAPER_BATCH_SIZE:
+            break
+
+async def reap_partitions(conn):
+    """
+    Drop the expired bucket: child partitions first, then detach and drop the posts partition.
+    """
+
+    for table in ("stats", "reactions", "comments"):
+        await conn.execute(text(f"DROP TABLE bench_reaper.part_{table}_b"))
+    await conn.execute(text("ALTER TABLE bench_reaper.part_posts DETACH PARTITION bench_reaper.part_posts_b"))
+    await conn.execute(text("DROP TABLE bench_reaper.part_posts_b"))
+    await conn.commit()
+
+async def table_stats(conn, prefix: str) -> tuple[int, int]:
+    """
+    Return (dead tuples, total bytes) across one table set, including partitions.
+    """
+
+    try:
+        await conn.execute(text("SELECT pg_stat_force_next_flush()")) # Postgres 15+: publish this backend's counters now
+    except Exception:
+        await conn.rollback()
+        await asyncio.sleep(1) # Older versions flush statistics every 500 ms
+    row = (await conn.execute(text(
+        "SELECT coalesce(sum(n_dead_tup), 0), coalesce(sum(pg_total_relation_size(relid)), 0) "
+        "FROM pg_stat_user_tables WHERE schemaname = 'bench_reaper' AND relname LIKE :prefix"
+    ), {"prefix": f"{prefix}_%"})).first()
+    await conn.commit()
+    return int(row[0]), int(row[1])
+
+async def wal_lsn(conn) -> str:
+    lsn = (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+    await conn.commit()
+    return lsn
+
+async def measure(conn, name: str, prefix: str, reap, posts: int):
+    """
+    Reap one table set and print time, WAL, dead tuples, and remaining size.
+    """
+
+    _, size_before = await table_stats(conn, prefix)
+    start_lsn = await wal_lsn(conn)
+    started = time.perf_counter()
+    await reap(conn)
+    elapsed = time.perf_counter() - started
+    wal = (await conn.execute(text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), CAST(:lsn AS pg_lsn))"), {"lsn": start_lsn})).scalar()
+    await conn.commit()
+    dead, size_after = await table_stats(conn, prefix)
+
+    print(
+        f"{name:>12}: {posts} posts in {elapsed * 1000:8.1f} ms, "
+        f"WAL {int(wal) / (1024 * 1024):7.1f} MB, {dead:8d} dead tuples, "
+        f"{size_before / (1024 * 1024):6.1f} -> {size_after / (1024 * 1024):6.1f} MB on disk"
+    )
+
+async def main(posts: int):
+    async with engine.connect() as conn:
+        await conn.execute(text("SET statement_timeout = 0")) # Seeding large runs may be slow
+        for statement in SCHEMA_SQL:
+            await conn.execute(text(statement))
+        for prefix in ("rows", "part"):
+            for statement in seed_sql(prefix):
+                await conn.execute(text(statement), {"posts": posts} if ":posts" in statement else {})
+        await conn.commit()
+        print(f"Seeded {posts} expired posts per mode ({COMMENTS_PER_POST} comments, {REACTIONS_PER_POST} reactions each)")
+
+        try:
+            await measure(conn, "rows", "rows", reap_rows, posts)
+            await measure(conn, "partitioned", "part", reap_partitions, posts)
+        finally:
+            await conn.execute(text("DROP SCHEMA IF EXISTS bench_reaper CASCADE"))
+            await conn.commit()
+
+    await engine.dispose()
+
+# Run the benchmark when executed as a script
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--posts") + 1]) if "--posts" in sys.argv else 20_000
+    asyncio.run(main(n))
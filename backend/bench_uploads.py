@@ -0,0 +1,91 @@
+"""
+Memory benchmark for post image upload handling.
+
+Simulates N concurrent post uploads of a 5 MB image, each spooled to a temporary
+file the way Starlette stores multipart file parts, and measures peak Python heap
+usage (tracemalloc) for:
+- "old": `await file.read()` followed by a `BytesIO` copy (the previous upload path).
+- "new": `utils.uploads.read_image_upload` (type-sniffed, size-capped read).
+- "old 6MB" / "new 6MB": the same for 6 MB uploads, which the old path read fully
+  before rejecting and `read_image_upload` rejects from the spooled size unread.
+
+No database or Cloudinary access is needed.
+
+Usage:
+- python3 bench_uploads.py              # 20 concurrent uploads
+- python3 bench_uploads.py --uploads 50
+"""
+
+import asyncio
+import sys
+import tracemalloc
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from fastapi import HTTPException, UploadFile
+from utils.uploads import read_image_upload
+
+IMAGE_SIZE = 5 * 1024 * 1024 - 1024 # Just under the 5 MB cap
+SPOOL_MAX_SIZE = 1024 * 1024 # Starlette's in-memory limit before spooling to disk
+
+def make_upload(size: int) -> UploadFile:
+    """
+    Build an UploadFile holding `size` bytes of fake JPEG data, spooled like Starlette does.
+    """
+
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    spool.write(b"\xff\xd8\xff\xe0")
+    remaining = size - 4
+    block = b"\0" * (1024 * 1024)
+    while remaining > 0:
+        spool.write(block[:remaining])
+        remaining -= len(block)
+    spool.seek(0)
+    return UploadFile(file=spool, size=size, filename="bench.jpg")
+
+async def old_read(file: UploadFile) -> int:
+    data = await file.read()
+    buffer = BytesIO(data) # Copy made by the previous Cloudinary upload helper
+    return len(buffer.getvalue())
+
+async def capped_read(file: UploadFile) -> int:
+    return len(await read_image_upload(file))
+
+async def old_oversized_read(file: UploadFile) -> int:
+    data = await file.read()
+    return 0 if len(data) > IMAGE_SIZE else len(data) # Size was checked after reading
+
+async def oversized_read(file: UploadFile) -> int:
+    try:
+        await read_image_upload(file)
+    except HTTPException:
+        return 0
+    return -1
+
+async def measure(name: str, reader, uploads: int, size: int):
+    """
+    Run `reader` over `uploads` concurrent files and print the peak heap usage.
+    """
+
+    files = [make_upload(size) for _ in range(uploads)]
+    tracemalloc.start()
+    results = await asyncio.gather(*(reader(f) for f in files))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for f in files:
+        f.file.close()
+
+    print(
+        f"{name:>10}: {uploads} x {size / (1024 * 1024):.1f} MB, "
+        f"peak {peak / (1024 * 1024):7.1f} MB, {sum(results) / (1024 * 1024):7.1f} MB returned"
+    )
+
+async def main(uploads: int):
+    await measure("old", old_read, uploads, IMAGE_SIZE)
+    await measure("new", capped_read, uploads, IMAGE_SIZE)
+    await measure("old 6MB", old_oversized_read, uploads, 6 * 1024 * 1024)
+    await measure("new 6MB", oversized_read, uploads, 6 * 1024 * 1024)
+
+# Run the benchmark when executed as a script
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--uploads") + 1]) if "--uploads" in sys.argv else 20
+    asyncio.run(main(n))
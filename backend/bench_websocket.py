@@ -0,0 +1,128 @@
+"""
+Load test for WebSocket broadcasting.
+
+Connects N simulated sockets to the WebSocket manager (no network: each fake socket
+records when a message reaches it), broadcasts a series of messages, and reports:
+- publisher time: how long each `manager.broadcast` call takes
+- delivery latency: time from broadcast to arrival at each socket (p50/p99/max)
+- slow-consumer handling: a fraction of sockets can be made to stall on send
+
+With `--fanout`, instead runs a CPU microbenchmark of the encoding cost of one
+event against connection count: encoding per socket (the previous `send_json`
+path, plus the Redis dumps/loads round trip) versus encoding once.
+
+Redis is not used; messages go through the local broadcast path.
+
+Usage:
+- python3 bench_websocket.py                                # 10k sockets, 20 messages
+- python3 bench_websocket.py --sockets 10000 --messages 50 --slow 100
+- python3 bench_websocket.py --fanout
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+from utils.metrics import metrics
+from utils.redis_ws_manager import manager, encode_event
+
+# Representative event payload (a new post broadcast)
+SAMPLE_EVENT = {
+    "type": "new_post",
+    "data": {
+        "id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+        "content": "Anyone up for a bouldering session this evening? " * 3,
+        "created_at": "2025-07-09T18:25:43.511000",
+        "expires_at": "2025-07-10T18:25:43.511000",
+        "user_id": "7c9e6679-7425-40de-944b-e07fc1f90ae7",
+        "name": "Sample User",
+        "profile_pic_url": "https://res.cloudinary.com/demo/image/upload/sample.jpg",
+        "image_url": None,
+        "image_status": "none",
+        "hobby_id": None,
+        "reaction_counts": {"like": 3, "fire": 1},
+        "comment_count": 2,
+    },
+}
+
+class FakeWebSocket:
+    """
+    Stand-in for a Starlette WebSocket that records delivery latencies.
+    """
+
+    def __init__(self, latencies: list, stall: bool = False):
+        self.latencies = latencies
+        self.stall = stall
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, payload: str):
+        if self.stall:
+            await asyncio.sleep(3600) # Never finishes: a client that stopped reading
+        self.latencies.append(time.perf_counter() - json.loads(payload)["sent_at"])
+
+def percentile(values: list, pct: float) -> float:
+    return statistics.quantiles(values, n=100)[int(pct) - 1] if len(values) > 1 else (values[0] if values else 0.0)
+
+async def run(sockets: int, messages: int, slow: int):
+    latencies = []
+    for i in range(sockets):
+        await manager.connect(FakeWebSocket(latencies, stall=i < slow))
+
+    publish_times = []
+    for seq in range(messages):
+        start = time.perf_counter()
+        await manager.broadcast({"type": "bench", "data": {"seq": seq}, "sent_at": start})
+        publish_times.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01) # Let writer tasks run between messages
+
+    # Wait for healthy sockets to receive everything
+    expected = (sockets - slow) * messages
+    deadline = time.perf_counter() + 30
+    while len(latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+    ms = lambda seconds: seconds * 1000
+    print(f"sockets={sockets} (slow={slow}) messages={messages}")
+    print(f"publisher: mean {ms(statistics.mean(publish_times)):.2f} ms, max {ms(max(publish_times)):.2f} ms per broadcast")
+    print(
+        f"delivery:  {len(latencies)}/{expected} delivered, p50 {ms(percentile(latencies, 50)):.2f} ms, "
+        f"p99 {ms(percentile(latencies, 99)):.2f} ms, max {ms(max(latencies, default=0)):.2f} ms"
+    )
+    print(f"metrics:   {metrics.snapshot()}")
+
+    for websocket in list(manager.active_connections):
+        await manager.disconnect(websocket)
+
+def fanout_microbench(connection_counts=(100, 1_000, 10_000), events: int = 20):
+    """
+    Print per-event encoding cost for each connection count, per-socket vs encode-once.
+    """
+
+    for count in connection_counts:
+        start = time.perf_counter()
+        for _ in range(events):
+            published = json.loads(json.dumps(SAMPLE_EVENT)) # Redis round trip
+            for _ in range(count):
+                json.dumps(published) # send_json encodes again for every socket
+        per_socket = (time.perf_counter() - start) / events
+
+        start = time.perf_counter()
+        for _ in range(events):
+            encode_event(SAMPLE_EVENT) # Shared by Redis and every socket
+        once = (time.perf_counter() - start) / events
+
+        print(f"{count:>6} connections: per-socket {per_socket * 1000:8.2f} ms/event, encode-once {once * 1000:6.3f} ms/event")
+
+# Run the load test when executed as a script
+if __name__ == "__main__":
+    arg = lambda name, default: int(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+    if "--fanout" in sys.argv:
+        fanout_microbench()
+    else:
+        asyncio.run(run(arg("--sockets", 10_000), arg("--messages", 20), arg("--slow", 0)))
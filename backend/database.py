@@ -1,15 +1,19 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine 
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine 
 from sqlalchemy.ext.declarative import declarative_base 
 from sqlalchemy.orm import sessionmaker 
-from sqlalchemy import text 
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import text, exc
 from dotenv import load_dotenv 
+from uuid import uuid4
 import os
 import sys
+import time
 from logger import logger
+from utils.metrics import metrics
 
-# Load environment variables from .env file once
+# Load environment variables from .env file once (not needed when the environment already sets them, e.g. in tests)
 if not hasattr(sys.modules[__name__], "_env_loaded"):
-    if not os.path.isfile(".env"):
+    if not os.path.isfile(".env") and not os.getenv("HOBBYMATCH_DATABASE_URL"):
         logger.error("Missing .env file.")
         sys.exit(1)
     load_dotenv()
@@ -26,8 +30,140 @@ if not DATABASE_URL.startswith("postgresql+asyncpg://"):
     logger.error("DATABASE_URL must start with 'postgresql+asyncpg://'.")
     sys.exit(1)
 
+# Direct (unpooled by PgBouncer) URL for session-level features: advisory locks, LISTEN, migrations
+DIRECT_DATABASE_URL = os.getenv("HOBBYMATCH_DIRECT_DATABASE_URL", DATABASE_URL)
+if not DIRECT_DATABASE_URL.startswith("postgresql+asyncpg://"):
+    logger.error("HOBBYMATCH_DIRECT_DATABASE_URL must start with 'postgresql+asyncpg://'.")
+    sys.exit(1)
+
+def _env_number(name: str, default, cast=int):
+    """
+    Read a numeric setting from the environment, exiting on an invalid value.
+    """
+
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.error(f"{name} must be a number.")
+        sys.exit(1)
+
+def _env_flag(name: str, default: bool) -> bool:
+    """
+    Read a boolean setting ("1"/"true"/"yes" or "0"/"false"/"no") from the environment.
+    """
+
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Engine settings, overridable per deployment through the environment
+DB_POOL_SIZE = _env_number("HOBBYMATCH_DB_POOL_SIZE", 10) # Connections kept open per instance
+DB_MAX_OVERFLOW = _env_number("HOBBYMATCH_DB_MAX_OVERFLOW", 10) # Extra connections opened under burst load
+DB_POOL_TIMEOUT = _env_number("HOBBYMATCH_DB_POOL_TIMEOUT", 10.0, float) # Seconds a request waits for a connection before failing
+DB_POOL_PRE_PING = _env_flag("HOBBYMATCH_DB_POOL_PRE_PING", True) # Check connections on checkout (drops ones the server closed)
+DB_POOL_RECYCLE = _env_number("HOBBYMATCH_DB_POOL_RECYCLE", 1800) # Reopen connections older than this many seconds (-1 = never)
+DB_STATEMENT_CACHE_SIZE = _env_number("HOBBYMATCH_DB_STATEMENT_CACHE_SIZE", 100) # Prepared statements cached per connection
+DB_STATEMENT_TIMEOUT_MS = _env_number("HOBBYMATCH_DB_STATEMENT_TIMEOUT_MS", 15_000) # Server-side statement_timeout (0 = none)
+DB_PGBOUNCER = _env_flag("HOBBYMATCH_DB_PGBOUNCER", False) # DATABASE_URL points at PgBouncer in transaction pooling mode
+DB_SLOW_CHECKOUT_MS = 100 # Checkouts waiting longer than this are counted as slow
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool that records how long requests wait for a connection.
+
+    Attributes:
+    - waiters (int): Checkouts in progress (waiting for a free connection, or opening
+      and pre-pinging one).
+
+    Metrics:
+    - db_pool.checkouts, db_pool.wait_ms (total), db_pool.slow_checkouts, db_pool.timeouts
+    - db_pool.waiters (gauge); see `record_pool_metrics` for the usage gauges
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiters = 0
+
+    def connect(self):
+        self.waiters += 1
+        metrics.set_gauge("db_pool.waiters", self.waiters)
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.incr("db_pool.timeouts")
+            raise
+        finally:
+            self.waiters -= 1
+            metrics.set_gauge("db_pool.waiters", self.waiters)
+
+        waited_ms = (time.perf_counter() - started) * 1000
+        metrics.incr("db_pool.checkouts")
+        metrics.incr("db_pool.wait_ms", round(waited_ms))
+        if waited_ms > DB_SLOW_CHECKOUT_MS:
+            metrics.incr("db_pool.slow_checkouts")
+        return connection
+
+def create_db_engine(url: str = DATABASE_URL, pgbouncer: bool = DB_PGBOUNCER, **engine_kwargs) -> AsyncEngine:
+    """
+    Create an async engine configured from the HOBBYMATCH_DB_* settings.
+
+    Behavior:
+    - Pools connections in an `InstrumentedQueuePool` sized by DB_POOL_SIZE and
+      DB_MAX_OVERFLOW, unless `engine_kwargs` passes another `poolclass` (e.g. NullPool).
+    - Sets `statement_timeout` on every connection, so a runaway query cannot hold a
+      pooled connection indefinitely.
+    - In PgBouncer mode (transaction pooling), consecutive transactions may run on
+      different server connections, so prepared statements are neither cached nor
+      reused by name, and `statement_timeout` is not sent as a startup parameter
+      (PgBouncer rejects it; set it on the database role instead).
+
+    Parameters:
+    - url (str): asyncpg database URL.
+    - pgbouncer (bool): Whether `url` points at PgBouncer in transaction pooling mode.
+    - engine_kwargs: Extra `create_async_engine` arguments, overriding the defaults.
+
+    Returns:
+    - AsyncEngine: The configured engine.
+    """
+
+    server_settings = {"application_name": "hobbymatch-backend"}
+    connect_args = {"server_settings": server_settings}
+    if pgbouncer:
+        connect_args["statement_cache_size"] = 0 # asyncpg's own cache
+        connect_args["prepared_statement_cache_size"] = 0 # SQLAlchemy's asyncpg statement cache
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__" # Never collide across clients
+    else:
+        connect_args["statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        if DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+
+    options = {"echo": False, "pool_pre_ping": DB_POOL_PRE_PING, "connect_args": connect_args}
+    if "poolclass" not in engine_kwargs:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    options.update(engine_kwargs)
+    return create_async_engine(url, **options)
+
+# Read the post storage mode: "rows" (default) or "partitioned" (see db_partitioned_posts.sql)
+POST_STORAGE = os.getenv("HOBBYMATCH_POST_STORAGE", "rows")
+if POST_STORAGE not in ("rows", "partitioned"):
+    logger.error("HOBBYMATCH_POST_STORAGE must be 'rows' or 'partitioned'.")
+    sys.exit(1)
+POSTS_PARTITIONED = POST_STORAGE == "partitioned"
+
 # Create the SQLAlchemy async engine for database connections
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_db_engine()
 
 # Create an async session factory bound to the engine
 SessionLocal = sessionmaker(
@@ -39,6 +175,22 @@ SessionLocal = sessionmaker(
 # Base declarative class for ORM models to inherit fr
 Base = declarative_base()
 
+def record_pool_metrics():
+    """
+    Record the main engine's pool usage as gauges (called when metrics are read).
+
+    Metrics:
+    - db_pool.size, db_pool.checked_out, db_pool.idle, db_pool.overflow (gauges)
+    """
+
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return
+    metrics.set_gauge("db_pool.size", pool.size())
+    metrics.set_gauge("db_pool.checked_out", pool.checkedout())
+    metrics.set_gauge("db_pool.idle", pool.checkedin())
+    metrics.set_gauge("db_pool.overflow", max(pool.overflow(), 0))
+
 async def get_db():
     """
     Async generator dependency that provides a database session.
@@ -0,0 +1,32 @@
+-- Migration 0001: Secondary indexes for hot query predicates
+-- Built CONCURRENTLY so live tables stay writable; the runner applies each statement outside a transaction.
+-- users.firebase_uid (auth lookup on every request) is already covered by its UNIQUE constraint.
+-- post_reactions (post_id, user_id) lookups are covered by UNIQUE (post_id, user_id, type).
+
+-- Expired-post cleanup: WHERE expires_at <= now()
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_posts_expires_at
+    ON user_posts (expires_at);
+
+-- Public feed keyset pages: ORDER BY created_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_posts_created_at_id
+    ON user_posts (created_at DESC, id DESC);
+
+-- My posts keyset pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_posts_user_created_at_id
+    ON user_posts (user_id, created_at DESC, id DESC);
+
+-- Public feed join filter: only non-private authors
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_public_id
+    ON users (id) WHERE is_private = FALSE;
+
+-- Reaction lookups and cascades by reacting user
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_post_reactions_user_id
+    ON post_reactions (user_id);
+
+-- Comment threads: WHERE post_id IN (...) ORDER BY created_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_post_comments_post_created_at
+    ON post_comments (post_id, created_at);
+
+-- Comment cascades by author
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_post_comments_user_id
+    ON post_comments (user_id);
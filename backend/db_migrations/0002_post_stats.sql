@@ -0,0 +1,30 @@
+-- Migration 0002: Per-post engagement counters for databases created before post_stats
+-- Rows are backfilled with zeros; the post stats reconciliation job fills in the real totals.
+-- On a schema that already has post_stats.post_expires_at (NOT NULL, from db_setup.sql or
+-- migration 0004), the backfill copies each post's expires_at into it.
+
+CREATE TABLE IF NOT EXISTS post_stats (
+    post_id UUID PRIMARY KEY REFERENCES user_posts(id) ON DELETE CASCADE,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    love_count INTEGER NOT NULL DEFAULT 0,
+    fire_count INTEGER NOT NULL DEFAULT 0,
+    laugh_count INTEGER NOT NULL DEFAULT 0,
+    sad_count INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0
+);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'post_stats' AND column_name = 'post_expires_at'
+    ) THEN
+        INSERT INTO post_stats (post_id, post_expires_at)
+        SELECT id, expires_at FROM user_posts
+        ON CONFLICT DO NOTHING;
+    ELSE
+        INSERT INTO post_stats (post_id)
+        SELECT id FROM user_posts
+        ON CONFLICT DO NOTHING;
+    END IF;
+END $$;
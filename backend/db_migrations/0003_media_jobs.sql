@@ -0,0 +1,34 @@
+-- Migration 0003: Background media pipeline for post images
+-- Adds the post image_status column and the media_jobs queue table.
+-- image_url is mapped by the UserPost model but was missing from older db_setup.sql builds.
+
+DO $$ BEGIN
+    CREATE TYPE image_status AS ENUM ('none', 'pending_image', 'ready', 'failed');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE media_job_status AS ENUM ('pending', 'processing', 'dead');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+ALTER TABLE user_posts ADD COLUMN IF NOT EXISTS image_status image_status NOT NULL DEFAULT 'none';
+
+ALTER TABLE user_posts ADD COLUMN IF NOT EXISTS image_url VARCHAR;
+
+UPDATE user_posts SET image_status = 'ready' WHERE image_url IS NOT NULL AND image_status = 'none';
+
+CREATE TABLE IF NOT EXISTS media_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    post_id UUID NOT NULL REFERENCES user_posts(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    image_data BYTEA NOT NULL,
+    status media_job_status NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_jobs_status_run_at ON media_jobs (status, run_at);
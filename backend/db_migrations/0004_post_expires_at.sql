@@ -0,0 +1,17 @@
+-- Migration 0004: Copy each post's expires_at onto its comments, reactions and counters
+-- post_expires_at is the partition key of these tables in partitioned post storage (db_partitioned_posts.sql).
+
+ALTER TABLE post_comments ADD COLUMN IF NOT EXISTS post_expires_at TIMESTAMP;
+ALTER TABLE post_reactions ADD COLUMN IF NOT EXISTS post_expires_at TIMESTAMP;
+ALTER TABLE post_stats ADD COLUMN IF NOT EXISTS post_expires_at TIMESTAMP;
+
+UPDATE post_comments c SET post_expires_at = p.expires_at
+FROM user_posts p WHERE p.id = c.post_id AND c.post_expires_at IS NULL;
+UPDATE post_reactions r SET post_expires_at = p.expires_at
+FROM user_posts p WHERE p.id = r.post_id AND r.post_expires_at IS NULL;
+UPDATE post_stats s SET post_expires_at = p.expires_at
+FROM user_posts p WHERE p.id = s.post_id AND s.post_expires_at IS NULL;
+
+ALTER TABLE post_comments ALTER COLUMN post_expires_at SET NOT NULL;
+ALTER TABLE post_reactions ALTER COLUMN post_expires_at SET NOT NULL;
+ALTER TABLE post_stats ALTER COLUMN post_expires_at SET NOT NULL;
@@ -0,0 +1,12 @@
+-- Migration 0005: Keep media job uploads in spooled files instead of BYTEA blobs
+-- New jobs reference a file in the media spool directory (image_file); jobs queued
+-- before this keep their image_data until they complete or their blob is cleared.
+-- dead_at lets the media workers clear the images of dead-lettered jobs after a retention period.
+
+ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS image_file VARCHAR;
+
+ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS dead_at TIMESTAMP;
+
+ALTER TABLE media_jobs ALTER COLUMN image_data DROP NOT NULL;
+
+UPDATE media_jobs SET dead_at = CURRENT_TIMESTAMP WHERE status = 'dead' AND dead_at IS NULL;
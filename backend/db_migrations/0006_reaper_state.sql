@@ -0,0 +1,9 @@
+-- Migration 0006: Persist the expired-post reaper's progress
+-- In partitioned storage the reaper announces expired posts without deleting them, and
+-- remembers up to which expires_at it has announced. Keeping that here instead of in the
+-- leader's memory means a new leader (or a restarted one) does not announce them again.
+
+CREATE TABLE IF NOT EXISTS reaper_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CONSTRAINT reaper_state_single_row CHECK (id = 1),
+    announced_until TIMESTAMP
+);
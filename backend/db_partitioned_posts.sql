@@ -0,0 +1,125 @@
+-- Partitioned post storage (optional)
+-- Run after db_setup.sql on a fresh database, then start the backend with HOBBYMATCH_POST_STORAGE=partitioned.
+--
+-- Recreates the post tables range-partitioned by expiry into hourly buckets:
+-- user_posts by expires_at, and its comments, reactions and counters by post_expires_at,
+-- so a post and everything attached to it share a bucket. Expired buckets are dropped
+-- whole by the reaper leader (utils/post_partitions.py) instead of deleting rows.
+--
+-- Partitioned tables need the partition key in every primary key and unique constraint,
+-- so keys become (id, expires_at) and child tables reference (post_id, post_expires_at).
+---------------- WARNING: This will delete all posts! ----------------
+
+DROP TABLE IF EXISTS media_jobs, post_stats, post_comments, post_reactions, user_posts CASCADE;
+TRUNCATE reaper_state; -- Its progress refers to the dropped posts
+
+-- Table: user_posts
+-- User-created ephemeral posts, partitioned by expiry
+CREATE TABLE user_posts (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(), -- Unique post ID
+    user_id UUID NOT NULL, -- Authoring user
+    content TEXT NOT NULL, -- Post content (text, media links)
+    image_url VARCHAR, -- Cloudinary image URL
+    image_public_id VARCHAR, -- Cloudinary image public ID
+    image_status image_status NOT NULL DEFAULT 'none', -- Image upload state
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- Creation timestamp
+    expires_at TIMESTAMP NOT NULL, -- Expiration time (partition key)
+    hobby_id UUID, -- Related hobby (optional)
+    PRIMARY KEY (id, expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (hobby_id) REFERENCES hobbies(id) ON DELETE SET NULL
+) PARTITION BY RANGE (expires_at);
+
+-- Table: post_reactions
+-- Emoji reactions on user posts, partitioned by their post's expiry
+CREATE TABLE post_reactions (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(), -- Unique reaction ID
+    post_id UUID NOT NULL, -- FK to reacted post
+    post_expires_at TIMESTAMP NOT NULL, -- Post's expires_at (partition key)
+    user_id UUID NOT NULL, -- Reacting user
+    type reaction_type NOT NULL, -- Reaction type/emoji
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, post_expires_at),
+    FOREIGN KEY (post_id, post_expires_at) REFERENCES user_posts(id, expires_at) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE(post_id, post_expires_at, user_id, type) -- Prevent duplicate reactions by same user on same post
+) PARTITION BY RANGE (post_expires_at);
+
+-- Table: post_comments
+-- Comments on user posts, partitioned by their post's expiry
+CREATE TABLE post_comments (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(), -- Unique comment ID
+    post_id UUID NOT NULL, -- FK to commented post
+    post_expires_at TIMESTAMP NOT NULL, -- Post's expires_at (partition key)
+    user_id UUID NOT NULL, -- Comment author
+    content TEXT NOT NULL, -- Comment text
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, post_expires_at),
+    FOREIGN KEY (post_id, post_expires_at) REFERENCES user_posts(id, expires_at) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (post_expires_at);
+
+-- Table: post_stats
+-- Denormalized per-post engagement counters, partitioned by their post's expiry
+CREATE TABLE post_stats (
+    post_id UUID NOT NULL, -- FK to counted post
+    post_expires_at TIMESTAMP NOT NULL, -- Post's expires_at (partition key)
+    like_count INTEGER NOT NULL DEFAULT 0,
+    love_count INTEGER NOT NULL DEFAULT 0,
+    fire_count INTEGER NOT NULL DEFAULT 0,
+    laugh_count INTEGER NOT NULL DEFAULT 0,
+    sad_count INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (post_id, post_expires_at),
+    FOREIGN KEY (post_id, post_expires_at) REFERENCES user_posts(id, expires_at) ON DELETE CASCADE
+) PARTITION BY RANGE (post_expires_at);
+
+-- Table: media_jobs
+-- Queue of post image uploads (not partitioned; jobs of dropped posts are deleted with their bucket)
+CREATE TABLE media_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(), -- Unique job ID
+    post_id UUID NOT NULL, -- Post the image belongs to (no FK: user_posts is keyed by (id, expires_at))
+    user_id UUID NOT NULL, -- Uploading user (Cloudinary folder)
+    image_file VARCHAR, -- Spooled upload in the media spool directory, removed once no longer needed
+    image_data BYTEA, -- Raw upload of jobs queued before image_file existed
+    status media_job_status NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0, -- Attempts so far
+    last_error TEXT, -- Error from the latest failed attempt
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Earliest time to (re)try
+    locked_at TIMESTAMP, -- When a worker claimed the job
+    dead_at TIMESTAMP, -- When the job was dead-lettered
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+
+-- INDEXES
+-- Same hot-path indexes as db_setup.sql, created on every partition
+CREATE INDEX idx_user_posts_expires_at ON user_posts (expires_at); -- Reaper scheduling and announcements
+CREATE INDEX idx_user_posts_created_at_id ON user_posts (created_at DESC, id DESC); -- Public feed pages
+CREATE INDEX idx_user_posts_user_created_at_id ON user_posts (user_id, created_at DESC, id DESC); -- My posts pages
+CREATE INDEX idx_post_reactions_user_id ON post_reactions (user_id); -- Reactions by user
+CREATE INDEX idx_post_comments_post_created_at ON post_comments (post_id, created_at); -- Comment threads
+CREATE INDEX idx_post_comments_user_id ON post_comments (user_id); -- Comments by user
+CREATE INDEX idx_media_jobs_status_run_at ON media_jobs (status, run_at); -- Media workers claiming due jobs
+CREATE INDEX idx_media_jobs_post_id ON media_jobs (post_id); -- Jobs deleted with their bucket
+
+
+-- PARTITIONS
+-- Initial hourly buckets for the next 48 hours (UTC); the reaper leader keeps creating them ahead
+-- Names and bounds must match utils/post_partitions.py (PARTITION_INTERVAL, partition_name)
+DO $$
+DECLARE
+    bucket TIMESTAMP;
+    tbl TEXT;
+BEGIN
+    FOR i IN 0..47 LOOP
+        bucket := date_trunc('hour', now() AT TIME ZONE 'UTC') + i * interval '1 hour';
+        FOREACH tbl IN ARRAY ARRAY['user_posts', 'post_stats', 'post_reactions', 'post_comments'] LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                tbl || '_p' || to_char(bucket, 'YYYYMMDDHH24MI'), tbl, bucket, bucket + interval '1 hour'
+            );
+        END LOOP;
+    END LOOP;
+END $$;
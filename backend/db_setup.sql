@@ -5,10 +5,14 @@ CREATE DATABASE hobbymatch_app;
 -- Reset the database for testing: 
 -- Drop all tables and enums in dependency-safe order
 DROP TABLE IF EXISTS 
+    schema_migrations,
     spot_rsvps,
     live_hobby_spots,
     event_rsvps,
     events,
+    reaper_state,
+    media_jobs,
+    post_stats,
     post_comments,
     post_reactions,
     user_posts,
@@ -27,6 +31,8 @@ DROP TABLE IF EXISTS
 CASCADE;
 
 DROP TYPE IF EXISTS 
+    media_job_status,
+    image_status,
     rsvp_status,
     event_type,
     reaction_type,
@@ -69,6 +75,8 @@ CREATE TYPE hobby_category AS ENUM (
 CREATE TYPE reaction_type AS ENUM ('like', 'love', 'fire', 'laugh', 'sad'); -- Types of reactions users can give to posts
 CREATE TYPE rsvp_status AS ENUM ('going', 'interested', 'not_going', 'flaked', 'attended'); -- RSVP status for events and live spots
 CREATE TYPE event_type AS ENUM ('virtual', 'in-person'); -- Event type for meetups
+CREATE TYPE image_status AS ENUM ('none', 'pending_image', 'ready', 'failed'); -- Processing state of a post image
+CREATE TYPE media_job_status AS ENUM ('pending', 'processing', 'dead'); -- Background media job state (dead = dead-lettered)
 
 -- Table: locations
 -- Stores geographic info (city, region, country, coordinates, timezone)
@@ -195,11 +203,14 @@ CREATE TABLE notifications (
 
 -- Table: user_posts
 -- User-created ephemeral posts tied to hobbies and expiring after 24 hours
+-- For partitioned post storage, run db_partitioned_posts.sql after this file (see docs/database.md)
 CREATE TABLE user_posts (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(), -- Unique post ID
     user_id UUID NOT NULL, -- Authoring user
     content TEXT NOT NULL, -- Post content (text, media links)
+    image_url VARCHAR, -- Cloudinary image URL
     image_public_id VARCHAR, -- Cloudinary image public ID
+    image_status image_status NOT NULL DEFAULT 'none', -- Image upload state (pending_image until the media worker finishes)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- Creation timestamp
     expires_at TIMESTAMP NOT NULL, -- Expiration time (usually created_at + 24h)
     hobby_id UUID, -- Related hobby (optional)
@@ -212,6 +223,7 @@ CREATE TABLE user_posts (
 CREATE TABLE post_reactions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(), -- Unique reaction ID
     post_id UUID NOT NULL, -- FK to reacted post
+    post_expires_at TIMESTAMP NOT NULL, -- Copy of the post's expires_at (partition key in db_partitioned_posts.sql)
     user_id UUID NOT NULL, -- Reacting user
     type reaction_type NOT NULL, -- Reaction type/emoji
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -225,6 +237,7 @@ CREATE TABLE post_reactions (
 CREATE TABLE post_comments (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(), -- Unique comment ID
     post_id UUID NOT NULL, -- FK to commented post
+    post_expires_at TIMESTAMP NOT NULL, -- Copy of the post's expires_at (partition key in db_partitioned_posts.sql)
     user_id UUID NOT NULL, -- Comment author
     content TEXT NOT NULL, -- Comment text
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -232,6 +245,48 @@ CREATE TABLE post_comments (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Table: post_stats
+-- Denormalized per-post engagement counters read by the feed instead of aggregating
+-- Kept in sync by the post routes; repaired periodically by the reconciliation job
+CREATE TABLE post_stats (
+    post_id UUID PRIMARY KEY, -- FK to counted post
+    post_expires_at TIMESTAMP NOT NULL, -- Copy of the post's expires_at (partition key in db_partitioned_posts.sql)
+    like_count INTEGER NOT NULL DEFAULT 0,
+    love_count INTEGER NOT NULL DEFAULT 0,
+    fire_count INTEGER NOT NULL DEFAULT 0,
+    laugh_count INTEGER NOT NULL DEFAULT 0,
+    sad_count INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (post_id) REFERENCES user_posts(id) ON DELETE CASCADE
+);
+
+-- Table: media_jobs
+-- Queue of post image uploads processed by the background media workers
+-- Completed jobs are deleted; failed jobs stay with status 'dead' (dead-letter queue), their image cleared after a retention period
+CREATE TABLE media_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(), -- Unique job ID
+    post_id UUID NOT NULL, -- Post the image belongs to
+    user_id UUID NOT NULL, -- Uploading user (Cloudinary folder)
+    image_file VARCHAR, -- Spooled upload in the media spool directory, removed once no longer needed
+    image_data BYTEA, -- Raw upload of jobs queued before image_file existed
+    status media_job_status NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0, -- Attempts so far
+    last_error TEXT, -- Error from the latest failed attempt
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Earliest time to (re)try
+    locked_at TIMESTAMP, -- When a worker claimed the job
+    dead_at TIMESTAMP, -- When the job was dead-lettered
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (post_id) REFERENCES user_posts(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Table: reaper_state
+-- Single-row progress of the expired-post reaper, shared by whichever instance leads it
+CREATE TABLE reaper_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CONSTRAINT reaper_state_single_row CHECK (id = 1),
+    announced_until TIMESTAMP -- Partitioned storage: posts expiring up to here have been announced
+);
+
 -- Table: user_streaks
 -- Tracks user posting/activity streaks for rewards and motivation
 CREATE TABLE user_streaks (
@@ -337,6 +392,36 @@ CREATE TABLE user_connections (
 );
 
 
+-- INDEXES
+-- Secondary indexes for hot query predicates (mirrors db_migrations/0001_hot_path_indexes.sql)
+CREATE INDEX idx_user_posts_expires_at ON user_posts (expires_at); -- Expired-post cleanup
+CREATE INDEX idx_user_posts_created_at_id ON user_posts (created_at DESC, id DESC); -- Public feed pages
+CREATE INDEX idx_user_posts_user_created_at_id ON user_posts (user_id, created_at DESC, id DESC); -- My posts pages
+CREATE INDEX idx_users_public_id ON users (id) WHERE is_private = FALSE; -- Public feed author filter
+CREATE INDEX idx_post_reactions_user_id ON post_reactions (user_id); -- Reactions by user
+CREATE INDEX idx_post_comments_post_created_at ON post_comments (post_id, created_at); -- Comment threads
+CREATE INDEX idx_post_comments_user_id ON post_comments (user_id); -- Comments by user
+CREATE INDEX idx_media_jobs_status_run_at ON media_jobs (status, run_at); -- Media workers claiming due jobs
+
+
+-- MIGRATIONS
+-- This schema already includes every migration in db_migrations/, so record them all as applied:
+-- migrate.py then has nothing to run on a fresh database (including after db_partitioned_posts.sql,
+-- whose partitioned tables would reject CREATE INDEX CONCURRENTLY). Add new versions here too.
+CREATE TABLE schema_migrations (
+    version VARCHAR(255) PRIMARY KEY, -- Migration file name without .sql
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_migrations (version) VALUES
+    ('0001_hot_path_indexes'),
+    ('0002_post_stats'),
+    ('0003_media_jobs'),
+    ('0004_post_expires_at'),
+    ('0005_media_job_files'),
+    ('0006_reaper_state');
+
+
 -- TODO: Future additions
 -- - Add user_photos table to store 1–3 photos per profile
 -- - Add reporting, blocking, or user activity history if needed
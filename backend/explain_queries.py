@@ -0,0 +1,134 @@
+"""
+Run EXPLAIN ANALYZE on the hot route queries to check index use.
+
+Builds the same SQLAlchemy statements the routes and background jobs issue
+(feed page, my-posts page, comment and counter batches, expired-post scan,
+Firebase UID lookup), runs `EXPLAIN (ANALYZE, BUFFERS)` on each against the
+configured database, prints the plans, and flags sequential scans on large tables.
+
+Intended for a local Postgres only: `--seed` inserts synthetic users, posts,
+reactions and comments before explaining.
+
+Usage:
+- python3 explain_queries.py               # Explain against existing data
+- python3 explain_queries.py --seed 2000   # Seed 2000 users (10 posts each) first
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from database import engine
+from logger import logger
+from models import UserPost, PostComment, PostStats, User
+from utils.pagination import apply_keyset, DEFAULT_PAGE_SIZE
+
+SEED_SQL = [
+    """
+    INSERT INTO users (firebase_uid, name, email, is_private)
+    SELECT 'seed-' || g, 'Seed User ' || g, 'seed' || g || '@example.com', g % 10 = 0
+    FROM generate_series(1, :users) AS g
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO user_posts (user_id, content, created_at, expires_at)
+    SELECT u.id, 'Seed post', now() - random() * interval '1 day', now() + (random() - 0.1) * interval '1 day'
+    FROM users u CROSS JOIN generate_series(1, 10)
+    WHERE u.firebase_uid LIKE 'seed-%'
+    """,
+    """
+    INSERT INTO post_stats (post_id, post_expires_at)
+    SELECT id, expires_at FROM user_posts
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO post_reactions (post_id, post_expires_at, user_id, type)
+    SELECT p.id, p.expires_at, p.user_id, 'like' FROM user_posts p
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO post_comments (post_id, post_expires_at, user_id, content)
+    SELECT p.id, p.expires_at, p.user_id, 'Seed comment' FROM user_posts p
+    """,
+    "ANALYZE",
+]
+
+async def sample_ids(conn) -> tuple:
+    """
+    Pick a real user, firebase UID, and a page of post IDs to use as query parameters.
+    """
+
+    row = (await conn.execute(text("SELECT id, firebase_uid FROM users LIMIT 1"))).first()
+    post_ids = (await conn.execute(
+        text(f"SELECT id FROM user_posts ORDER BY created_at DESC LIMIT {DEFAULT_PAGE_SIZE}")
+    )).scalars().all()
+    return row, post_ids
+
+def hot_queries(user_id, firebase_uid, post_ids) -> dict:
+    """
+    Build the route statements to explain, keyed by a descriptive name.
+    """
+
+    now = datetime.utcnow()
+    feed = (
+        select(UserPost, User)
+        .join(User, User.id == UserPost.user_id)
+        .where(User.is_private == False, UserPost.expires_at > now)
+    )
+    return {
+        "GET /posts/feed (page)": apply_keyset(feed, UserPost.created_at, UserPost.id, None, DEFAULT_PAGE_SIZE),
+        "GET /posts/me (page)": apply_keyset(
+            select(UserPost).where(UserPost.user_id == user_id, UserPost.expires_at > now),
+            UserPost.created_at, UserPost.id, None, DEFAULT_PAGE_SIZE,
+        ),
+        "feed builder: post_stats batch": select(PostStats).where(PostStats.post_id.in_(post_ids)),
+        "feed builder: comments batch": (
+            select(PostComment, User)
+            .join(User, User.id == PostComment.user_id)
+            .where(PostComment.post_id.in_(post_ids))
+            .order_by(PostComment.post_id, PostComment.created_at.asc())
+        ),
+        "cleanup: expired posts": select(UserPost.id, UserPost.image_public_id).where(UserPost.expires_at <= datetime.utcnow()),
+        "auth: user by firebase_uid": select(User).where(User.firebase_uid == firebase_uid),
+    }
+
+async def explain_all(seed_users: int = 0):
+    """
+    Optionally seed the database, then print EXPLAIN ANALYZE output for each hot query.
+
+    Parameters:
+    - seed_users (int): Number of synthetic users to insert first (0 = no seeding).
+
+    Returns:
+    - None
+    """
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SET LOCAL statement_timeout = 0")) # Seeding and EXPLAIN ANALYZE may be slow
+        if seed_users:
+            logger.info(f"Seeding {seed_users} users with 10 posts each...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement), {"users": seed_users} if ":users" in statement else {})
+
+        row, post_ids = await sample_ids(conn)
+        if not row or not post_ids:
+            logger.error("No users or posts found; run with --seed N first.")
+            return
+
+        for name, stmt in hot_queries(row.id, row.firebase_uid, post_ids).items():
+            sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))).scalars().all()
+            seq_scans = [line.strip() for line in plan if "Seq Scan" in line]
+
+            print(f"\n=== {name} ===")
+            print("\n".join(plan))
+            if seq_scans:
+                print(f"[WARNING] Sequential scan(s): {seq_scans}")
+
+    await engine.dispose()
+
+# Run the explain suite when executed as a script
+if __name__ == "__main__":
+    seed = int(sys.argv[sys.argv.index("--seed") + 1]) if "--seed" in sys.argv else 0
+    asyncio.run(explain_all(seed))
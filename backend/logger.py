@@ -1,5 +1,18 @@
 import logging  
 import sys    
+from contextvars import ContextVar
+
+# ID of the HTTP request being handled, set by utils/middleware.RequestContextMiddleware ("-" outside requests)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+class RequestIdFilter(logging.Filter):
+    """
+    Attach the current request ID to every log record as `request_id`.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
 
 def setup_logger(log_file="app.log", level=logging.INFO):
     """
@@ -14,7 +27,7 @@ def setup_logger(log_file="app.log", level=logging.INFO):
 
     Behavior:
     - Clears any existing handlers to prevent duplicate logging.
-    - Sets a consistent log message format including timestamp and level.
+    - Sets a consistent log message format including timestamp, level and request ID.
     - Adds a console handler that outputs to stdout.
     - Adds a file handler that writes logs to the specified file.
     """
@@ -27,16 +40,18 @@ def setup_logger(log_file="app.log", level=logging.INFO):
         logger.handlers.clear()
 
     # Define the log message format
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] [%(request_id)s] %(message)s')
 
     # Console handler: prints logs to stdout
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
+    console_handler.addFilter(RequestIdFilter())
     logger.addHandler(console_handler)
 
     # File handler: writes logs to specified file
     file_handler = logging.FileHandler(log_file)
     file_handler.setFormatter(formatter)
+    file_handler.addFilter(RequestIdFilter())
     logger.addHandler(file_handler)
 
     return logger
@@ -1,12 +1,25 @@
-from fastapi import FastAPI 
+from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware 
 from logger import logger
 from routes import auth, users, locations, hobbies, posts, websocket
 from datetime import datetime
 import asyncio
-from utils.clean_up import delete_expired_posts_loop
+from utils.expiry_scheduler import expiry_scheduler
+from utils.post_stats import reconcile_post_stats_loop
+from utils.metrics import metrics
+from database import record_pool_metrics
+from models import User
+from utils.admin import require_admin
+from utils.current_user import get_current_user, start_user_cache_sync, stop_user_cache_sync
+from utils.firebase_token import token_verifier
+from utils.cloudinary import media_client
+from utils.media_jobs import start_media_workers
+from utils.post_stats_batcher import post_stats_batcher
+from utils.redis_ws_manager import manager
+from utils.read_replicas import replica_router
+from utils.catalog import catalog
+from utils.middleware import ConditionalCompressionMiddleware, CrossOriginIsolationMiddleware, RequestContextMiddleware, UploadSizeLimitMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -14,21 +27,44 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for handling app startup and shutdown tasks.
 
     Behavior:
-    - On startup: logs a message and starts the background task to clean up expired posts.
-    - On shutdown: cancels the background task and logs the app uptime.
+    - On startup: connects WebSocket broadcasting to Redis, checks read replicas, loads the hobby and location
+      catalogs, follows user cache invalidations, logs a message, and starts the
+      background tasks that reap expired posts at their deadlines, reconcile post engagement counters,
+      upload post images, and refresh Firebase signing keys.
+    - On shutdown: cancels and awaits the background tasks before closing the Redis and media clients they use,
+      and logs the app uptime.
     """
 
     start_time = datetime.utcnow()
-    task = asyncio.create_task(delete_expired_posts_loop()) # Start background cleanup loop
+    await manager.start() # Connect WebSocket broadcasting to Redis pub/sub
+    await replica_router.start() # Check read replicas before routing reads to them
+    await catalog.start() # Load hobbies and locations, and follow invalidations from other instances
+    start_user_cache_sync() # Drop cached users changed on other instances
+    tasks = [
+        asyncio.create_task(expiry_scheduler.run()), # Reap expired posts at their deadlines (leader instance)
+        asyncio.create_task(reconcile_post_stats_loop()), # Start counter drift repair loop
+        *start_media_workers(), # Start background post image uploads
+    ]
+    token_verifier.start() # Keep Firebase signing keys fresh in the background
     try:
         logger.info("HobbyMatch Backend Server is starting up!")
         yield
     finally:
-        task.cancel() # Gracefully cancel cleanup task on shutdown
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        # Stop the background tasks first: media workers and the reaper use the clients closed below
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await token_verifier.stop()
+        await post_stats_batcher.flush() # Send counter updates still waiting for their window
+        await catalog.stop() # Stop catalog refreshes before the Redis client closes
+        await stop_user_cache_sync()
+        await manager.stop() # Close the Redis pub/sub connection
+        await replica_router.stop() # Stop replica health checks and close their pools
+        await media_client.aclose() # Release pooled Cloudinary connections
         uptime = datetime.utcnow() - start_time
         logger.info(f"HobbyMatch Backend Server is shutting down! Uptime: {uptime}")
 
@@ -47,25 +83,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],    # Allow all HTTP methods
     allow_headers=["*"],    # Allow all custom headers
+    expose_headers=["X-Request-ID"], # Let the frontend report request IDs
 )
 
-class CORPMiddleware(BaseHTTPMiddleware):
-    """
-    Custom middleware to enforce Cross-Origin policies for secure browser contexts.
+# Add ETags, 304s and gzip/brotli compression to GET responses
+app.add_middleware(ConditionalCompressionMiddleware)
 
-    Headers added:
-    - Cross-Origin-Opener-Policy: Ensures same-origin isolation.
-    - Cross-Origin-Embedder-Policy: Blocks loading cross-origin resources without CORS.
-    """
+# Add COOP/COEP headers for secure context (outside compression, so 304s get them too)
+app.add_middleware(CrossOriginIsolationMiddleware)
 
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
-        response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
-        return response
+# Reject oversized uploads before their body is spooled to disk
+app.add_middleware(UploadSizeLimitMiddleware)
 
-# Add COOP/COEP middleware for secure context
-app.add_middleware(CORPMiddleware)
+# Assign request IDs and time requests (outermost, so timings include every middleware)
+app.add_middleware(RequestContextMiddleware)
 
 # Register application routers for various modules
 app.include_router(auth.router)        # Auth endpoints
@@ -86,6 +117,25 @@ def read_root():
 
     return {"message": "HobbyMatch App Backend Server is running!"}
 
+@app.get("/metrics")
+async def read_metrics(current_user: User = Depends(get_current_user)):
+    """
+    Expose in-process counters and gauges (cache hit rates, DB pool usage, etc.) for this instance.
+
+    Parameters:
+    - current_user (User): The currently authenticated user; must be an admin.
+
+    Returns:
+    - JSON object with "counters" and "gauges" maps.
+
+    Raises:
+    - HTTPException 401 if the token is missing or invalid, 403 if the user is not an admin.
+    """
+
+    require_admin(current_user)
+    record_pool_metrics()
+    return metrics.snapshot()
+
 # Local development entry point
 if __name__ == "__main__":
     import uvicorn
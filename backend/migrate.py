@@ -0,0 +1,145 @@
+"""
+Versioned SQL migration runner.
+
+Applies the numbered `.sql` files in `db_migrations/` (e.g. `0001_hot_path_indexes.sql`)
+in order and records each applied version in the `schema_migrations` table, so every
+file runs exactly once per database.
+
+Statements run one at a time in autocommit mode, which allows migrations to use
+`CREATE INDEX CONCURRENTLY`, on a direct connection (HOBBYMATCH_DIRECT_DATABASE_URL,
+bypassing PgBouncer) with no statement timeout. Migration files should therefore be idempotent
+(`IF NOT EXISTS`) so a partially applied file can be safely re-run. A failed
+`CREATE INDEX CONCURRENTLY` leaves an INVALID index behind, which `IF NOT EXISTS` would
+otherwise skip; the runner drops it before the statement is retried.
+
+Usage:
+- python3 migrate.py           # Apply all pending migrations
+- python3 migrate.py --status  # List applied and pending migrations
+"""
+
+import asyncio
+import os
+import re
+import sys
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+from database import create_db_engine, DIRECT_DATABASE_URL
+from logger import logger
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_migrations")
+CONCURRENT_INDEX = re.compile(
+    r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE
+)
+
+def list_migrations() -> list[tuple[str, str]]:
+    """
+    List migration files in version order.
+
+    Returns:
+    - list[tuple[str, str]]: (version, file path) pairs, where version is the file name without `.sql`.
+    """
+
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    return [(f[:-4], os.path.join(MIGRATIONS_DIR, f)) for f in files]
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Split a migration file into individual statements.
+
+    Parameters:
+    - sql (str): File contents; statements end with `;` and `--` comments are ignored.
+      Semicolons inside `$$ ... $$` bodies (e.g. `DO $$ ... $$` blocks) do not end a statement.
+
+    Returns:
+    - list[str]: Non-empty SQL statements.
+    """
+
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    statements, current = [], ""
+    # Even-numbered chunks lie outside dollar quotes, odd-numbered chunks inside
+    for i, chunk in enumerate("\n".join(lines).split("$$")):
+        if i % 2:
+            current += f"$${chunk}$$"
+            continue
+        *done, current_tail = chunk.split(";")
+        for part in done:
+            statements.append(current + part)
+            current = ""
+        current += current_tail
+    statements.append(current)
+    return [stmt.strip() for stmt in statements if stmt.strip()]
+
+async def drop_invalid_index(conn, statement: str):
+    """
+    Drop the index a `CREATE INDEX CONCURRENTLY` statement builds if a failed earlier
+    attempt left it INVALID, so the statement builds it again instead of skipping it.
+
+    Parameters:
+    - conn: Autocommit connection the migration runs on.
+    - statement (str): The migration statement about to run.
+    """
+
+    match = CONCURRENT_INDEX.match(statement)
+    if match is None:
+        return
+    result = await conn.execute(text(
+        "SELECT quote_ident(n.nspname) || '.' || quote_ident(c.relname) "
+        "FROM pg_class c "
+        "JOIN pg_index i ON i.indexrelid = c.oid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :name AND NOT i.indisvalid AND n.nspname = ANY(current_schemas(false))"
+    ), {"name": match.group(1)})
+    for index in result.scalars().all():
+        logger.warning(f"Dropping invalid index {index} left by a failed build")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+
+async def run_migrations(status_only: bool = False):
+    """
+    Apply pending migrations, or report their status.
+
+    Parameters:
+    - status_only (bool): Only log applied/pending versions without applying anything.
+
+    Returns:
+    - None
+    """
+
+    engine = create_db_engine(DIRECT_DATABASE_URL, pgbouncer=False, poolclass=NullPool)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SET statement_timeout = 0")) # Index builds may take a while
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(255) PRIMARY KEY, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars().all())
+
+        for version, path in list_migrations():
+            if version in applied:
+                logger.info(f"Migration {version}: applied")
+                continue
+            if status_only:
+                logger.info(f"Migration {version}: pending")
+                continue
+
+            logger.info(f"Applying migration {version}...")
+            with open(path) as f:
+                for statement in split_statements(f.read()):
+                    await drop_invalid_index(conn, statement)
+                    await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": version},
+            )
+            logger.info(f"Migration {version} applied.")
+
+    await engine.dispose()
+
+# Run migrations when executed as a script
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_migrations(status_only="--status" in sys.argv))
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
@@ -1,5 +1,5 @@
 # Import enums representing various application states and types
-from .enums import MatchStatus, MatchType, ReactionType, EventType, NotificationType, UserRole, RsvpStatus, HobbyCategory
+from .enums import MatchStatus, MatchType, ReactionType, EventType, NotificationType, UserRole, RsvpStatus, HobbyCategory, ImageStatus, MediaJobStatus
 
 # SQLAlchemy models for each main entity in the app
 from .hobbies import Hobby
@@ -10,7 +10,9 @@ from .reviews import Review
 from .notifications import Notification
 from .user_hobbies import UserHobby
 from .users import User
-from .posts import UserPost, PostComment, PostReaction, ReactionType
+from .posts import UserPost, PostComment, PostReaction, PostStats, ReactionType
+from .media_jobs import MediaJob
+from .reaper_state import ReaperState
 from .base import Base
 
 # Export all schemas
@@ -23,6 +25,8 @@ __all__ = [
     "UserRole",
     "RsvpStatus",
     "HobbyCategory",
+    "ImageStatus",
+    "MediaJobStatus",
     "Hobby",
     "Location",
     "Match",
@@ -34,6 +38,9 @@ __all__ = [
     "UserPost",
     "PostComment",
     "PostReaction",
+    "PostStats",
+    "MediaJob",
+    "ReaperState",
     "ReactionType",
     "Base"
 ]
\ No newline at end of file
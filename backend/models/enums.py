@@ -64,4 +64,17 @@ class RsvpStatus(str, enum.Enum):
 # Event format type
 class EventType(str, enum.Enum):
     virtual = "virtual"
-    in_person = "in-person"
\ No newline at end of file
+    in_person = "in-person"
+
+# Processing state of a post's image
+class ImageStatus(str, enum.Enum):
+    none = "none" # Post has no image
+    pending_image = "pending_image" # Image queued for upload
+    ready = "ready"
+    failed = "failed"
+
+# State of a background media job
+class MediaJobStatus(str, enum.Enum):
+    pending = "pending"
+    processing = "processing"
+    dead = "dead" # Out of retries; kept for inspection (dead-letter queue)
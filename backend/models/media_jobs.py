@@ -0,0 +1,30 @@
+from sqlalchemy import Column, ForeignKey, String, Text, DateTime, Enum, Integer, LargeBinary, Index
+from sqlalchemy.dialects.postgresql import UUID
+from uuid import uuid4
+from datetime import datetime
+from models.base import Base
+from models.enums import MediaJobStatus
+
+# Queued image upload for a post, processed by the background media workers
+class MediaJob(Base):
+    __tablename__ = "media_jobs"
+    __table_args__ = (
+        Index("idx_media_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    post_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("user_posts.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    image_file = Column(String, nullable=True) # Spooled upload in MEDIA_SPOOL_DIR, removed once no longer needed
+    image_data = Column(LargeBinary, nullable=True) # Raw upload of jobs queued before image_file existed
+    status = Column(Enum(MediaJobStatus, name="media_job_status"), nullable=False, default=MediaJobStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow) # Earliest time to (re)try
+    locked_at = Column(DateTime, nullable=True) # When a worker claimed the job
+    dead_at = Column(DateTime, nullable=True) # When the job was dead-lettered
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, ForeignKey, Text, DateTime, Enum, String
+from sqlalchemy import Column, ForeignKey, Text, DateTime, Enum, String, Integer, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from uuid import uuid4
 from datetime import datetime
 from models.base import Base
+from database import POSTS_PARTITIONED
+from models.enums import ImageStatus
 import enum
 
 
@@ -16,17 +18,30 @@ class ReactionType(str, enum.Enum):
     sad = "sad"
 
 # Represents a post created by a user
+# In partitioned storage, post tables are range-partitioned by the post's expiry, so the
+# partition key joins each primary key (see db_partitioned_posts.sql)
 class UserPost(Base):
     __tablename__ = "user_posts"
+    __table_args__ = (
+        Index("idx_user_posts_expires_at", "expires_at"),
+        Index("idx_user_posts_created_at_id", text("created_at DESC"), text("id DESC")),
+        Index("idx_user_posts_user_created_at_id", "user_id", text("created_at DESC"), text("id DESC")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
     image_url = Column(String, nullable=True)
     image_public_id = Column(String, nullable=True)
+    image_status = Column(
+        Enum(ImageStatus, name="image_status"),
+        nullable=False,
+        default=ImageStatus.none,
+        server_default=ImageStatus.none.value
+    )
     hobby_id = Column(UUID(as_uuid=True), ForeignKey("hobbies.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, primary_key=POSTS_PARTITIONED)
 
     # Relationships
     user = relationship("User", back_populates="posts")
@@ -36,6 +51,10 @@ class UserPost(Base):
 # Represents a comment on a user post
 class PostComment(Base):
     __tablename__ = "post_comments"
+    __table_args__ = (
+        Index("idx_post_comments_post_created_at", "post_id", "created_at"),
+        Index("idx_post_comments_user_id", "user_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     post_id = Column(
@@ -44,6 +63,7 @@ class PostComment(Base):
         nullable=False
     )
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    post_expires_at = Column(DateTime, nullable=False, primary_key=POSTS_PARTITIONED) # Copy of the post's expires_at
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -54,12 +74,33 @@ class PostComment(Base):
 # Represents a reaction (like, love, etc.) on a user post
 class PostReaction(Base):
     __tablename__ = "post_reactions"
+    __table_args__ = (
+        Index("idx_post_reactions_user_id", "user_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     post_id = Column(UUID(as_uuid=True), ForeignKey("user_posts.id"), nullable=False)
+    post_expires_at = Column(DateTime, nullable=False, primary_key=POSTS_PARTITIONED) # Copy of the post's expires_at
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     type = Column(Enum(ReactionType, name="reaction_type"), nullable=False)
 
     # Relationships
     post = relationship("UserPost", back_populates="reactions")
     user = relationship("User", back_populates="reactions")
+
+# Denormalized engagement counters for a user post, kept in sync on write
+class PostStats(Base):
+    __tablename__ = "post_stats"
+
+    post_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("user_posts.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    post_expires_at = Column(DateTime, nullable=False, primary_key=POSTS_PARTITIONED) # Copy of the post's expires_at
+    like_count = Column(Integer, nullable=False, default=0)
+    love_count = Column(Integer, nullable=False, default=0)
+    fire_count = Column(Integer, nullable=False, default=0)
+    laugh_count = Column(Integer, nullable=False, default=0)
+    sad_count = Column(Integer, nullable=False, default=0)
+    comment_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, DateTime, CheckConstraint
+from models.base import Base
+
+# Single-row progress of the expired-post reaper, shared by whichever instance leads it
+class ReaperState(Base):
+    __tablename__ = "reaper_state"
+    __table_args__ = (
+        CheckConstraint("id = 1", name="reaper_state_single_row"),
+    )
+
+    id = Column(Integer, primary_key=True, default=1)
+    announced_until = Column(DateTime, nullable=True) # Partitioned storage: posts expiring up to here have been announced
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, TIMESTAMP
+from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, TIMESTAMP, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -10,6 +10,9 @@ from sqlalchemy import Enum
 # User model representing a platform user with profile and role info
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("idx_users_public_id", "id", postgresql_where=text("is_private = FALSE")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     firebase_uid = Column(String(128), unique=True, nullable=False) # Firebase Authentication UID (unique)
@@ -7,6 +7,7 @@ from database import get_db
 from schemas import LoginRequest, LoginResponse, SignupRequest
 from logger import logger
 from utils.firebase_token import verify_firebase_token
+from utils.current_user import invalidate_cached_user
 
 # Define API router for authentication endpoints
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -28,7 +29,7 @@ async def signup_user(signup: SignupRequest, db: AsyncSession = Depends(get_db))
     - HTTPException 400 if the user already exists.
     """
 
-    decoded_token = verify_firebase_token(signup.id_token)
+    decoded_token = await verify_firebase_token(signup.id_token)
     firebase_uid = decoded_token["uid"]
     email = decoded_token["email"]
     name = decoded_token.get("name", "Unnamed User")
@@ -56,6 +57,7 @@ async def signup_user(signup: SignupRequest, db: AsyncSession = Depends(get_db))
     db.add(new_user)
     await db.commit()
     await db.refresh(new_user)
+    await invalidate_cached_user(firebase_uid)
 
     # Log signup event and return user info
     logger.info(f"{User.name} signed up")
@@ -83,7 +85,7 @@ async def login_user(login: LoginRequest, db: AsyncSession = Depends(get_db)):
     - HTTPException 404 if the user does not exist.
     """
 
-    decoded_token = verify_firebase_token(login.id_token)
+    decoded_token = await verify_firebase_token(login.id_token)
     firebase_uid = decoded_token["uid"]
 
     # Look up user by Firebase UID
@@ -7,6 +7,7 @@ from uuid import UUID
 from models import Hobby, User, UserHobby
 from schemas.hobbies import HobbyCreate, HobbyRead, HobbyUpdate, HobbyUpdateRequest, UserHobbyRead
 from database import get_db
+from utils.catalog import catalog, HOBBIES, CATEGORIES
 from utils.current_user import get_current_user
 from utils.admin import require_admin
 from models import HobbyCategory
@@ -21,27 +22,25 @@ async def get_hobby_categories():
     Fetch all hobby categories as a list of strings.
 
     Returns:
-    - List[str]: Available hobby categories (Enum values).
+    - List[str]: Available hobby categories (Enum values), or 304 if unchanged.
     """
-    return [category.value for category in HobbyCategory]
+    return (await catalog.entry(CATEGORIES)).response()
 
 @router.get("", response_model=list[HobbyRead])
-async def get_all_hobbies(db: AsyncSession = Depends(get_db)):
+async def get_all_hobbies():
     """
     Fetch all hobbies in the system (available to all users).
 
-    Parameters:
-    - db (AsyncSession): Dependency-injected database session.
+    Served from the in-memory catalog (see `utils/catalog.py`) with an ETag.
 
     Returns:
-    - List[HobbyRead]: All hobbies in the database.
+    - List[HobbyRead]: All hobbies in the database, or 304 if unchanged.
 
     Raises:
-    - HTTP 500 on database errors.
+    - HTTP 500 if the catalog cannot be loaded.
     """
     try:
-        result = await db.execute(select(Hobby))
-        return result.scalars().all()
+        return (await catalog.entry(HOBBIES)).response()
     except Exception as e:
         logger.error(f"Error fetching hobbies: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching hobbies: {str(e)}")
@@ -76,6 +75,7 @@ async def create_hobby(
     db.add(hobby)
     await db.commit()
     await db.refresh(hobby)
+    await catalog.invalidate(HOBBIES)
     return hobby
 
 @router.put("/me", status_code=status.HTTP_200_OK)
@@ -96,14 +96,14 @@ async def update_user_hobby_ids(
     - dict: Confirmation message.
 
     Raises:
-    - HTTP 400 if more than 3 hobbies or invalid hobby IDs are provided.
+    - HTTP 400 if more than 3 hobbies or invalid hobby IDs are provided (including a hobby
+      deleted on another instance that this instance's catalog still lists).
     """
     if len(payload.hobby_ids) > 3:
         raise HTTPException(status_code=400, detail="You can select up to 3 hobbies only")
 
-    # Make sure all hobbies exist
-    result = await db.execute(select(Hobby.id).where(Hobby.id.in_(payload.hobby_ids)))
-    found_ids = set(r[0] for r in result.all())
+    # Make sure all hobbies exist (from the catalog)
+    found_ids = await catalog.existing_hobby_ids(db, payload.hobby_ids)
     if set(payload.hobby_ids) != found_ids:
         logger.error("One or more hobby IDs are invalid")
         raise HTTPException(status_code=400, detail="One or more hobby IDs are invalid")
@@ -119,7 +119,14 @@ async def update_user_hobby_ids(
 
     # Add to DB
     db.add_all(new_user_hobbies)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if not await catalog.recover_from_deleted_hobby(e):
+            raise
+        logger.error("One or more hobby IDs are invalid (deleted since the catalog was loaded)")
+        raise HTTPException(status_code=400, detail="One or more hobby IDs are invalid")
 
     return {"detail": "Hobbies updated"}
 
@@ -164,6 +171,7 @@ async def update_hobby(
     # Add to DB
     await db.commit()
     await db.refresh(hobby)
+    await catalog.invalidate(HOBBIES)
     return hobby
 
 @router.delete("/{hobby_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -199,6 +207,7 @@ async def delete_hobby(
     # Delete from db
     await db.delete(hobby)
     await db.commit()
+    await catalog.invalidate(HOBBIES)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/users/me/hobbies", response_model=list[UserHobbyRead])
@@ -231,7 +240,8 @@ async def replace_my_hobbies(
 ):
     """
     Replace current user's hobbies with a new list (up to 3).
-    If a hobby does not exist, it is created automatically.
+    If a hobby does not exist, it is created automatically (also when the catalog still
+    listed it but it was deleted on another instance: the save is retried once).
 
     Parameters:
     - hobbies_in (List[HobbyCreate]): New hobby list (max 3).
@@ -256,54 +266,68 @@ async def replace_my_hobbies(
             logger.error(f"Invalid hobby category: {h.category}")
             raise HTTPException(status_code=400, detail=f"Invalid hobby category: {h.category}")
 
-    new_user_hobbies = []  # List to store new UserHobby objects
-
-    try:
-        # Delete existing hobbies
-        await db.execute(delete(UserHobby).where(UserHobby.user_id == current_user.id))
-
-        # Create new hobbies
-        for index, hobby_in in enumerate(hobbies_in, start=1):
-            result = await db.execute(
-                select(Hobby).where(
-                    Hobby.name.ilike(hobby_in.name.strip()),
-                    Hobby.category == hobby_in.category
-                )
-            )
-            hobby = result.scalar_one_or_none()
-
-            # If hobby doesn't exist, create it
-            if not hobby:
-                hobby = Hobby(
-                    name=hobby_in.name.strip(),
-                    category=hobby_in.category,
-                    created_by=current_user.id
+    # A hobby the catalog still lists may have been deleted on another instance; the
+    # save then fails its foreign key, and is retried once against the reloaded catalog
+    for attempt in range(2):
+        new_user_hobbies = []  # List to store new UserHobby objects
+        created_hobbies = False
+
+        try:
+            # Delete existing hobbies
+            await db.execute(delete(UserHobby).where(UserHobby.user_id == current_user.id))
+
+            # Create new hobbies
+            for index, hobby_in in enumerate(hobbies_in, start=1):
+                # Look the hobby up in the catalog, then in the DB (it may be newer than the catalog)
+                hobby = catalog.hobby_by_name(hobby_in.name, hobby_in.category)
+                if not hobby:
+                    result = await db.execute(
+                        select(Hobby).where(
+                            Hobby.name.ilike(hobby_in.name.strip()),
+                            Hobby.category == hobby_in.category
+                        )
+                    )
+                    hobby = result.scalar_one_or_none()
+
+                # If hobby doesn't exist, create it
+                if not hobby:
+                    hobby = Hobby(
+                        name=hobby_in.name.strip(),
+                        category=hobby_in.category,
+                        created_by=current_user.id
+                    )
+                    db.add(hobby)
+                    await db.flush()
+                    created_hobbies = True
+
+                # Create UserHobby
+                user_hobby = UserHobby(
+                    user_id=current_user.id,
+                    hobby_id=hobby.id,
+                    rank=index
                 )
-                db.add(hobby)
-                await db.flush()
-
-            # Create UserHobby
-            user_hobby = UserHobby(
-                user_id=current_user.id,
-                hobby_id=hobby.id,
-                rank=index
-            )
-            db.add(user_hobby)
-            new_user_hobbies.append(user_hobby)
+                db.add(user_hobby)
+                new_user_hobbies.append(user_hobby)
 
-        await db.commit()
+            await db.commit()
+            if created_hobbies:
+                await catalog.invalidate(HOBBIES)
 
-        # Refresh hobbies
-        for uh in new_user_hobbies:
-            await db.refresh(uh)
+            # Refresh hobbies
+            for uh in new_user_hobbies:
+                await db.refresh(uh)
+
+            break
+
+        except IntegrityError as e:
+            await db.rollback()
+            if attempt == 0 and await catalog.recover_from_deleted_hobby(e):
+                continue
+            logger.error("Duplicate hobbies detected")
+            raise HTTPException(status_code=409, detail="Duplicate hobbies detected")
+        except Exception:
+            await db.rollback()
+            raise
 
-    except IntegrityError:
-        await db.rollback()
-        logger.error("Duplicate hobbies detected")
-        raise HTTPException(status_code=409, detail="Duplicate hobbies detected")
-    except Exception:
-        await db.rollback()
-        raise
-    
     return new_user_hobbies
 
@@ -5,6 +5,7 @@ from geopy.geocoders import Nominatim
 from models import Location
 from schemas import LocationResolveRequest, LocationRead
 from database import get_db
+from utils.catalog import catalog, LOCATIONS
 from utils.current_user import blur_and_round
 from timezonefinder import TimezoneFinder
 from logger import logger
@@ -13,21 +14,16 @@ from logger import logger
 router = APIRouter(prefix="/locations", tags=["Locations"])
 
 @router.get("", response_model=list[LocationRead])
-async def list_locations(db: AsyncSession = Depends(get_db)):
+async def list_locations():
     """
-    Fetch all saved locations from the database.
-
-    Parameters:
-    - db (AsyncSession): DB session.
+    Fetch all saved locations, from the in-memory catalog (see `utils/catalog.py`) with an ETag.
 
     Returns:
-    - List[LocationRead]: All location records.
+    - List[LocationRead]: All location records, or 304 if unchanged.
     """
 
     try:
-        # Fetch all locations
-        result = await db.execute(select(Location))
-        return result.scalars().all()
+        return (await catalog.entry(LOCATIONS)).response()
     except Exception as e:
         logger.error(f"Error fetching locations: {e}")
         raise HTTPException(status_code=500, detail="Error fetching locations")
@@ -105,6 +101,7 @@ async def resolve_location(
     db.add(new_location)
     await db.commit()
     await db.refresh(new_location)
+    await catalog.invalidate(LOCATIONS)
     return new_location # Return new location
 
 
@@ -1,20 +1,51 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
-from typing import List, Optional
+from sqlalchemy import select, delete
+from typing import Optional
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta
-from models import UserPost, PostComment, PostReaction, User
-from schemas import PostRead, CommentCreate, CommentRead, PostReactionCreate
+from models import UserPost, PostComment, PostReaction, PostStats, User
+from schemas import PostRead, PostPage, CommentCreate, CommentRead, PostReactionCreate
 from utils.current_user import get_current_user
 from database import get_db
+from utils.read_replicas import get_read_db
 from logger import logger
-from utils.cloudinary import upload_photo_to_cloudinary
-from utils.redis_ws_manager import manager
+from utils.uploads import spool_image_upload
+from utils.media_jobs import enqueue_media_job, notify_media_workers
+from utils.expiry_scheduler import notify_post_expiry
+from utils.redis_ws_manager import manager, FEED_TOPIC, hobby_topic, post_topic
+from utils.feed import build_post_reads
+from utils.feed_cache import feed_cache
+from utils.post_stats import bump_comment_count, bump_reaction_count
+from utils.post_stats_batcher import post_stats_batcher
+from utils.pagination import apply_keyset, split_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 # Define API router for post-related endpoints
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+async def get_post_expiry(db: AsyncSession, post_id: UUID) -> datetime:
+    """
+    Look up an unexpired post's expires_at, which its comments, reactions and counters store.
+
+    Parameters:
+    - db (AsyncSession): DB session.
+    - post_id (UUID): Post identifier.
+
+    Returns:
+    - datetime: The post's expiration time.
+
+    Raises:
+    - HTTP 404 if the post does not exist or has expired.
+    """
+
+    result = await db.execute(
+        select(UserPost.expires_at).where(UserPost.id == post_id, UserPost.expires_at > datetime.utcnow())
+    )
+    expires_at = result.scalar()
+    if expires_at is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return expires_at
+
 @router.post("", response_model=PostRead)
 async def create_post(
     content: str = Form(...),
@@ -34,19 +65,18 @@ async def create_post(
     - user (User): Authenticated user.
 
     Returns:
-    - PostRead: Serialized post with metadata.
-    """
+    - PostRead: Serialized post with metadata. Posts with an image are returned in the
+      `pending_image` state; an `image_ready` WebSocket event follows once it is uploaded.
 
-    image_url = None
-    image_public_id = None
-    file_bytes = None
+    Raises:
+    - HTTPException 413 if the image exceeds the size limit.
+    - HTTPException 415 if the file is not a supported image type.
+    """
 
-    # If image file is provided, upload to Cloudinary
+    # Spool the image now (size-capped, type-checked); it is uploaded to Cloudinary in the background
+    image_file = None
     if file:
-        file_bytes = await file.read()
-        upload_result = await upload_photo_to_cloudinary(file_bytes, user.id, usage="post")
-        image_url = upload_result["url"]
-        image_public_id = upload_result["public_id"]
+        image_file = await spool_image_upload(file)
 
     now = datetime.utcnow()
     expires_at = now + timedelta(seconds=30) # Temporary expiration 
@@ -58,18 +88,23 @@ async def create_post(
         user_id=user.id,
         content=content,
         hobby_id=hobby_id,
-        image_url=image_url,
-        image_public_id=image_public_id,
         created_at=now,
         expires_at=expires_at,
     )
 
-    # Add post to database
+    # Add post and its zeroed engagement counters to database
     db.add(post)
+    db.add(PostStats(post_id=post.id, post_expires_at=expires_at))
+    if image_file:
+        enqueue_media_job(db, post, image_file) # Post starts in the pending_image state
+    await notify_post_expiry(db, expires_at) # Schedule the reaper for this post's deadline on commit
     await db.commit()
     await db.refresh(post)
+    if image_file:
+        notify_media_workers()
+    await feed_cache.invalidate_head() # A new post can only appear on first pages
 
-    # Broadcast new post via WebSocket
+    # Broadcast new post via WebSocket to feed and hobby subscribers
     await manager.broadcast({
         "type": "new_post",
         "data": {
@@ -81,11 +116,12 @@ async def create_post(
             "name": user.name,
             "profile_pic_url": user.profile_pic_url,
             "image_url": post.image_url,
+            "image_status": post.image_status.value,
             "hobby_id": str(post.hobby_id) if post.hobby_id else None,
             "reaction_counts": {},
             "comment_count": 0
         }
-    })
+    }, topics=[FEED_TOPIC] + ([hobby_topic(post.hobby_id)] if post.hobby_id else []))
 
     # Return post data
     return PostRead(
@@ -93,6 +129,7 @@ async def create_post(
         user_id=user.id,
         content=post.content,
         image_url=post.image_url,
+        image_status=post.image_status.value,
         hobby_id=post.hobby_id,
         created_at=post.created_at,
         expires_at=post.expires_at,
@@ -102,78 +139,76 @@ async def create_post(
         comment_count=0,
     )
 
-@router.get("/feed", response_model=List[PostRead])
-async def get_public_feed(db: AsyncSession = Depends(get_db)):
+@router.get("/feed", response_model=PostPage)
+async def get_public_feed(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Fetch public posts from non-private users with reaction and comment info.
+    Fetch a page of public posts from non-private users with reaction and comment info.
 
     Parameters:
-    - db (AsyncSession): DB session.
+    - cursor (Optional[str]): Opaque cursor from a previous page's `next_cursor`.
+    - limit (int): Page size (max MAX_PAGE_SIZE).
+    - db (AsyncSession): Read-only DB session (replica when available).
 
     Returns:
-    - List[PostRead]: Posts with reactions and comments.
+    - PostPage: Posts with reactions and comments, newest first, and the next cursor.
     """
 
-    # Query public posts with user info
+    # Serve the page from the feed cache if possible
+    body, cache_slot = await feed_cache.get(cursor, limit)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+
+    # Query a page of public posts with user info, keyed on (created_at, id)
     stmt = (
         select(UserPost, User)
         .join(User, User.id == UserPost.user_id)
-        .where(User.is_private == False)
-        .order_by(UserPost.created_at.desc())
+        .where(User.is_private == False, UserPost.expires_at > datetime.utcnow())
     )
+    stmt = apply_keyset(stmt, UserPost.created_at, UserPost.id, cursor, limit)
     results = (await db.execute(stmt)).all()
+    rows, next_cursor = split_page(results, limit, key=lambda row: (row[0].created_at, row[0].id))
 
-    feed = []
-    for post, user in results:
-        # Fetch reaction counts grouped by type
-        reaction_stmt = (
-            select(PostReaction.type, func.count())
-            .where(PostReaction.post_id == post.id)
-            .group_by(PostReaction.type)
-        )
-        reactions = await db.execute(reaction_stmt)
-
-        # Fetch comments and associated user info
-        comment_stmt = (
-            select(PostComment, User)
-            .join(User, User.id == PostComment.user_id)
-            .where(PostComment.post_id == post.id)
-            .order_by(PostComment.created_at.asc())
-        )
-        comments_result = await db.execute(comment_stmt)
-        comment_rows = comments_result.all()  # List of tuples (PostComment, User)
-
-        reaction_counts = {reaction_type.value: count for reaction_type, count in reactions}
-        comment_list = [
-            CommentRead(
-                id=comment.id,
-                post_id=comment.post_id,
-                user_id=comment.user_id,
-                content=comment.content,
-                created_at=comment.created_at,
-                user_name=comment_user.name,
-                profile_pic_url=comment_user.profile_pic_url,
-            )
-            for comment, comment_user in comment_rows
-        ]
-
-        # Append full post object to feed
-        feed.append(PostRead(
-            id=post.id,
-            user_id=user.id,
-            content=post.content,
-            image_url=post.image_url,
-            hobby_id=post.hobby_id,
-            created_at=post.created_at,
-            expires_at=post.expires_at,
-            name=user.name,
-            profile_pic_url=user.profile_pic_url,
-            reaction_counts=reaction_counts,
-            comment_count=len(comment_list),
-            comments=comment_list
-        ))
-
-    return feed
+    # Attach reactions and comments for all posts in batched queries
+    items = await build_post_reads(db, rows)
+
+    # Serialize once and cache the page for subsequent viewers
+    body = PostPage(items=items, next_cursor=next_cursor).model_dump_json().encode()
+    await feed_cache.set(cache_slot, body, [item.id for item in items])
+    return Response(content=body, media_type="application/json")
+
+@router.get("/me", response_model=PostPage)
+async def get_my_posts(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Fetch a page of posts created by the authenticated user.
+
+    Parameters:
+    - cursor (Optional[str]): Opaque cursor from a previous page's `next_cursor`.
+    - limit (int): Page size (max MAX_PAGE_SIZE).
+    - db (AsyncSession): DB session.
+    - user (User): Authenticated user.
+
+    Returns:
+    - PostPage: User's posts with metadata, newest first, and the next cursor.
+    """
+
+    # Fetch a page of posts by current user
+    stmt = select(UserPost).where(UserPost.user_id == user.id, UserPost.expires_at > datetime.utcnow())
+    stmt = apply_keyset(stmt, UserPost.created_at, UserPost.id, cursor, limit)
+    results = (await db.execute(stmt)).scalars().all()
+    posts, next_cursor = split_page(results, limit, key=lambda post: (post.created_at, post.id))
+
+    # Build list with comment counts and reaction info in batched queries
+    items = await build_post_reads(db, [(post, user) for post in posts], include_comments=False)
+    return PostPage(items=items, next_cursor=next_cursor)
 
 @router.get("/{post_id}", response_model=PostRead)
 async def get_single_post(post_id: UUID, db: AsyncSession = Depends(get_db)):
@@ -188,64 +223,19 @@ async def get_single_post(post_id: UUID, db: AsyncSession = Depends(get_db)):
     - PostRead: Post data with metadata.
 
     Raises:
-    - HTTP 404 if post is not found.
+    - HTTP 404 if post is not found or has expired.
     """
 
-    # Query post with user info
-    stmt = select(UserPost, User).join(User).where(UserPost.id == post_id)
+    # Query post with user info (expired posts may await their partition drop in partitioned storage)
+    stmt = select(UserPost, User).join(User).where(UserPost.id == post_id, UserPost.expires_at > datetime.utcnow())
     result = await db.execute(stmt)
     row = result.first()
     if not row:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    post, user = row
-
-    # Reaction counts grouped by type
-    reaction_stmt = (
-        select(PostReaction.type, func.count())
-        .where(PostReaction.post_id == post.id)
-        .group_by(PostReaction.type)
-    )
-
-    # Fetch comments and user info
-    comment_stmt = (
-        select(PostComment, User)
-        .join(User, User.id == PostComment.user_id)
-        .where(PostComment.post_id == post.id)
-        .order_by(PostComment.created_at.asc())
-    )
-
-    reactions = await db.execute(reaction_stmt)
-    comments = await db.execute(comment_stmt)
-
-    reaction_counts = {reaction_type.value: count for reaction_type, count in reactions}
-    comment_list = [
-        CommentRead(
-            id=comment.id,
-            post_id=comment.post_id,
-            user_id=comment.user_id,
-            content=comment.content,
-            created_at=comment.created_at,
-            user_name=comment_user.name,
-            profile_pic_url=comment_user.profile_pic_url,
-        )
-        for comment, comment_user in comments
-    ]
-
-    return PostRead(
-        id=post.id,
-        user_id=user.id,
-        content=post.content,
-        image_url=post.image_url,
-        hobby_id=post.hobby_id,
-        created_at=post.created_at,
-        expires_at=post.expires_at,
-        name=user.name,
-        profile_pic_url=user.profile_pic_url,
-        reaction_counts=reaction_counts,
-        comment_count=len(comment_list),
-        comments=comment_list
-    )
+    # Attach reactions and comments
+    feed = await build_post_reads(db, [row])
+    return feed[0]
 
 @router.post("/{post_id}/comments", response_model=CommentRead)
 async def add_comment(
@@ -265,22 +255,29 @@ async def add_comment(
 
     Returns:
     - CommentRead: Serialized comment data.
+
+    Raises:
+    - HTTP 404 if post is not found or has expired.
     """
 
+    post_expires_at = await get_post_expiry(db, post_id)
     new_comment = PostComment(
         id=uuid4(),
         post_id=post_id,
+        post_expires_at=post_expires_at,
         user_id=user.id,
         content=comment.content,
         created_at=datetime.utcnow()
     )
 
-    # Add comment to DB
+    # Add comment and bump the post's comment counter in the same transaction
     db.add(new_comment)
+    await bump_comment_count(db, post_id, post_expires_at, 1)
     await db.commit()
     await db.refresh(new_comment)
+    await feed_cache.invalidate_post(post_id)
 
-    # Broadcast and Notify clients of new comment
+    # Notify clients following the post's thread of the new comment
     await manager.broadcast({
         "type": "new_comment",
         "data": {
@@ -292,7 +289,8 @@ async def add_comment(
             "user_name": user.name,
             "profile_pic_url": user.profile_pic_url,
         }
-    })
+    }, topics=[post_topic(post_id)])
+    post_stats_batcher.add(post_id) # Counts go out in the next post_stats frame
 
     return CommentRead(
         id=new_comment.id,
@@ -322,89 +320,41 @@ async def add_reaction(
 
     Returns:
     - dict: Confirmation with reaction type.
+
+    Raises:
+    - HTTP 404 if post is not found or has expired.
     """
-    
+
+    post_expires_at = await get_post_expiry(db, post_id)
+
     # Remove any existing reaction by user on this post
-    await db.execute(
+    removed = await db.execute(
         delete(PostReaction).where(
             (PostReaction.post_id == post_id) &
+            (PostReaction.post_expires_at == post_expires_at) &
             (PostReaction.user_id == user.id)
-        )
+        ).returning(PostReaction.type)
     )
 
+    # Decrement counters for replaced reactions
+    for old_type in removed.scalars().all():
+        await bump_reaction_count(db, post_id, post_expires_at, old_type, -1)
+
     # Create new reaction
     new_reaction = PostReaction(
         id=uuid4(),
         post_id=post_id,
+        post_expires_at=post_expires_at,
         user_id=user.id,
         type=reaction.type
     )
 
-    # Add reaction to DB
+    # Add reaction to DB and bump its counter in the same transaction
     db.add(new_reaction)
+    await bump_reaction_count(db, post_id, post_expires_at, reaction.type.value, 1)
     await db.commit()
+    await feed_cache.invalidate_post(post_id)
 
-    # Broadcast and Notify clients of new reaction
-    await manager.broadcast({
-        "type": "new_reaction",
-        "data": {
-            "post_id": str(post_id),
-            "user_id": str(user.id),
-            "reaction_type": reaction.type.value
-        }
-    })
+    # Notify clients following the post in the next batched post_stats frame
+    post_stats_batcher.add(post_id)
     return {"status": "ok", "type": reaction.type}
-
-@router.get("/me", response_model=List[PostRead])
-async def get_my_posts(
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    """
-    Fetch posts created by the authenticated user.
-
-    Parameters:
-    - db (AsyncSession): DB session.
-    - user (User): Authenticated user.
-
-    Returns:
-    - List[PostRead]: User's posts with metadata.
-    """
-
-    # Fetch posts by current user
-    stmt = select(UserPost).where(UserPost.user_id == user.id).order_by(UserPost.created_at.desc())
-    results = await db.execute(stmt)
-    posts = results.scalars().all()
-
-    # Build list with comment and reaction info
-    response = []
-    for post in posts:
-        # Reaction counts
-        reaction_stmt = (
-            select(PostReaction.type, func.count())
-            .where(PostReaction.post_id == post.id)
-            .group_by(PostReaction.type)
-        )
-        reactions = await db.execute(reaction_stmt)
-
-        # Comment count
-        comment_stmt = select(func.count()).where(PostComment.post_id == post.id)
-        comment_count = (await db.execute(comment_stmt)).scalar()
-
-        reaction_counts = {rtype.value: count for rtype, count in reactions}
-
-        response.append(PostRead(
-            id=post.id,
-            user_id=user.id,
-            content=post.content,
-            image_url=post.image_url,
-            hobby_id=post.hobby_id,
-            created_at=post.created_at,
-            expires_at=post.expires_at,
-            name=user.name,
-            profile_pic_url=user.profile_pic_url,
-            reaction_counts=reaction_counts,
-            comment_count=comment_count
-        ))
-
-    return response
\ No newline at end of file
@@ -3,16 +3,17 @@ from sqlalchemy import asc, delete, desc, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List
 import base64
-from models import User, Location, UserRole, UserHobby, Hobby
-from schemas import UserRead, UserProfileUpdate
+from models import User, UserRole, UserHobby
+from schemas import UserRead, UserPage, UserProfileUpdate
 from database import get_db
+from utils.read_replicas import get_read_db
+from utils.catalog import catalog
 from logger import logger
 from utils.admin import require_admin
-from utils.cloudinary import upload_photo_to_cloudinary, delete_user_cloudinary_folder
-from utils.current_user import get_current_user
-import cloudinary.uploader
+from utils.cloudinary import upload_photo_to_cloudinary, delete_user_cloudinary_folder, media_client
+from utils.current_user import get_current_user, current_user_loader, invalidate_cached_user
+from utils.pagination import apply_keyset, split_page
 from firebase_admin import auth as firebase_auth
 
 # Define API router for user-related endpoints
@@ -21,6 +22,9 @@ router = APIRouter(prefix="/users", tags=["Users"])
 # TODO: Change size if needed
 MAX_IMAGE_SIZE_BYTES = 5 * 1024 * 1024 # 5MB
 
+# Current user loaded with the relationships the profile response needs
+get_current_user_with_location = current_user_loader(selectinload(User.location))
+
 # Allowed fields for sorting
 ALLOWED_SORT_FIELDS = {
     "name", "email", "age", "role",
@@ -32,9 +36,10 @@ ALLOWED_PROFILE_UPDATE_FIELDS = [
     "name", "age", "bio", "profile_pic_url", "location_id", "is_private"
 ]
 
-@router.get("", response_model=List[UserRead])
+@router.get("", response_model=UserPage)
 async def list_users(
     skip: int = 0,
+    cursor: str | None = None,
     limit: int = Query(10, le=100),  # Limit to a maximum of 100
     search: str | None = None,
     name: str | None = None,
@@ -46,14 +51,15 @@ async def list_users(
     max_age: int | None = None,
     sort_by: str = "created_at",
     sort_order: str = "desc",
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """
     Fetch a paginated list of users from the database with optional filtering, searching, and sorting.
 
     Parameters:
-    - skip (int): Number of records to skip for pagination.
+    - skip (int): Number of records to skip for offset pagination (must be 0 when `cursor` is given).
+    - cursor (str, optional): Opaque cursor from a previous page's `next_cursor`. Only valid with sort_by=created_at.
     - limit (int): Maximum number of users to return (max 100).
     - search (str, optional): Global search term to match against user name or email.
     - name (str, optional): Filter users whose names partially match this string.
@@ -65,14 +71,14 @@ async def list_users(
     - max_age (int, optional): Filter users with age less than or equal to this.
     - sort_by (str): Field to sort by. Must be in ALLOWED_SORT_FIELDS.
     - sort_order (str): 'asc' or 'desc' for ascending or descending order.
-    - db (AsyncSession): Database session dependency.
+    - db (AsyncSession): Read-only database session (replica when available).
     - current_user (User): The currently authenticated user.
 
     Returns:
-    - List[UserRead]: A list of user objects matching the criteria.
+    - UserPage: Users matching the criteria and, when sorted by created_at, the next cursor.
 
     Raises:
-    - HTTPException 400 if invalid sort field is provided.
+    - HTTPException 400 if invalid sort field or cursor is provided, or if `skip` is combined with `cursor`.
     - HTTPException 500 on internal server errors.
     """
 
@@ -119,6 +125,21 @@ async def list_users(
         # Validate and apply sorting
         if sort_by not in ALLOWED_SORT_FIELDS:
             raise HTTPException(status_code=400, detail=f"Invalid sort_by: {sort_by}")
+
+        # Keyset pagination on (created_at, id); deep pages cost the same as the first
+        if sort_by == "created_at":
+            if cursor and skip:
+                raise HTTPException(status_code=400, detail="skip cannot be combined with cursor")
+            query = apply_keyset(query, User.created_at, User.id, cursor, limit, descending=sort_order != "asc")
+            if not cursor:
+                query = query.offset(skip)
+            result = await db.execute(query)
+            users, next_cursor = split_page(result.scalars().all(), limit, key=lambda u: (u.created_at, u.id))
+            return {"items": users, "next_cursor": next_cursor}
+
+        # Cursors encode a created_at position, so other sort fields fall back to offset
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor requires sort_by=created_at")
         sort_column = getattr(User, sort_by)
         query = query.order_by(asc(sort_column) if sort_order == "asc" else desc(sort_column))
 
@@ -128,7 +149,7 @@ async def list_users(
         # Execute the query asynchronously
         result = await db.execute(query)
         users = result.scalars().all()
-        return users
+        return {"items": users, "next_cursor": None}
 
     except HTTPException:
         raise # Re-raise known HTTP errors
@@ -138,45 +159,22 @@ async def list_users(
 
 @router.get("/me", response_model=UserRead)
 async def get_my_profile(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_with_location),
 ):
     """
     Retrieve the profile information of the currently authenticated user.
 
     Parameters:
-    - db (AsyncSession): Database session dependency.
-    - current_user (User): The currently authenticated user.
+    - current_user (User): The currently authenticated user, loaded once with their location.
 
     Returns:
     - UserRead: User object with profile details including location.
 
     Raises:
     - HTTPException 404 if the user is not found.
-    - HTTPException 500 on internal server errors.
     """
 
-    try:
-        # Query the user along with their location relationship
-        result = await db.execute(
-            select(User)
-            .options(selectinload(User.location))
-            .filter(User.id == current_user.id)
-        )
-        user = result.scalar_one_or_none()
-
-        # Check if user exists
-        if not user:
-            logger.error(f"User not found for {current_user.email}")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        return user # Return the user
-    
-    except HTTPException:
-        raise # Re-raise known HTTP errors
-    except Exception as e:
-        logger.error(f"Failed to load user profile for {current_user.email}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to load profile")
+    return current_user # Already loaded with location by the dependency
 
 @router.delete("/me")
 async def delete_my_account(
@@ -204,7 +202,7 @@ async def delete_my_account(
 
     try:
         # Delete user folder and images from Cloudinaryr
-        await delete_user_cloudinary_folder(current_user.id.hex)
+        await delete_user_cloudinary_folder(current_user.id)
 
         # Delete user from Firebase Auth (handle errors gracefully)
         try:
@@ -215,6 +213,7 @@ async def delete_my_account(
         # Delete user from database and commit
         await db.delete(current_user)
         await db.commit()
+        await invalidate_cached_user(current_user.firebase_uid)
         return {"message": "Account deleted successfully"}
 
     except Exception as e:
@@ -253,8 +252,7 @@ async def update_my_profile(
 
     # Validate location if location_id is provided
     if "location_id" in updates:
-        loc_result = await db.execute(select(Location).filter(Location.id == updates["location_id"]))
-        if not loc_result.scalars().first():
+        if not await catalog.location_exists(db, updates["location_id"]):
             logger.error(f"Invalid location_id: {updates['location_id']}")
             raise HTTPException(status_code=400, detail="Invalid location_id")
 
@@ -273,7 +271,7 @@ async def update_my_profile(
             # Delete old profile picture from Cloudinary if exists
             if current_user.profile_pic_public_id:
                 try:
-                    cloudinary.uploader.destroy(current_user.profile_pic_public_id)
+                    await media_client.destroy(current_user.profile_pic_public_id)
                 except Exception as e:
                     logger.warning(f"Failed to delete old profile pic: {e}")
 
@@ -297,9 +295,8 @@ async def update_my_profile(
             logger.error(f"Invalid hobby_ids length for user {current_user.email}: {hobby_ids}")
             raise HTTPException(status_code=400, detail="You must select exactly 3 hobbies")
 
-        # Validate hobbies exist in the Hobby table
-        hobby_query = await db.execute(select(Hobby.id).where(Hobby.id.in_(hobby_ids)))
-        valid_hobby_ids = set(str(h) for h in hobby_query.scalars().all())
+        # Validate hobbies exist (from the catalog)
+        valid_hobby_ids = set(str(h) for h in await catalog.existing_hobby_ids(db, hobby_ids))
         if set(map(str, hobby_ids)) != valid_hobby_ids:
             logger.error(f"Invalid hobby IDs provided by user {current_user.email}: {hobby_ids}")
             raise HTTPException(status_code=400, detail="One or more hobby IDs are invalid")
@@ -317,6 +314,7 @@ async def update_my_profile(
     # Commit all changes to the database
     try:
         await db.commit()
+        await invalidate_cached_user(current_user.firebase_uid)
     except Exception as e:
         await db.rollback()
         logger.error(f"Failed to update profile for user {current_user.email}: {e}")
@@ -1,40 +1,48 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from logger import logger
+from utils.current_user import lookup_user
 from utils.firebase_token import verify_firebase_token
-from utils.redis_ws_manager import manager
-from database import get_db
-from models import User
+from utils.metrics import metrics
+from utils.redis_ws_manager import manager, FEED_TOPIC, user_topic
+import json
 
 # Define API router for websocket endpoint
 router = APIRouter()
 
 @router.websocket("/ws/feed")
-async def websocket_feed(
-    websocket: WebSocket,
-    db: AsyncSession = Depends(get_db),
-):
+async def websocket_feed(websocket: WebSocket):
     """
     WebSocket endpoint to provide a live feed connection for authenticated users.
 
     Workflow:
     - Authenticates the connection using a Firebase ID token passed as a query parameter.
-    - Validates the token and fetches the corresponding user from the database.
-    - Registers the WebSocket connection for broadcasting.
-    - Keeps the connection alive until the client disconnects or an error occurs.
+    - Validates the token and looks up the corresponding user in the identity cache, or
+      in the database through a short-lived session, so idle sockets hold no DB connection.
+    - Refuses the connection if the instance or the user is at its connection limit.
+    - Registers the WebSocket connection for broadcasting, subscribed to the topics in the
+      optional comma-separated `topics` query parameter (default: "feed") plus the
+      user's own "user:<id>" channel.
+    - A reconnecting client passes the last event "seq" it received as `since`; it first gets
+      the events it missed, or {"type": "resync_required"} if it must refetch the feed.
+    - Handles subscription messages from the client until it disconnects or an error occurs:
+      {"action": "subscribe" | "unsubscribe", "topics": ["feed", "hobby:<id>", "post:<id>"]}
+      Each is answered with {"type": "subscriptions", "data": {"topics": [...]}}.
+    - Answers to heartbeat pings ({"action": "pong"}) and every other message keep the
+      connection alive; clients that go silent are closed by the manager.
 
     Parameters:
     - websocket (WebSocket): The WebSocket connection instance.
-    - db (AsyncSession): Async database session dependency.
 
     Returns:
     - None: This is a WebSocket handler; it accepts and maintains the connection.
 
     Behavior:
+    - Refused connections are accepted and then closed, so the client sees the close code
+      (a close before the handshake would reach it as a bare HTTP 403).
     - Closes the connection with code 1008 (policy violation) if authentication fails.
     - Closes with code 1011 (internal error) if database errors occur.
+    - Closes with code 1013 (try again later) at the instance connection limit, or 1008 at the user limit.
     - Logs connection and disconnection events.
     """
 
@@ -43,45 +51,73 @@ async def websocket_feed(
     if not token:
         # Close connection with policy violation code if token is missing
         logger.warning("WebSocket rejected: missing token")
-        await websocket.close(code=1008)
+        metrics.incr("ws.auth_rejected")
+        await manager.refuse(websocket, 1008)
         return
 
     # Verify the Firebase ID token to authenticate the user
     try:
-        decoded_token = verify_firebase_token(token)
+        decoded_token = await verify_firebase_token(token)
         firebase_uid = decoded_token.get("uid")
         if not firebase_uid:
             # Close connection if token does not contain a user ID
             logger.warning("WebSocket rejected: token missing uid")
-            await websocket.close(code=1008)
+            metrics.incr("ws.auth_rejected")
+            await manager.refuse(websocket, 1008)
             return
     except Exception as e:
         # Close connection if token verification fails
         logger.warning(f"WebSocket rejected: invalid token: {e}")
-        await websocket.close(code=1008)
+        metrics.incr("ws.auth_rejected")
+        await manager.refuse(websocket, 1008)
         return
 
-    # Query the database for the user associated with the verified Firebase UID
+    # Look up the user for the verified Firebase UID without keeping a DB session open
     try:
-        result = await db.execute(select(User).where(User.firebase_uid == firebase_uid))
-        user = result.scalars().first()
+        user = await lookup_user(firebase_uid)
         if not user:
             # Close connection if user is not found in the database
             logger.warning("WebSocket rejected: user not found")
-            await websocket.close(code=1008)
+            metrics.incr("ws.auth_rejected")
+            await manager.refuse(websocket, 1008)
             return
     except Exception as e:
         # On database errors, close connection with internal error code
         logger.error(f"DB error during WebSocket auth: {e}")
-        await websocket.close(code=1011)
+        await manager.refuse(websocket, 1011)
         return
 
     # Accept the WebSocket connection and register it with the manager for broadcasting
-    await manager.connect(websocket)
+    own_topic = user_topic(user.id)
+
+    def allowed_topics(topics) -> list:
+        # Clients may only follow their own user channel
+        return [t for t in topics if isinstance(t, str) and (not t.startswith("user:") or t == own_topic)]
+
+    requested = websocket.query_params.get("topics")
+    topics = requested.split(",") if requested else [FEED_TOPIC]
+    since = websocket.query_params.get("since") # Resume after this sequence number
+    if not await manager.connect(websocket, allowed_topics(topics) + [own_topic], since=since, user_id=user.id):
+        return # Refused: connection limit reached
     try:
-        # Keep the connection alive by continuously waiting for messages
+        # Apply subscription changes sent by the client
         while True:
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            manager.touch(websocket) # Any message shows the client is alive
+            try:
+                request = json.loads(message)
+                if request.get("action") == "pong":
+                    continue
+                action, requested_topics = request["action"], allowed_topics(request["topics"])
+            except (ValueError, KeyError, TypeError):
+                continue # Ignore malformed messages
+            if action == "subscribe":
+                current = manager.subscribe(websocket, requested_topics)
+            elif action == "unsubscribe":
+                current = manager.unsubscribe(websocket, requested_topics)
+            else:
+                continue
+            manager.send(websocket, {"type": "subscriptions", "data": {"topics": sorted(current)}})
     except WebSocketDisconnect:
         # Clean up connection on client disconnect
         await manager.disconnect(websocket)
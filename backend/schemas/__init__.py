@@ -2,8 +2,8 @@ from .auth import LoginResponse, SignupRequest, LoginRequest
 from .hobbies import HobbyCreate, HobbyRead, HobbyBase, HobbyUpdate, HobbyUpdateRequest, UserHobbyBase, UserHobbyRead
 from .locations import LocationRead, LocationBase, LocationCreate, LocationResolveRequest
 from .matches import MatchRead, MatchBase, MatchCreate
-from .users import UserBase, UserCreate, UserRead, UserProfileUpdate
-from .posts import PostCreate, PostRead, CommentCreate, CommentRead, PostReactionCreate, ReactionType
+from .users import UserBase, UserCreate, UserRead, UserPage, UserProfileUpdate
+from .posts import PostCreate, PostRead, PostPage, CommentCreate, CommentRead, PostReactionCreate, ReactionType
 
 # Export all schemas
 __all__ = [
@@ -25,11 +25,13 @@ __all__ = [
     "UserBase",
     "UserCreate",
     "UserRead",
+    "UserPage",
     "UserProfileUpdate",
     "UserHobbyRead",
     "UserHobbyBase",
     "PostCreate",
     "PostRead",
+    "PostPage",
     "CommentCreate",
     "CommentRead",
     "PostReactionCreate",
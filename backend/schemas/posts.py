@@ -44,6 +44,7 @@ class PostRead(BaseModel):
     user_id: UUID
     content: str
     image_url: Optional[str]
+    image_status: str = "none" # "none", "pending_image", "ready" or "failed"
     hobby_id: Optional[UUID]
     created_at: datetime
     expires_at: datetime
@@ -55,3 +56,8 @@ class PostRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Schema for a page of posts with an opaque cursor for the next page
+class PostPage(BaseModel):
+    items: List[PostRead]
+    next_cursor: Optional[str] = None
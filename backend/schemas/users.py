@@ -32,6 +32,11 @@ class UserRead(UserBase):
     class Config:
         from_attributes = True 
 
+# Schema for a page of users with an opaque cursor for the next page
+class UserPage(BaseModel):
+    items: List[UserRead]
+    next_cursor: Optional[str] = None
+
 # Schema for user profile update with photo upload support
 class UserProfileUpdate(BaseModel):
     name: Optional[str] = None
@@ -0,0 +1,120 @@
+"""
+In-memory fake of the Cloudinary endpoints used by `utils/cloudinary.py`, served
+through an httpx mock transport so no test talks to Cloudinary.
+"""
+
+import base64
+import hashlib
+import re
+from urllib.parse import parse_qs
+import httpx
+from utils.cloudinary import CloudinaryBackend, DELETE_PREFIX_PAGE_SIZE
+
+CLOUD_NAME = "hobbymatch-test"
+API_KEY = "test-key"
+API_SECRET = "test-secret"
+
+class FakeMediaServer:
+    """
+    Stores uploaded images by public ID and answers like Cloudinary's REST API.
+
+    Attributes:
+    - images (dict): Public ID -> uploaded bytes.
+    - folders (set): Folders created by uploads and not deleted yet.
+    - requests (list): (method, path) of every request received.
+    - failures (list): Status codes to answer the next requests with, in order.
+    - prefix_page_size (int): Images deleted per prefix delete call before answering partial.
+    """
+
+    def __init__(self, prefix_page_size: int = DELETE_PREFIX_PAGE_SIZE):
+        self.images = {}
+        self.folders = set()
+        self.requests = []
+        self.failures = []
+        self.prefix_page_size = prefix_page_size
+
+    def backend(self) -> CloudinaryBackend:
+        """
+        Return a CloudinaryBackend whose requests go to this server.
+        """
+
+        return CloudinaryBackend(CLOUD_NAME, API_KEY, API_SECRET, transport=httpx.MockTransport(self.handler))
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix(f"/v1_1/{CLOUD_NAME}")
+        self.requests.append((request.method, path))
+        if self.failures:
+            return httpx.Response(self.failures.pop(0), json={"error": {"message": "injected failure"}})
+
+        if request.method == "POST" and path == "/image/upload":
+            return self._upload(request)
+        if request.method == "POST" and path == "/image/destroy":
+            params = self._signed_params(parse_qs(request.content.decode()))
+            if params is None:
+                return httpx.Response(401, json={"error": {"message": "Invalid signature"}})
+            result = "ok" if self.images.pop(params["public_id"], None) is not None else "not found"
+            return httpx.Response(200, json={"result": result})
+        if request.method == "DELETE" and path == "/resources/image/upload":
+            return self._delete_resources(request)
+        if request.method == "DELETE" and path.startswith("/folders/"):
+            folder = path.removeprefix("/folders/")
+            if folder not in self.folders:
+                return httpx.Response(404, json={"error": {"message": "Folder not found"}})
+            if any(public_id.startswith(f"{folder}/") for public_id in self.images):
+                return httpx.Response(400, json={"error": {"message": "Folder is not empty"}})
+            self.folders.discard(folder)
+            return httpx.Response(200, json={"deleted": [folder]})
+        return httpx.Response(404, json={"error": {"message": "Not found"}})
+
+    def _signed_params(self, form: dict) -> dict | None:
+        """
+        Return the form's parameters if its Upload API signature is valid, else None.
+        """
+
+        params = {key: values[0] for key, values in form.items()}
+        signature = params.pop("signature", None)
+        if params.pop("api_key", None) != API_KEY:
+            return None
+        to_sign = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        if hashlib.sha1(f"{to_sign}{API_SECRET}".encode()).hexdigest() != signature:
+            return None
+        return params
+
+    def _upload(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        fields = dict(re.findall(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', body, re.S))
+        form = {key.decode(): [value.decode()] for key, value in fields.items() if key != b"file"}
+        params = self._signed_params(form)
+        if params is None:
+            return httpx.Response(401, json={"error": {"message": "Invalid signature"}})
+        file_data = re.search(rb'name="file"; filename="[^"]*"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', body, re.S)
+        public_id = params["public_id"]
+        if public_id in self.images and params.get("overwrite") == "false":
+            return httpx.Response(200, json={"public_id": public_id, "secure_url": self.url(public_id), "existing": True})
+        self.images[public_id] = file_data.group(1)
+        self.folders.add(public_id.rpartition("/")[0])
+        return httpx.Response(200, json={"public_id": public_id, "secure_url": self.url(public_id)})
+
+    def _delete_resources(self, request: httpx.Request) -> httpx.Response:
+        if request.headers.get("Authorization") != f"Basic {base64.b64encode(f'{API_KEY}:{API_SECRET}'.encode()).decode()}":
+            return httpx.Response(401, json={"error": {"message": "Invalid credentials"}})
+        query = parse_qs(request.url.query.decode())
+        if "public_ids[]" in query:
+            deleted = {public_id: "deleted" if self.images.pop(public_id, None) is not None else "not_found" for public_id in query["public_ids[]"]}
+            return httpx.Response(200, json={"deleted": deleted, "partial": False})
+
+        prefix = query["prefix"][0]
+        matching = sorted(public_id for public_id in self.images if public_id.startswith(prefix))
+        page = matching[:self.prefix_page_size]
+        for public_id in page:
+            del self.images[public_id]
+        partial = len(matching) > len(page)
+        return httpx.Response(200, json={
+            "deleted": {public_id: "deleted" for public_id in page},
+            "partial": partial,
+            **({"next_cursor": f"cursor-{len(self.requests)}"} if partial else {}),
+        })
+
+    @staticmethod
+    def url(public_id: str) -> str:
+        return f"https://res.cloudinary.test/{CLOUD_NAME}/image/upload/{public_id}"
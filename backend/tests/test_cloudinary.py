@@ -0,0 +1,95 @@
+"""
+Tests for the media client against the in-memory fake media server (`tests/fake_media.py`).
+"""
+
+import pytest
+from fake_media import FakeMediaServer
+from utils import cloudinary
+from utils.cloudinary import MediaBackend, MediaBackendError, MediaClient, media_folder
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(cloudinary, "BACKOFF_BASE_SECONDS", 0)
+    return FakeMediaServer(prefix_page_size=3)
+
+@pytest.fixture
+async def client(server):
+    client = MediaClient(server.backend())
+    try:
+        yield client
+    finally:
+        await client.aclose()
+
+def test_backends_must_implement_every_operation():
+    class UploadOnly(MediaBackend):
+        async def upload(self, data, public_id):
+            return {}
+
+    with pytest.raises(TypeError):
+        UploadOnly()
+
+async def test_upload_and_destroy(server, client):
+    result = await client.upload(b"png bytes", "post_images/user_1/post_a")
+    assert result == {"url": server.url("post_images/user_1/post_a"), "public_id": "post_images/user_1/post_a"}
+    assert server.images == {"post_images/user_1/post_a": b"png bytes"}
+
+    await client.destroy("post_images/user_1/post_a")
+    assert server.images == {}
+
+async def test_file_upload_is_resent_whole_after_a_failure(server, client, tmp_path):
+    image = tmp_path / "image"
+    image.write_bytes(bytes(range(256)) * 1024) # Several of httpx's streaming chunks
+    server.failures = [503]
+
+    await client.upload(image, "post_images/user_1/post_b")
+
+    assert server.images == {"post_images/user_1/post_b": image.read_bytes()}
+    assert server.requests.count(("POST", "/image/upload")) == 2
+
+async def test_destroy_many_batches_requests(server, client, monkeypatch):
+    monkeypatch.setattr(cloudinary, "DELETE_BATCH_SIZE", 4)
+    public_ids = [f"uploads/{i}" for i in range(10)]
+    server.images = {public_id: b"x" for public_id in public_ids + ["uploads/kept"]}
+
+    await client.destroy_many(public_ids)
+
+    assert server.images == {"uploads/kept": b"x"}
+    assert server.requests.count(("DELETE", "/resources/image/upload")) == 3
+
+async def test_folder_delete_follows_partial_results(server, client):
+    folder = media_folder(1, "post")
+    for i in range(10):
+        await client.upload(b"x", f"{folder}/post_{i}")
+    await client.upload(b"x", f"{media_folder(10, 'post')}/post_0") # Same prefix without the slash
+
+    await client.delete_folder(folder)
+
+    assert list(server.images) == [f"{media_folder(10, 'post')}/post_0"]
+    assert server.requests.count(("DELETE", "/resources/image/upload")) == 4 # 3 + 3 + 3 + 1
+    assert folder not in server.folders
+
+async def test_folder_delete_of_a_missing_folder_succeeds(server, client):
+    await client.delete_folder(media_folder(2, "profile"))
+    assert server.requests[-1] == ("DELETE", f"/folders/{media_folder(2, 'profile')}")
+
+async def test_transient_failures_are_retried(server, client):
+    server.failures = [503, 429]
+    await client.upload(b"x", "uploads/retried")
+    assert "uploads/retried" in server.images
+    assert len(server.requests) == 3
+
+async def test_client_errors_are_not_retried(server, client):
+    server.failures = [400]
+    with pytest.raises(MediaBackendError) as raised:
+        await client.upload(b"x", "uploads/rejected")
+    assert raised.value.status_code == 400 and not raised.value.retryable
+    assert len(server.requests) == 1
+
+async def test_retries_give_up_after_max_attempts(server, client):
+    server.failures = [500] * cloudinary.MAX_ATTEMPTS
+    with pytest.raises(MediaBackendError) as raised:
+        await client.destroy("uploads/missing")
+    assert raised.value.retryable
+    assert len(server.requests) == cloudinary.MAX_ATTEMPTS
@@ -0,0 +1,62 @@
+"""
+Tests for cross-instance invalidation of the identity cache over Redis pub/sub.
+"""
+
+import asyncio
+import uuid
+import pytest
+from models import User
+from utils import current_user
+from utils.current_user import invalidate_cached_user, start_user_cache_sync, stop_user_cache_sync, USER_CACHE_CHANNEL
+
+pytestmark = pytest.mark.anyio
+
+def cache_user(firebase_uid: str):
+    current_user._user_cache[firebase_uid] = User(id=uuid.uuid4(), firebase_uid=firebase_uid, name="U", email="u@example.edu")
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+@pytest.fixture
+async def user_cache_sync(shared_redis):
+    current_user._user_cache.clear()
+    start_user_cache_sync()
+    # Wait for the listener's subscription, so no message is published before it
+    while (await shared_redis.pubsub_numsub(USER_CACHE_CHANNEL))[0][1] == 0:
+        await asyncio.sleep(0.01)
+    try:
+        yield shared_redis
+    finally:
+        await stop_user_cache_sync()
+        current_user._user_cache.clear()
+
+async def test_invalidation_from_another_instance_drops_the_user(user_cache_sync):
+    cache_user("uid:with:colons")
+    cache_user("other")
+
+    await user_cache_sync.publish(USER_CACHE_CHANNEL, f"uid:with:colons:{uuid.uuid4().hex}")
+
+    await wait_until(lambda: "uid:with:colons" not in current_user._user_cache)
+    assert "other" in current_user._user_cache
+
+async def test_local_invalidation_is_published(user_cache_sync):
+    pubsub = user_cache_sync.pubsub()
+    await pubsub.subscribe(USER_CACHE_CHANNEL)
+    cache_user("changed")
+
+    await invalidate_cached_user("changed")
+
+    assert "changed" not in current_user._user_cache
+    message = None
+    while message is None:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+    assert message["data"].decode() == f"changed:{current_user._instance_id}"
+    await pubsub.aclose()
+
+async def test_invalidation_without_redis_is_local():
+    cache_user("solo")
+    await invalidate_cached_user("solo")
+    assert "solo" not in current_user._user_cache
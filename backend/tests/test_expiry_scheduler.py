@@ -0,0 +1,116 @@
+"""
+Tests for the reaper leader's heap cap and lock checks, and for the partitioned-storage
+announcement progress it shares with later leaders.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, UserPost
+from utils import clean_up, expiry_scheduler
+from utils.clean_up import delete_expired_posts, load_announced_until
+from utils.expiry_scheduler import ExpiryScheduler, LeadershipLost, LEADER_LOCK_KEY
+
+pytestmark = pytest.mark.anyio
+
+def test_notifications_cannot_grow_the_heap_past_its_cap(monkeypatch):
+    monkeypatch.setattr(expiry_scheduler, "HEAP_MAX_SIZE", 10)
+    scheduler = ExpiryScheduler()
+    scheduler.is_leader = True
+    start = datetime(2026, 10, 17, 12)
+
+    for minutes in range(11):
+        scheduler.schedule(start + timedelta(minutes=minutes))
+
+    assert sorted(scheduler.deadlines) == [start + timedelta(minutes=m) for m in range(5)]
+    assert scheduler.horizon == start + timedelta(minutes=4)
+
+    scheduler.schedule(start + timedelta(minutes=30)) # Past the horizon: left to the next seed
+    scheduler.schedule(start - timedelta(minutes=1))
+    assert len(scheduler.deadlines) == 6
+    assert scheduler.deadlines[0] == start - timedelta(minutes=1)
+
+async def seed_expired_posts(engine, count: int):
+    now = datetime.utcnow()
+    async with AsyncSession(engine) as session:
+        author = User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="Author", email=f"{uuid.uuid4()}@example.edu")
+        session.add(author)
+        await session.flush()
+        session.add_all(
+            UserPost(user_id=author.id, content=f"post {i}", created_at=now - timedelta(hours=2), expires_at=now - timedelta(minutes=i + 1))
+            for i in range(count)
+        )
+        await session.commit()
+
+async def count_posts(engine) -> int:
+    async with AsyncSession(engine) as session:
+        return (await session.execute(select(func.count()).select_from(UserPost))).scalar_one()
+
+async def test_reaper_stops_between_batches_once_the_lock_is_lost(db_engine, monkeypatch):
+    monkeypatch.setattr(clean_up, "REAPER_BATCH_SIZE", 1)
+    monkeypatch.setattr(clean_up, "REAPER_BATCH_PAUSE_SECONDS", 0)
+    await seed_expired_posts(db_engine, 3)
+    answers = iter([True, False])
+
+    async def still_leader():
+        return next(answers)
+
+    await delete_expired_posts(still_leader)
+
+    assert await count_posts(db_engine) == 2
+
+async def test_leader_checks_its_lock_in_pg_locks(db_engine):
+    scheduler = ExpiryScheduler()
+    async with db_engine.connect() as conn, db_engine.connect() as other:
+        assert (await conn.execute(select(func.pg_try_advisory_lock(LEADER_LOCK_KEY)))).scalar()
+        await conn.commit()
+        scheduler.is_leader = True
+        assert await scheduler._still_leader(conn)
+        assert not await scheduler._still_leader(other) # Another session does not hold it
+        assert not scheduler.is_leader
+
+        scheduler.is_leader = True
+        await conn.execute(select(func.pg_advisory_unlock(LEADER_LOCK_KEY)))
+        await conn.commit()
+        assert not await scheduler._still_leader(conn)
+        assert not scheduler.is_leader
+
+async def test_leader_steps_down_before_reaping_without_its_lock(db_engine):
+    await seed_expired_posts(db_engine, 2)
+    scheduler = ExpiryScheduler()
+    scheduler.is_leader = True # Lock never taken, e.g. lost with a server-side reset
+
+    async with db_engine.connect() as conn:
+        with pytest.raises(LeadershipLost):
+            await scheduler._lead(conn)
+
+    assert not scheduler.is_leader
+    assert await count_posts(db_engine) == 2
+
+async def test_announcement_progress_survives_a_new_leader(db_engine, monkeypatch):
+    monkeypatch.setattr(clean_up, "POSTS_PARTITIONED", True)
+    announced = []
+
+    async def release_expired_posts(expired):
+        announced.extend(post_id for post_id, _ in expired)
+
+    monkeypatch.setattr(clean_up, "release_expired_posts", release_expired_posts)
+    await seed_expired_posts(db_engine, 2)
+
+    await delete_expired_posts()
+    assert len(announced) == 2
+    first_run = await load_announced_until()
+    assert first_run is not None
+
+    # Progress lives in the database, not in the process: a later run only announces newer expiries
+    async with AsyncSession(db_engine) as session:
+        post = (await session.execute(select(UserPost).limit(1))).scalar_one()
+        session.add(UserPost(user_id=post.user_id, content="late", created_at=first_run, expires_at=datetime.utcnow()))
+        await session.commit()
+    await delete_expired_posts()
+
+    assert len(announced) == 3
+    assert await count_posts(db_engine) == 3 # Announced, not deleted
+    assert await load_announced_until() > first_run
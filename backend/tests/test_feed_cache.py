@@ -0,0 +1,92 @@
+"""
+Tests for targeted feed cache invalidation, with fakeredis as the shared tier.
+"""
+
+import json
+import uuid
+import pytest
+from utils.feed_cache import FeedCache
+
+pytestmark = pytest.mark.anyio
+
+def page(*post_ids) -> bytes:
+    return json.dumps({"items": [{"id": str(post_id)} for post_id in post_ids], "next_cursor": None}).encode()
+
+async def cache_page(cache: FeedCache, cursor, post_ids) -> bytes:
+    body = page(*post_ids)
+    _, slot = await cache.get(cursor, 20)
+    await cache.set(slot, body, post_ids)
+    return body
+
+async def test_post_invalidation_drops_only_pages_holding_the_post(shared_redis):
+    cache, other_instance = FeedCache(), FeedCache()
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    await cache_page(cache, None, [a, b])
+    older = await cache_page(cache, "older", [c])
+
+    await cache.invalidate_post(a)
+
+    assert (await cache.get(None, 20))[0] is None
+    assert (await cache.get("older", 20))[0] == older
+    # The shared tier dropped the same page
+    assert (await other_instance.get(None, 20))[0] is None
+    assert (await other_instance.get("older", 20))[0] == older
+
+async def test_pages_copied_from_redis_are_indexed_locally(shared_redis):
+    cache, other_instance = FeedCache(), FeedCache()
+    post_id = uuid.uuid4()
+    first = await cache_page(cache, None, [post_id])
+    assert (await other_instance.get(None, 20))[0] == first # Now in its local tier too
+
+    await other_instance.invalidate_post(post_id)
+    assert "first:20" not in other_instance.local
+
+async def test_new_post_drops_only_first_pages(shared_redis):
+    cache, other_instance = FeedCache(), FeedCache()
+    await cache_page(cache, None, [uuid.uuid4()])
+    older = await cache_page(cache, "older", [uuid.uuid4()])
+
+    await cache.invalidate_head()
+
+    for instance in (cache, other_instance):
+        assert (await instance.get(None, 20))[0] is None
+        assert (await instance.get("older", 20))[0] == older
+
+async def test_page_built_before_a_post_write_is_not_stored(shared_redis):
+    cache, other_instance = FeedCache(), FeedCache()
+    post_id = uuid.uuid4()
+
+    # Looked up before the write, stored after it (with pre-write data)
+    _, slot = await cache.get(None, 20)
+    _, other_slot = await other_instance.get(None, 20)
+    await cache.invalidate_post(post_id)
+    await cache.set(slot, page(post_id), [post_id])
+    await other_instance.set(other_slot, page(post_id), [post_id])
+
+    for instance in (cache, other_instance, FeedCache()):
+        assert (await instance.get(None, 20))[0] is None
+
+    # A page looked up after the write is cached as usual
+    fresh = await cache_page(cache, None, [post_id])
+    assert (await FeedCache().get(None, 20))[0] == fresh
+
+async def test_full_invalidation_drops_every_page(shared_redis):
+    cache = FeedCache()
+    await cache_page(cache, None, [uuid.uuid4()])
+    await cache_page(cache, "older", [uuid.uuid4()])
+
+    await cache.invalidate()
+
+    for instance in (cache, FeedCache()):
+        assert (await instance.get(None, 20))[0] is None
+        assert (await instance.get("older", 20))[0] is None
+
+async def test_local_tier_without_redis():
+    cache = FeedCache()
+    a, b = uuid.uuid4(), uuid.uuid4()
+    first = await cache_page(cache, None, [a])
+    await cache_page(cache, "older", [b])
+
+    await cache.invalidate_post(b)
+    assert (await cache.get(None, 20))[0] == first
+    assert (await cache.get("older", 20))[0] is None
@@ -0,0 +1,67 @@
+"""
+Query-count regression test for `utils.feed.build_post_reads`: assembling a page of
+posts must take the same number of statements whether it holds 1 post or 20.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, UserPost, PostComment, PostStats
+from utils.feed import build_post_reads
+
+pytestmark = pytest.mark.anyio
+
+async def seed_posts(session: AsyncSession, count: int) -> list:
+    """
+    Insert `count` posts, each with 3 comments and a counter row; return (post, author) rows.
+    """
+
+    now = datetime.utcnow()
+    author = User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="Author", email=f"{uuid.uuid4()}@example.edu")
+    session.add(author)
+    await session.flush()
+
+    rows = []
+    for i in range(count):
+        expires_at = now + timedelta(hours=1)
+        post = UserPost(id=uuid.uuid4(), user_id=author.id, content=f"post {i}", created_at=now, expires_at=expires_at)
+        session.add(post)
+        await session.flush()
+        session.add(PostStats(post_id=post.id, post_expires_at=expires_at, like_count=i, comment_count=3))
+        session.add_all(
+            PostComment(post_id=post.id, post_expires_at=expires_at, user_id=author.id, content="hi", created_at=now)
+            for _ in range(3)
+        )
+        rows.append((post, author))
+    await session.commit()
+    return rows
+
+async def count_statements(engine, session: AsyncSession, rows: list, **kwargs) -> tuple[int, list]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        reads = await build_post_reads(session, rows, **kwargs)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return len(statements), reads
+
+@pytest.mark.parametrize("include_comments, expected", [(True, 2), (False, 1)])
+async def test_build_post_reads_query_count_is_constant(db_engine, include_comments, expected):
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        one = await seed_posts(session, 1)
+        many = await seed_posts(session, 20)
+
+        one_count, _ = await count_statements(db_engine, session, one, include_comments=include_comments)
+        many_count, reads = await count_statements(db_engine, session, many, include_comments=include_comments)
+
+    assert one_count == many_count == expected
+    assert [read.id for read in reads] == [post.id for post, _ in many]
+    assert all(read.comment_count == 3 for read in reads)
+    if include_comments:
+        assert all(len(read.comments) == 3 for read in reads)
@@ -0,0 +1,140 @@
+"""
+Tests for local Firebase ID token verification, with tokens signed by a local key pair
+and Google's certificate endpoint replaced by an httpx mock transport.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from utils.firebase_token import FirebaseTokenVerifier, UnknownSigningKey, FORCED_REFRESH_INTERVAL_SECONDS
+
+pytestmark = pytest.mark.anyio
+
+PROJECT_ID = "hobbymatch-test"
+
+def make_key_pair() -> tuple:
+    """
+    Return (private key, PEM certificate) for a fresh RSA key, as Google publishes them.
+    """
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def sign(key, kid: str, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "user-1",
+        "iat": now,
+        "exp": now + 3600,
+        "auth_time": now,
+        "email_verified": True,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+class CertServer:
+    """
+    Serves the published certificates and counts downloads.
+    """
+
+    def __init__(self, certs: dict):
+        self.certs = certs
+        self.requests = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        return httpx.Response(200, json=self.certs, headers={"Cache-Control": "public, max-age=3600"})
+
+@pytest.fixture(scope="module")
+def keys():
+    return {kid: make_key_pair() for kid in ("kid-1", "kid-2")}
+
+def make_verifier(server: CertServer) -> FirebaseTokenVerifier:
+    verifier = FirebaseTokenVerifier(transport=httpx.MockTransport(server.handler))
+    verifier.project_id = PROJECT_ID
+    return verifier
+
+async def test_valid_token_is_verified_and_cached(keys):
+    private_key, cert = keys["kid-1"]
+    server = CertServer({"kid-1": cert})
+    verifier = make_verifier(server)
+    token = sign(private_key, "kid-1")
+
+    claims = await verifier.verify(token)
+    assert claims["uid"] == "user-1"
+    assert await verifier.verify(token) is claims
+    assert server.requests == 1
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "other-project"},
+    {"iss": "https://securetoken.google.com/other-project"},
+    {"exp": int(time.time()) - 60},
+    {"sub": ""},
+])
+async def test_invalid_claims_are_rejected(keys, overrides):
+    private_key, cert = keys["kid-1"]
+    verifier = make_verifier(CertServer({"kid-1": cert}))
+    with pytest.raises((jwt.PyJWTError, ValueError)):
+        await verifier.verify(sign(private_key, "kid-1", **overrides))
+
+async def test_wrong_signature_is_rejected(keys):
+    other_key, _ = keys["kid-2"]
+    verifier = make_verifier(CertServer({"kid-1": keys["kid-1"][1]}))
+    with pytest.raises(jwt.InvalidSignatureError):
+        await verifier.verify(sign(other_key, "kid-1"))
+
+async def test_rotated_key_is_fetched_once(keys):
+    server = CertServer({"kid-1": keys["kid-1"][1]})
+    verifier = make_verifier(server)
+    await verifier.refresh_keys()
+
+    # Google rotates: kid-2 is published after the keys were cached
+    server.certs = {"kid-1": keys["kid-1"][1], "kid-2": keys["kid-2"][1]}
+    tokens = [sign(keys["kid-2"][0], "kid-2", sub=f"user-{i}") for i in range(10)]
+    results = await asyncio.gather(*(verifier.verify(token) for token in tokens))
+
+    assert [claims["uid"] for claims in results] == [f"user-{i}" for i in range(10)]
+    assert server.requests == 2 # The initial load plus one forced refresh shared by all ten
+
+async def test_unknown_key_ids_refresh_at_most_once_per_interval(keys):
+    private_key, cert = keys["kid-1"]
+    server = CertServer({"kid-1": cert})
+    verifier = make_verifier(server)
+    await verifier.refresh_keys()
+
+    forged = [sign(private_key, f"forged-{i}") for i in range(50)]
+    results = await asyncio.gather(*(verifier.verify(token) for token in forged), return_exceptions=True)
+    assert all(isinstance(result, UnknownSigningKey) for result in results)
+    assert server.requests == 2
+
+    # Within the interval, unknown key IDs are rejected without a download
+    with pytest.raises(UnknownSigningKey):
+        await verifier.verify(sign(private_key, "forged-again"))
+    assert server.requests == 2
+
+    # Known keys keep working meanwhile
+    assert (await verifier.verify(sign(private_key, "kid-1")))["uid"] == "user-1"
+
+    # Once the interval has passed, the next unknown key ID may refresh again
+    verifier.forced_refresh_at -= FORCED_REFRESH_INTERVAL_SECONDS
+    with pytest.raises(UnknownSigningKey):
+        await verifier.verify(sign(private_key, "forged-later"))
+    assert server.requests == 3
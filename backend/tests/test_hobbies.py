@@ -0,0 +1,55 @@
+"""
+Tests for hobby saves that hit a hobby deleted on another instance while this
+instance's catalog still lists it.
+"""
+
+import uuid
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Hobby, HobbyCategory, User, UserHobby
+from routes.hobbies import replace_my_hobbies, update_user_hobby_ids
+from schemas.hobbies import HobbyCreate, HobbyUpdateRequest
+from utils.catalog import catalog, HOBBIES
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def stale_hobby(db_engine):
+    """
+    Return (user, hobby) where the hobby is in the catalog but already deleted from the database.
+    """
+
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        user = User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="U", email=f"{uuid.uuid4()}@example.edu")
+        hobby = Hobby(id=uuid.uuid4(), name="Bouldering", category=HobbyCategory.Sports)
+        session.add_all([user, hobby])
+        await session.commit()
+        await catalog.reload([HOBBIES])
+        await session.execute(delete(Hobby).where(Hobby.id == hobby.id)) # Deleted elsewhere, no invalidation
+        await session.commit()
+    assert hobby.id in catalog.hobbies_by_id
+    try:
+        yield user, hobby
+    finally:
+        await catalog.reload([HOBBIES])
+
+async def test_stale_hobby_id_is_rejected_with_400(db_engine, stale_hobby):
+    user, hobby = stale_hobby
+    async with AsyncSession(db_engine) as session:
+        with pytest.raises(HTTPException) as raised:
+            await update_user_hobby_ids(HobbyUpdateRequest(hobby_ids=[hobby.id]), db=session, current_user=user)
+
+    assert raised.value.status_code == 400
+    assert hobby.id not in catalog.hobbies_by_id # Reloaded
+
+async def test_stale_hobby_name_is_recreated(db_engine, stale_hobby):
+    user, hobby = stale_hobby
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        saved = await replace_my_hobbies([HobbyCreate(name="bouldering", category=HobbyCategory.Sports)], db=session, current_user=user)
+
+    assert len(saved) == 1 and saved[0].hobby_id != hobby.id
+    async with AsyncSession(db_engine) as session:
+        stored = (await session.execute(select(Hobby).join(UserHobby).where(UserHobby.user_id == user.id))).scalar_one()
+    assert stored.name == "bouldering"
@@ -0,0 +1,156 @@
+"""
+Tests for the background media pipeline against the fake media server (`tests/fake_media.py`).
+"""
+
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fake_media import FakeMediaServer
+from models import User, UserPost, MediaJob, MediaJobStatus, ImageStatus
+from utils import cloudinary, media_jobs, uploads
+from utils.cloudinary import media_client
+from utils.media_jobs import (
+    enqueue_media_job, claim_media_job, process_media_job, requeue_dead_media_jobs, sweep_media_spool,
+    MAX_JOB_ATTEMPTS, DEAD_JOB_RETENTION_SECONDS,
+)
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def server(monkeypatch):
+    server = FakeMediaServer()
+    backend = server.backend()
+    monkeypatch.setattr(media_client, "backend", backend)
+    monkeypatch.setattr(cloudinary, "BACKOFF_BASE_SECONDS", 0)
+    try:
+        yield server
+    finally:
+        await backend.aclose()
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "MEDIA_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(media_jobs, "MEDIA_SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+def spool_file(spool, data: bytes = b"image bytes", age_seconds: float = 0) -> str:
+    name = uuid.uuid4().hex
+    (spool / name).write_bytes(data)
+    mtime = time.time() - age_seconds
+    os.utime(spool / name, (mtime, mtime))
+    return name
+
+@pytest.fixture
+async def post(db_engine, spool):
+    """
+    Return a post with a queued image upload.
+    """
+
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        user = User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="U", email=f"{uuid.uuid4()}@example.edu")
+        session.add(user)
+        await session.flush()
+        post = UserPost(id=uuid.uuid4(), user_id=user.id, content="post", expires_at=datetime.utcnow() + timedelta(hours=1))
+        session.add(post)
+        await session.flush()
+        enqueue_media_job(session, post, spool_file(spool))
+        await session.commit()
+    return post
+
+async def load(db_engine, post_id) -> tuple[UserPost, MediaJob | None]:
+    async with AsyncSession(db_engine) as session:
+        post = await session.get(UserPost, post_id)
+        job = (await session.execute(select(MediaJob).where(MediaJob.post_id == post_id))).scalars().first()
+        return post, job
+
+async def test_uploaded_image_is_attached_to_the_post(db_engine, server, spool, post, monkeypatch):
+    def read_bytes(self):
+        raise AssertionError("spooled images are streamed, not read into memory")
+
+    with monkeypatch.context() as m:
+        m.setattr(Path, "read_bytes", read_bytes)
+        await process_media_job(await claim_media_job())
+
+    stored, job = await load(db_engine, post.id)
+    assert job is None
+    assert list(spool.iterdir()) == []
+    assert stored.image_status == ImageStatus.ready
+    assert server.images == {stored.image_public_id: b"image bytes"}
+    assert stored.image_url == server.url(stored.image_public_id)
+
+async def test_image_of_a_post_that_expired_meanwhile_is_removed(db_engine, server, spool, post):
+    job = await claim_media_job()
+    # Expired, but its row still stored (partitioned storage keeps it until the bucket is dropped)
+    async with AsyncSession(db_engine) as session:
+        await session.execute(update(UserPost).where(UserPost.id == post.id).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+
+    await process_media_job(job)
+
+    stored, job = await load(db_engine, post.id)
+    assert job is None
+    assert list(spool.iterdir()) == []
+    assert server.images == {}
+    assert stored.image_status == ImageStatus.pending_image and stored.image_url is None
+
+async def test_transient_failure_is_retried_later(db_engine, server, spool, post):
+    server.failures = [503] * cloudinary.MAX_ATTEMPTS
+    await process_media_job(await claim_media_job())
+
+    stored, job = await load(db_engine, post.id)
+    assert job.status == MediaJobStatus.pending and job.attempts == 1
+    assert job.run_at > datetime.utcnow()
+    assert stored.image_status == ImageStatus.pending_image
+    assert (spool / job.image_file).exists()
+
+async def test_rejected_image_is_dead_lettered_at_once(db_engine, server, spool, post):
+    server.failures = [400]
+    await process_media_job(await claim_media_job())
+
+    stored, job = await load(db_engine, post.id)
+    assert job.status == MediaJobStatus.dead and job.attempts == 1 < MAX_JOB_ATTEMPTS
+    assert "400" in job.last_error
+    assert stored.image_status == ImageStatus.failed
+    assert len(server.requests) == 1
+    # The image is cleared at once, and the job cannot be requeued without it
+    assert job.image_file is None and list(spool.iterdir()) == []
+    assert await requeue_dead_media_jobs() == 0
+
+async def test_sweep_clears_images_no_job_needs(db_engine, spool, post):
+    retention_ago = datetime.utcnow() - timedelta(seconds=DEAD_JOB_RETENTION_SECONDS + 60)
+    dead_file = spool_file(spool, age_seconds=DEAD_JOB_RETENTION_SECONDS + 60)
+    async with AsyncSession(db_engine) as session:
+        # One job dead for longer than the retention period; the fixture's job stays pending
+        dead_post = UserPost(id=uuid.uuid4(), user_id=post.user_id, content="dead", expires_at=post.expires_at)
+        dead_post_id = dead_post.id
+        session.add(dead_post)
+        await session.flush()
+        session.add(MediaJob(post_id=dead_post.id, user_id=post.user_id, image_file=dead_file, status=MediaJobStatus.dead, dead_at=retention_ago))
+        await session.commit()
+        _, pending_job = await load(db_engine, post.id)
+        os.utime(spool / pending_job.image_file, (0, 0)) # Old, but still needed
+    orphan_old = spool_file(spool, age_seconds=DEAD_JOB_RETENTION_SECONDS + 60)
+    orphan_new = spool_file(spool)
+
+    assert await sweep_media_spool() == 2
+
+    assert sorted(path.name for path in spool.iterdir()) == sorted([pending_job.image_file, orphan_new])
+    _, dead_job = await load(db_engine, dead_post_id)
+    assert dead_job.status == MediaJobStatus.dead and dead_job.image_file is None
+    assert orphan_old not in os.listdir(spool)
+
+async def test_recently_dead_jobs_can_be_requeued(db_engine, server, spool, post):
+    async with AsyncSession(db_engine) as session:
+        await session.execute(update(MediaJob).values(status=MediaJobStatus.dead, dead_at=datetime.utcnow()))
+        await session.commit()
+
+    assert await sweep_media_spool() == 0
+    assert await requeue_dead_media_jobs() == 1
+    await process_media_job(await claim_media_job())
+    stored, job = await load(db_engine, post.id)
+    assert job is None and stored.image_status == ImageStatus.ready
@@ -0,0 +1,99 @@
+"""
+Tests for the migration runner: INVALID indexes left by failed concurrent builds, and
+fresh databases built from the schema files.
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+import migrate
+from conftest import SETUP_SQL, PARTITIONED_SQL
+from database import create_db_engine
+from migrate import drop_invalid_index, list_migrations, run_migrations
+
+pytestmark = pytest.mark.anyio
+
+CREATE_INDEX = "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_migrate_test_code ON migrate_test (code)"
+
+async def index_is_valid(conn):
+    result = await conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = 'idx_migrate_test_code'"
+    ))
+    return result.scalar_one_or_none()
+
+async def test_failed_concurrent_index_is_rebuilt_on_retry(db_engine):
+    async with db_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("CREATE TABLE migrate_test (code INTEGER)"))
+        try:
+            await conn.execute(text("INSERT INTO migrate_test VALUES (1), (1)"))
+            with pytest.raises(Exception):
+                await conn.execute(text(CREATE_INDEX))
+            assert await index_is_valid(conn) is False
+
+            # IF NOT EXISTS alone would keep the invalid index
+            await conn.execute(text("DELETE FROM migrate_test"))
+            await conn.execute(text(CREATE_INDEX))
+            assert await index_is_valid(conn) is False
+
+            await drop_invalid_index(conn, CREATE_INDEX)
+            await conn.execute(text(CREATE_INDEX))
+            assert await index_is_valid(conn) is True
+
+            # A valid index is left alone
+            await drop_invalid_index(conn, CREATE_INDEX)
+            assert await index_is_valid(conn) is True
+        finally:
+            await conn.execute(text("DROP TABLE migrate_test"))
+
+async def test_other_statements_are_ignored(db_engine):
+    async with db_engine.connect() as conn:
+        await drop_invalid_index(conn, "ALTER TABLE user_posts ADD COLUMN IF NOT EXISTS image_url VARCHAR")
+
+async def applied_versions(url: str) -> set:
+    engine = create_db_engine(url, pgbouncer=False, poolclass=NullPool)
+    async with engine.connect() as conn:
+        versions = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars().all())
+    await engine.dispose()
+    return versions
+
+async def test_fresh_schema_records_every_migration(scratch_database):
+    url, load = scratch_database
+    await load(SETUP_SQL)
+
+    # db_setup.sql must list each migration, so a fresh database has nothing to apply
+    assert await applied_versions(url) == {version for version, _ in list_migrations()}
+
+@pytest.mark.parametrize("paths", [(SETUP_SQL,), (SETUP_SQL, PARTITIONED_SQL)], ids=["rows", "partitioned"])
+async def test_migrations_run_cleanly_on_a_fresh_schema(scratch_database, monkeypatch, paths):
+    url, load = scratch_database
+    await load(*paths)
+    monkeypatch.setattr(migrate, "DIRECT_DATABASE_URL", url)
+
+    await run_migrations()
+
+    assert await applied_versions(url) == {version for version, _ in list_migrations()}
+
+async def test_post_stats_backfill_copies_expiry_on_a_current_schema(scratch_database, monkeypatch):
+    url, load = scratch_database
+    await load(SETUP_SQL)
+    engine = create_db_engine(url, pgbouncer=False, poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM schema_migrations WHERE version = '0002_post_stats'"))
+        user_id = (await conn.execute(text(
+            "INSERT INTO users (firebase_uid, name, email) VALUES ('uid', 'U', 'u@example.edu') RETURNING id"
+        ))).scalar()
+        await conn.execute(text(
+            "INSERT INTO user_posts (user_id, content, expires_at) VALUES (:user_id, 'post', now() + interval '1 hour')"
+        ), {"user_id": user_id})
+    monkeypatch.setattr(migrate, "DIRECT_DATABASE_URL", url)
+
+    await run_migrations()
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT s.post_expires_at = p.expires_at FROM post_stats s JOIN user_posts p ON p.id = s.post_id"
+        ))).scalars().all()
+    await engine.dispose()
+    assert rows == [True]
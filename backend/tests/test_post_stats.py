@@ -0,0 +1,80 @@
+"""
+Tests for post counter reconciliation: drift repair in batches, and no lost updates
+when a reaction is added while a batch is being reconciled.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, UserPost, PostReaction, PostStats, ReactionType
+from utils.post_stats import reconcile_post_stats, reconcile_post_stats_batch, bump_reaction_count
+
+pytestmark = pytest.mark.anyio
+
+async def seed(session: AsyncSession, posts: int, likes: int) -> tuple[list, list]:
+    """
+    Insert `posts` posts with `likes` likes each and zeroed counters; return (posts, users).
+    """
+
+    users = [User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="U", email=f"{uuid.uuid4()}@example.edu") for _ in range(likes + 1)]
+    session.add_all(users)
+    await session.flush()
+
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    rows = []
+    for i in range(posts):
+        post = UserPost(id=uuid.uuid4(), user_id=users[0].id, content=f"post {i}", expires_at=expires_at)
+        session.add(post)
+        await session.flush()
+        session.add(PostStats(post_id=post.id, post_expires_at=expires_at))
+        session.add_all(
+            PostReaction(post_id=post.id, post_expires_at=expires_at, user_id=user.id, type=ReactionType.like)
+            for user in users[1:]
+        )
+        rows.append(post)
+    await session.commit()
+    return rows, users
+
+async def like_counts(session: AsyncSession) -> list[int]:
+    result = await session.execute(select(PostStats.like_count).order_by(PostStats.post_id))
+    return list(result.scalars())
+
+async def test_reconcile_repairs_drift_in_batches(db_engine):
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        posts, _ = await seed(session, posts=5, likes=2)
+        # One counter row over-counted, one missing entirely
+        await session.execute(update(PostStats).where(PostStats.post_id == posts[0].id).values(like_count=9))
+        await session.execute(PostStats.__table__.delete().where(PostStats.post_id == posts[1].id))
+        await session.commit()
+
+        repaired = await reconcile_post_stats(batch_size=2)
+        assert repaired == 5 # Four zeroed rows plus the over-counted one; the missing row is created, then repaired
+        assert await like_counts(session) == [2] * 5
+
+        assert await reconcile_post_stats(batch_size=2) == 0
+
+async def test_reconcile_does_not_lose_concurrent_bump(db_engine):
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        (post,), users = await seed(session, posts=1, likes=1)
+
+    async with AsyncSession(db_engine) as reacting, AsyncSession(db_engine) as reconciling:
+        # A reaction is inserted but not yet committed; its counter bump comes later
+        reacting.add(PostReaction(post_id=post.id, post_expires_at=post.expires_at, user_id=users[0].id, type=ReactionType.like))
+        await reacting.flush()
+
+        # The reconciler cannot see the uncommitted reaction, and sets the counter to 1
+        assert await reconcile_post_stats_batch(reconciling, [post.id]) == 1
+
+        # The bump waits for the reconciler's row lock, then adds on top of the repaired value
+        bump = asyncio.create_task(bump_reaction_count(reacting, post.id, post.expires_at, ReactionType.like, 1))
+        await asyncio.sleep(0.2)
+        assert not bump.done()
+        await reconciling.commit()
+        await bump
+        await reacting.commit()
+
+    async with AsyncSession(db_engine) as session:
+        assert await like_counts(session) == [2]
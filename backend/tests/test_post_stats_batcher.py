@@ -0,0 +1,49 @@
+"""
+Tests for batched post_stats frames carrying the counts stored at flush time.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, UserPost, PostStats
+from utils.post_stats_batcher import PostStatsBatcher
+from utils.redis_ws_manager import manager
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def frames(monkeypatch):
+    sent = []
+
+    async def broadcast(message, topics=None):
+        sent.append(message["data"])
+
+    monkeypatch.setattr(manager, "broadcast", broadcast)
+    return sent
+
+async def test_frames_carry_absolute_counts(db_engine, frames):
+    async with AsyncSession(db_engine) as session:
+        user = User(id=uuid.uuid4(), firebase_uid=f"uid-{uuid.uuid4()}", name="U", email=f"{uuid.uuid4()}@example.edu")
+        session.add(user)
+        await session.flush()
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        post = UserPost(id=uuid.uuid4(), user_id=user.id, content="post", expires_at=expires_at)
+        post_id = post.id
+        session.add(post)
+        await session.flush()
+        session.add(PostStats(post_id=post_id, post_expires_at=expires_at, like_count=12, sad_count=1, comment_count=4))
+        await session.commit()
+
+    batcher = PostStatsBatcher(window=60)
+    for _ in range(3):
+        batcher.add(post_id)
+    batcher.add(uuid.uuid4()) # No counter row (deleted post): no frame
+    batcher.flush_task.cancel()
+    await batcher.flush()
+
+    assert frames == [{"post_id": str(post_id), "reactions": {"like": 12, "sad": 1}, "comments": 4}]
+    assert batcher.pending == {}
+
+    await batcher.flush() # Nothing pending: no query, no frame
+    assert len(frames) == 1
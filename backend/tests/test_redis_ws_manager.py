@@ -0,0 +1,194 @@
+"""
+Tests for the WebSocket manager with fake sockets: admission refusals, and with
+fakeredis: a dropped pub/sub connection, replay of the events it missed from the
+stream, and resuming clients.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from utils import redis_ws_manager
+from utils.redis_ws_manager import RedisWebSocketManager, FEED_TOPIC, post_topic
+
+pytestmark = pytest.mark.anyio
+
+class FakeWebSocket:
+    """
+    Records handshake, sent frames and close code like a Starlette WebSocket.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.sent = []
+        self.received = asyncio.Event()
+
+    async def accept(self):
+        self.calls.append("accept")
+
+    async def close(self, code: int = 1000):
+        self.calls.append(("close", code))
+
+    async def send_text(self, payload: str):
+        self.sent.append(json.loads(payload))
+        self.received.set()
+
+    async def wait_for(self, count: int, timeout: float = 3.0):
+        async def receive():
+            while len(self.sent) < count:
+                self.received.clear()
+                await self.received.wait()
+        await asyncio.wait_for(receive(), timeout)
+
+@pytest.fixture
+async def ws_manager():
+    manager = RedisWebSocketManager()
+    try:
+        yield manager
+    finally:
+        for websocket in list(manager.active_connections):
+            await manager.disconnect(websocket)
+        await manager.stop()
+
+async def test_user_over_the_cap_is_accepted_then_closed_with_1008(ws_manager, monkeypatch):
+    monkeypatch.setattr(redis_ws_manager, "MAX_CONNECTIONS_PER_USER", 1)
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    assert await ws_manager.connect(first, [FEED_TOPIC], user_id="user-1")
+    assert not await ws_manager.connect(second, [FEED_TOPIC], user_id="user-1")
+
+    assert first.calls == ["accept"]
+    assert second.calls == ["accept", ("close", 1008)]
+    assert ws_manager.user_connections == {"user-1": 1}
+
+async def test_full_instance_is_accepted_then_closed_with_1013(ws_manager, monkeypatch):
+    monkeypatch.setattr(redis_ws_manager, "MAX_CONNECTIONS_PER_INSTANCE", 1)
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    assert await ws_manager.connect(first, [FEED_TOPIC])
+    assert not await ws_manager.connect(second, [FEED_TOPIC])
+
+    assert second.calls == ["accept", ("close", 1013)]
+    assert list(ws_manager.active_connections) == [first]
+
+RECONNECT_DELAY = 0.3
+
+@pytest.fixture
+async def redis_server(monkeypatch):
+    # Deterministic reconnect delay, so events can be published while the listener is away
+    monkeypatch.setattr(redis_ws_manager, "random", SimpleNamespace(uniform=lambda low, high: RECONNECT_DELAY))
+    # Poll the pub/sub connection often, so a drop is noticed quickly
+    monkeypatch.setattr(redis_ws_manager, "HEALTH_CHECK_INTERVAL_SECONDS", 0.05)
+    return fakeredis.FakeServer()
+
+async def listening_manager(server) -> RedisWebSocketManager:
+    """
+    Return a manager subscribed to Redis pub/sub on `server`, like one started from the lifespan.
+    """
+
+    manager = RedisWebSocketManager()
+    manager.redis = fakeredis.FakeAsyncRedis(server=server)
+    manager.pubsub_task = asyncio.create_task(manager._redis_listener())
+    await wait_until(lambda: manager.redis_enabled)
+    return manager
+
+def publishing_manager(server) -> RedisWebSocketManager:
+    """
+    Return a manager that publishes through Redis on `server` (another instance) without listening.
+    """
+
+    manager = RedisWebSocketManager()
+    manager.redis = fakeredis.FakeAsyncRedis(server=server)
+    manager.redis_enabled = True
+    return manager
+
+async def wait_until(condition, timeout: float = 3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+def event(n: int) -> dict:
+    return {"type": "new_post", "data": {"id": n}}
+
+async def test_events_missed_while_disconnected_are_replayed_once(redis_server):
+    listener, publisher = await listening_manager(redis_server), publishing_manager(redis_server)
+    websocket = FakeWebSocket()
+    await listener.connect(websocket, [FEED_TOPIC])
+    try:
+        await publisher.broadcast(event(1))
+        await websocket.wait_for(1)
+
+        # The pub/sub connection drops; events are published before the listener is back
+        redis_server.connected = False
+        await wait_until(lambda: not listener.redis_enabled)
+        redis_server.connected = True
+        await publisher.broadcast(event(2))
+        await publisher.broadcast(event(3), topics=[FEED_TOPIC, post_topic("0" * 32)])
+
+        await websocket.wait_for(3)
+        assert listener.redis_enabled
+        await publisher.broadcast(event(4))
+        await websocket.wait_for(4)
+
+        assert [message["data"]["id"] for message in websocket.sent] == [1, 2, 3, 4]
+        seqs = [message["seq"] for message in websocket.sent]
+        assert [listener.recent_events[seq] for seq in seqs] == [False, True, True, False] # 2 and 3 came from the stream
+        await asyncio.sleep(0.1)
+        assert len(websocket.sent) == 4 # Nothing delivered twice
+    finally:
+        await listener.disconnect(websocket)
+        await listener.stop()
+        await publisher.redis.aclose()
+
+async def test_broadcasts_fall_back_to_local_while_redis_is_down(redis_server):
+    manager = await listening_manager(redis_server)
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, [FEED_TOPIC])
+    try:
+        redis_server.connected = False
+        await wait_until(lambda: not manager.redis_enabled)
+        await manager.broadcast(event(1))
+        await websocket.wait_for(1)
+        assert websocket.sent[0]["data"] == {"id": 1} and websocket.sent[0]["seq"]
+
+        redis_server.connected = True
+        await wait_until(lambda: manager.redis_enabled)
+        await manager.broadcast(event(2))
+        await websocket.wait_for(2)
+        assert [message["data"]["id"] for message in websocket.sent] == [1, 2]
+    finally:
+        await manager.disconnect(websocket)
+        await manager.stop()
+
+async def test_reconnecting_client_gets_missed_events_from_the_stream(redis_server):
+    listener, publisher = await listening_manager(redis_server), publishing_manager(redis_server)
+    first = FakeWebSocket()
+    await listener.connect(first, [FEED_TOPIC])
+    try:
+        await publisher.broadcast(event(1))
+        await first.wait_for(1)
+        since = first.sent[0]["seq"]
+        await listener.disconnect(first)
+
+        await publisher.broadcast(event(2))
+        await publisher.broadcast(event(3), topics=[post_topic("0" * 32)]) # Not followed by the client
+        await publisher.broadcast(event(4))
+
+        second = FakeWebSocket()
+        await listener.connect(second, [FEED_TOPIC], since=since)
+        await second.wait_for(2)
+        await asyncio.sleep(0.1)
+        assert [message["data"]["id"] for message in second.sent] == [2, 4]
+
+        # Resuming from before the oldest retained event asks the client to refetch
+        third = FakeWebSocket()
+        await listener.connect(third, [FEED_TOPIC], since="1-0")
+        await third.wait_for(1)
+        assert third.sent[0]["type"] == "resync_required"
+        await listener.disconnect(second)
+        await listener.disconnect(third)
+    finally:
+        await listener.stop()
+        await publisher.redis.aclose()
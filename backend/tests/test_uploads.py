@@ -0,0 +1,80 @@
+"""
+Tests for upload size limits before and after the multipart body is parsed, and for spooling images to files.
+"""
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from utils import uploads
+from utils.middleware import UploadSizeLimitMiddleware
+from utils.uploads import spool_image_upload, spool_path
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = 4096
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 1000
+BOUNDARY = "test-boundary"
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "MEDIA_SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+async def client(spool):
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=LIMIT)
+    app.state.calls = 0
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        app.state.calls += 1
+        name = await spool_image_upload(file, max_bytes=LIMIT // 2)
+        with open(spool_path(name), "rb") as f:
+            return {"name": name, "size": len(f.read())}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        client.app = app
+        yield client
+
+def multipart(data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+async def test_image_is_spooled_to_a_file(client, spool):
+    response = await client.post("/upload", files={"file": ("a.jpg", JPEG, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["size"] == len(JPEG)
+    assert (spool / response.json()["name"]).read_bytes() == JPEG
+
+async def test_oversized_content_length_is_rejected_unread(client, spool):
+    response = await client.post("/upload", files={"file": ("a.jpg", JPEG * 5, "image/jpeg")})
+    assert response.status_code == 413
+    assert client.app.state.calls == 0
+    assert list(spool.iterdir()) == []
+
+async def test_oversized_chunked_body_is_cut_off(client, spool):
+    body = multipart(JPEG * 5)
+    received = []
+
+    async def chunks():
+        for i in range(0, len(body), 512):
+            received.append(i)
+            yield body[i:i + 512]
+
+    response = await client.post("/upload", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+    assert response.status_code == 413
+    assert client.app.state.calls == 0
+    assert len(received) * 512 <= LIMIT + 1024 # Stopped reading soon after the cap
+
+async def test_image_over_the_image_cap_is_rejected(client, spool):
+    response = await client.post("/upload", files={"file": ("a.jpg", JPEG * 3, "image/jpeg")})
+    assert response.status_code == 413
+    assert list(spool.iterdir()) == []
+
+async def test_non_image_is_rejected(client, spool):
+    response = await client.post("/upload", files={"file": ("a.jpg", b"not an image" * 10, "image/jpeg")})
+    assert response.status_code == 415
+    assert list(spool.iterdir()) == []
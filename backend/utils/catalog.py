@@ -0,0 +1,319 @@
+"""
+In-memory catalog of hobbies, hobby categories and locations.
+
+These catalogs are read on every profile screen but change rarely (admin hobby edits,
+a first user from a new town), so each instance keeps them in memory:
+- `hobbies_by_id` and `hobbies_by_name` answer the hobby lookups of profile saves
+  without a query.
+- The list endpoints (`GET /hobbies`, `GET /hobbies/categories`, `GET /locations`) are
+  served from JSON bodies serialized once per load, with an ETag derived from the body,
+  so unchanged catalogs are answered with `304 Not Modified` without hashing them again.
+
+Catalogs are loaded at startup and reloaded from the primary when a write changes them:
+`invalidate()` reloads locally and publishes the catalog name on the CATALOG_CHANNEL
+Redis channel, and every other instance reloads it on receipt. Instances reload
+everything after (re)subscribing, and every CATALOG_REFRESH_SECONDS as a backstop for
+messages lost while Redis was unreachable. An ID missing from the catalog is checked
+against the database before it is rejected, so a hobby created on another instance
+is accepted even before the invalidation arrives.
+
+The reverse race is caught at write time: an ID the catalog still lists may belong to a
+hobby deleted on another instance, whose invalidation has not arrived (for up to
+CATALOG_REFRESH_SECONDS without Redis). Saving it then fails the `user_hobbies` foreign
+key; routes pass the IntegrityError to `recover_from_deleted_hobby`, which reloads the
+hobbies so the request can be rejected with a 400 (or retried) instead of failing with a 500.
+"""
+
+import asyncio
+import hashlib
+import random
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+from uuid import UUID, uuid4
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal
+from models import Hobby, Location, HobbyCategory
+from schemas import LocationRead
+from schemas.hobbies import HobbyRead
+from logger import logger
+from utils.metrics import metrics
+from utils.redis_ws_manager import manager, RECONNECT_BASE_SECONDS, RECONNECT_MAX_SECONDS
+
+CATALOG_REFRESH_SECONDS = 300 # Full reload interval, in case an invalidation message was missed
+CATALOG_CHANNEL = "catalog_invalidate" # Redis channel carrying "<catalog>:<instance id>" messages
+CATALOG_CACHE_CONTROL = "no-cache" # Browsers may keep the body but must revalidate it (ETag)
+FOREIGN_KEY_VIOLATION = "23503" # SQLSTATE of a write referencing a missing (e.g. deleted) row
+
+HOBBIES = "hobbies"
+LOCATIONS = "locations"
+CATEGORIES = "categories"
+
+_hobby_list = TypeAdapter(list[HobbyRead])
+_location_list = TypeAdapter(list[LocationRead])
+
+class CatalogEntry(NamedTuple):
+    """
+    One serialized catalog and its ETag.
+    """
+
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CatalogEntry":
+        return cls(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+    def response(self) -> Response:
+        """
+        Return the catalog as JSON with its ETag (`utils/middleware.py` answers matching
+        If-None-Match requests with 304).
+
+        Metrics:
+        - catalog.hits
+        """
+
+        metrics.incr("catalog.hits")
+        headers = {"ETag": self.etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+class Catalog:
+    """
+    Hobby, category and location catalogs kept in memory and invalidated across instances.
+
+    Attributes:
+    - hobbies_by_id (Dict[UUID, HobbyRead]): Hobby ID -> hobby.
+    - hobbies_by_name (Dict[Tuple[str, str], HobbyRead]): (lowercase name, category) -> hobby.
+    - location_ids (Set[UUID]): IDs of all known locations.
+    - entries (Dict[str, CatalogEntry]): Catalog name -> serialized list and ETag.
+    - tasks (List[asyncio.Task]): Background refresh and invalidation listener tasks.
+
+    Metrics:
+    - catalog.reloads, catalog.reload_errors, catalog.invalidations, catalog.publish_failures,
+      catalog.db_lookups, catalog.stale_hobbies
+    - catalog.hobbies (gauge), catalog.locations (gauge)
+    """
+
+    def __init__(self):
+        self.hobbies_by_id: Dict[UUID, HobbyRead] = {}
+        self.hobbies_by_name: Dict[Tuple[str, str], HobbyRead] = {}
+        self.location_ids: Set[UUID] = set()
+        self.entries: Dict[str, CatalogEntry] = {
+            CATEGORIES: CatalogEntry.from_body(TypeAdapter(list[str]).dump_json([c.value for c in HobbyCategory])),
+        }
+        self.instance_id = uuid4().hex # Lets an instance skip its own invalidation messages
+        self.tasks = []
+
+    @staticmethod
+    def _name_key(name: str, category) -> Tuple[str, str]:
+        return name.strip().lower(), getattr(category, "value", category)
+
+    async def _load_hobbies(self, session: AsyncSession):
+        result = await session.execute(select(Hobby).order_by(Hobby.id))
+        hobbies = [HobbyRead.model_validate(hobby) for hobby in result.scalars()]
+        self.hobbies_by_id = {hobby.id: hobby for hobby in hobbies}
+        self.hobbies_by_name = {self._name_key(hobby.name, hobby.category): hobby for hobby in hobbies}
+        self.entries[HOBBIES] = CatalogEntry.from_body(_hobby_list.dump_json(hobbies))
+        metrics.set_gauge("catalog.hobbies", len(hobbies))
+
+    async def _load_locations(self, session: AsyncSession):
+        result = await session.execute(select(Location).order_by(Location.id))
+        locations = [LocationRead.model_validate(location) for location in result.scalars()]
+        self.location_ids = {location.id for location in locations}
+        self.entries[LOCATIONS] = CatalogEntry.from_body(_location_list.dump_json(locations))
+        metrics.set_gauge("catalog.locations", len(locations))
+
+    async def reload(self, kinds: Iterable[str] = (HOBBIES, LOCATIONS)):
+        """
+        Reload catalogs from the primary (never a replica, so a write just made is always included).
+
+        Parameters:
+        - kinds (Iterable[str]): Catalogs to reload (HOBBIES and/or LOCATIONS).
+
+        Raises:
+        - The database error if a catalog cannot be loaded (the previous version is kept).
+        """
+
+        loaders = {HOBBIES: self._load_hobbies, LOCATIONS: self._load_locations}
+        async with SessionLocal() as session:
+            for kind in kinds:
+                try:
+                    await loaders[kind](session)
+                except Exception:
+                    metrics.incr("catalog.reload_errors")
+                    raise
+                metrics.incr("catalog.reloads")
+
+    async def entry(self, kind: str) -> CatalogEntry:
+        """
+        Return a serialized catalog, loading it first if the startup load failed.
+
+        Raises:
+        - The database error if the catalog cannot be loaded.
+        """
+
+        if kind not in self.entries:
+            await self.reload([kind])
+        return self.entries[kind]
+
+    async def invalidate(self, kind: str):
+        """
+        Reload a catalog after a write that changed it, here and on every other instance.
+
+        Parameters:
+        - kind (str): HOBBIES or LOCATIONS.
+        """
+
+        metrics.incr("catalog.invalidations")
+        await self._try_reload([kind])
+
+        if manager.redis_enabled:
+            try:
+                await manager.redis.publish(CATALOG_CHANNEL, f"{kind}:{self.instance_id}")
+            except Exception as e:
+                metrics.incr("catalog.publish_failures")
+                logger.warning(f"Catalog invalidation publish failed: {e}")
+
+    def hobby_by_name(self, name: str, category) -> Optional[HobbyRead]:
+        """
+        Return the hobby with this name (case-insensitive) and category, if the catalog has it.
+        """
+
+        return self.hobbies_by_name.get(self._name_key(name, category))
+
+    async def existing_hobby_ids(self, db: AsyncSession, hobby_ids: Iterable[UUID]) -> Set[UUID]:
+        """
+        Return which of `hobby_ids` exist, querying only for IDs the catalog does not know.
+
+        Parameters:
+        - db (AsyncSession): Session used for IDs missing from the catalog.
+        - hobby_ids (Iterable[UUID]): IDs to check.
+
+        Returns:
+        - Set[UUID]: The IDs that exist.
+        """
+
+        hobby_ids = {UUID(str(hobby_id)) for hobby_id in hobby_ids}
+        found = {hobby_id for hobby_id in hobby_ids if hobby_id in self.hobbies_by_id}
+        unknown = hobby_ids - found
+        if unknown:
+            metrics.incr("catalog.db_lookups")
+            result = await db.execute(select(Hobby.id).where(Hobby.id.in_(unknown)))
+            found.update(result.scalars().all())
+        return found
+
+    async def recover_from_deleted_hobby(self, error: IntegrityError) -> bool:
+        """
+        Check whether a failed write referenced a hobby that no longer exists (a stale
+        catalog hit), and if so reload the hobbies. Call after rolling back.
+
+        Parameters:
+        - error (IntegrityError): The error the write failed with.
+
+        Returns:
+        - bool: True if it was a foreign key violation and the hobbies were reloaded.
+        """
+
+        if getattr(error.orig, "sqlstate", None) != FOREIGN_KEY_VIOLATION:
+            return False
+        metrics.incr("catalog.stale_hobbies")
+        await self._try_reload([HOBBIES])
+        return True
+
+    async def location_exists(self, db: AsyncSession, location_id: UUID) -> bool:
+        """
+        Return True if the location exists, querying only if the catalog does not know it.
+        """
+
+        location_id = UUID(str(location_id))
+        if location_id in self.location_ids:
+            return True
+        metrics.incr("catalog.db_lookups")
+        result = await db.execute(select(Location.id).where(Location.id == location_id))
+        return result.scalar_one_or_none() is not None
+
+    async def _try_reload(self, kinds: Iterable[str] = (HOBBIES, LOCATIONS)):
+        try:
+            await self.reload(kinds)
+        except Exception as e:
+            logger.warning(f"Catalog reload of {', '.join(kinds)} failed: {e}")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+            await self._try_reload()
+
+    async def _invalidation_listener(self):
+        """
+        Reload catalogs named on CATALOG_CHANNEL by other instances.
+
+        Reloads everything after each resubscription, since messages published while
+        disconnected are lost, and reconnects with jittered exponential backoff.
+        """
+
+        attempt = 0
+        resubscribing = False # The first subscription follows the startup load
+        while True:
+            pubsub = manager.redis.pubsub()
+            try:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                if resubscribing:
+                    await self._try_reload()
+                resubscribing = True
+                attempt = 0
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    kind, _, sender = (data.decode() if isinstance(data, bytes) else data).partition(":")
+                    if sender != self.instance_id and kind in (HOBBIES, LOCATIONS):
+                        await self._try_reload([kind])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Catalog invalidation subscription lost: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass # Connection already broken
+
+            delay = random.uniform(0, min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * 2 ** attempt))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def start(self):
+        """
+        Load the catalogs and start the refresh and invalidation tasks (call after `manager.start()`).
+
+        A failed load is logged; the endpoints then load on first use.
+        """
+
+        try:
+            await self.reload()
+            logger.info(f"Catalog loaded: {len(self.hobbies_by_id)} hobbies, {len(self.location_ids)} locations.")
+        except Exception as e:
+            logger.error(f"Catalog load failed, loading on first use: {e}")
+        self.tasks = [asyncio.create_task(self._refresh_loop())]
+        if manager.redis is not None:
+            self.tasks.append(asyncio.create_task(self._invalidation_listener()))
+
+    async def stop(self):
+        """
+        Stop the background tasks (call before `manager.stop()`, which closes the Redis client).
+        """
+
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+
+
+# Export a single global catalog to be used throughout the app
+catalog = Catalog()
@@ -1,92 +1,246 @@
+"""
+Expired-post reaper.
+
+Expired posts are deleted in bounded batches, each in its own short transaction:
+- One `DELETE ... RETURNING` per batch removes up to REAPER_BATCH_SIZE posts, picked
+  with `FOR UPDATE SKIP LOCKED`, so several backend instances can reap concurrently
+  without waiting on or double-deleting each other's rows. Comments, reactions,
+  counters and queued media jobs go with them through `ON DELETE CASCADE`.
+- The batch's Cloudinary images are deleted after the commit in bulk requests that
+  run concurrently (see `MediaClient.destroy_many`).
+- Clients are notified with one `delete_posts` frame per DELETE_FRAME_SIZE posts
+  instead of one message per post.
+
+In partitioned storage (HOBBYMATCH_POST_STORAGE=partitioned) rows are not deleted
+here: expired posts are only announced (images deleted, `delete_posts` frames sent),
+and the rows go when their partition is dropped (see `utils/post_partitions.py`).
+How far announcements have got is kept in the `reaper_state` row, so a new or
+restarted leader carries on where the last one stopped instead of announcing again.
+
+`utils/expiry_scheduler.py` runs the reaper when posts reach their deadlines.
+"""
+
 import asyncio
+import time
 from datetime import datetime
-from sqlalchemy import select, delete
-from models import UserPost, PostComment, PostReaction
-from database import SessionLocal
-from routes.websocket import manager 
-import cloudinary.uploader
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import select, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from models import UserPost, ReaperState
+from database import SessionLocal, POSTS_PARTITIONED
+from utils.redis_ws_manager import manager, FEED_TOPIC, post_topic
+from utils.feed_cache import feed_cache
+from utils.cloudinary import media_client
+from utils.metrics import metrics
 from logger import logger
 
-async def delete_expired_posts():
+REAPER_BATCH_SIZE = 500 # Posts deleted per transaction
+REAPER_BATCH_PAUSE_SECONDS = 0.1 # Pause between batches, to leave room for other queries
+DELETE_FRAME_SIZE = 50 # Post IDs per `delete_posts` WebSocket frame
+
+async def delete_expired_batch(now: datetime) -> int:
     """
-    Find and delete all posts that have expired based on their expiration timestamp.
+    Delete one batch of expired posts, their images, and notify clients.
 
-    Workflow:
-    - Queries the database for UserPost entries where expires_at <= current UTC time.
-    - Deletes associated images from Cloudinary if they exist.
-    - Deletes related PostComments and PostReactions linked to expired posts.
-    - Deletes the expired UserPost records from the database.
-    - Commits all deletions in a transaction.
-    - Broadcasts a WebSocket message to notify connected clients about each deleted post.
+    Parameters:
+    - now (datetime): Posts with expires_at <= now are expired.
+
+    Returns:
+    - int: Number of posts deleted (less than REAPER_BATCH_SIZE when the backlog is done).
+    """
+
+    batch = (
+        select(UserPost.id)
+        .where(UserPost.expires_at <= now)
+        .order_by(UserPost.expires_at)
+        .limit(REAPER_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    async with SessionLocal() as session:
+        result = await session.execute(
+            delete(UserPost)
+            .where(UserPost.id.in_(batch))
+            .returning(UserPost.id, UserPost.image_public_id)
+        )
+        deleted = result.all()
+        await session.commit()
+
+    if not deleted:
+        return 0
+
+    await release_expired_posts(deleted)
+    metrics.incr("reaper.batches")
+    metrics.incr("reaper.posts_deleted", len(deleted))
+    return len(deleted)
+
+async def load_announced_until() -> Optional[datetime]:
+    """
+    Partitioned storage: return the expires_at up to which posts have been announced
+    (None before the first run, which announces every expired post still stored).
+    """
+
+    async with SessionLocal() as session:
+        result = await session.execute(select(ReaperState.announced_until).where(ReaperState.id == 1))
+        return result.scalar_one_or_none()
+
+async def save_announced_until(announced_until: datetime):
+    """
+    Partitioned storage: record that posts expiring up to `announced_until` have been announced.
+    """
+
+    async with SessionLocal() as session:
+        await session.execute(
+            insert(ReaperState)
+            .values(id=1, announced_until=announced_until)
+            .on_conflict_do_update(index_elements=[ReaperState.id], set_={"announced_until": announced_until})
+        )
+        await session.commit()
+
+async def announce_expired_batch(after: tuple | None, now: datetime, since: Optional[datetime] = None) -> tuple | None:
+    """
+    Partitioned storage: announce one batch of expired posts without deleting them.
 
     Parameters:
-    - None
+    - after (tuple | None): (expires_at, id) of the last announced post, or None to start
+      from `since`.
+    - now (datetime): Posts with expires_at <= now are expired.
+    - since (datetime | None): Posts with expires_at <= since were announced by an earlier run.
 
     Returns:
-    - None
+    - tuple | None: (expires_at, id) of the batch's last post, or None when the backlog is done.
+    """
 
-    Logs:
-    - Errors during image deletion or database operations are logged.
+    stmt = (
+        select(UserPost.id, UserPost.image_public_id, UserPost.expires_at)
+        .where(UserPost.expires_at <= now)
+        .order_by(UserPost.expires_at, UserPost.id)
+        .limit(REAPER_BATCH_SIZE)
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(UserPost.expires_at, UserPost.id) > tuple_(*after))
+    elif since is not None:
+        stmt = stmt.where(UserPost.expires_at > since)
+    async with SessionLocal() as session:
+        expired = (await session.execute(stmt)).all()
+
+    if not expired:
+        return None
+
+    await release_expired_posts([(post_id, public_id) for post_id, public_id, _ in expired])
+    metrics.incr("reaper.batches")
+    metrics.incr("reaper.posts_announced", len(expired))
+    if len(expired) < REAPER_BATCH_SIZE:
+        return None
+    post_id, _, expires_at = expired[-1]
+    return (expires_at, post_id)
+
+async def release_expired_posts(expired: List[tuple]):
+    """
+    Delete the images of expired posts and notify clients that the posts are gone.
 
-    Raises:
-    - Catches and logs any unexpected exceptions to avoid crashing the loop.
+    Parameters:
+    - expired (List[tuple]): (post_id, image_public_id) pairs.
     """
 
-    try:
-        now = datetime.utcnow()
-        async with SessionLocal() as session:
-            # Query expired posts with their IDs and Cloudinary public IDs
-            expired_stmt = select(UserPost.id, UserPost.image_public_id).where(UserPost.expires_at <= now)
-            result = await session.execute(expired_stmt)
-            expired_posts = result.all()
-            
-            expired_post_ids = [post.id for post in expired_posts]
-
-            # Delete Cloudinary images associated with expired posts
-            for post_id, public_id in expired_posts:
-                if public_id:
-                    try:
-                        cloudinary.uploader.destroy(public_id, invalidate=True)
-                    except Exception as e:
-                        logger.error(f"Failed to delete Cloudinary image {public_id}: {e}")
-
-            # Delete all related comments and reactions from database
-            await session.execute(delete(PostComment).where(PostComment.post_id.in_(expired_post_ids)))
-            await session.execute(delete(PostReaction).where(PostReaction.post_id.in_(expired_post_ids)))
-            # Delete the expired posts themselves
-            await session.execute(delete(UserPost).where(UserPost.id.in_(expired_post_ids)))
-            await session.commit() # Commit the transaction to apply deletions
-
-            # Broadcast and Notify connected WebSocket clients about deleted posts
-            for post_id in expired_post_ids:
-                await manager.broadcast({
-                    "type": "delete_post",
-                    "data": {
-                        "post_id": str(post_id)
-                    }
-                })
+    post_ids = [post_id for post_id, _ in expired]
+    public_ids = [public_id for _, public_id in expired if public_id]
+    await feed_cache.invalidate() # Drop cached feed pages that still contain the expired posts
 
-    except Exception as e:
-        logger.error(f"Error deleting expired posts/comments/reactions: {e}")
+    # Delete the images in concurrent bulk requests and notify clients meanwhile
+    await asyncio.gather(
+        media_client.destroy_many(public_ids),
+        broadcast_deleted_posts(post_ids),
+    )
+    metrics.incr("reaper.images_deleted", len(public_ids))
+
+async def broadcast_deleted_posts(post_ids: List):
+    """
+    Notify clients of deleted posts with one `delete_posts` frame per DELETE_FRAME_SIZE posts.
+
+    Each frame goes to the feed and to the topics of the posts it lists:
+    {"type": "delete_posts", "data": {"post_ids": [...]}}
+    """
+
+    for start in range(0, len(post_ids), DELETE_FRAME_SIZE):
+        chunk = post_ids[start:start + DELETE_FRAME_SIZE]
+        await manager.broadcast({
+            "type": "delete_posts",
+            "data": {
+                "post_ids": [str(post_id) for post_id in chunk]
+            }
+        }, topics=[FEED_TOPIC] + [post_topic(post_id) for post_id in chunk])
+
+async def count_expired_posts(now: datetime) -> int:
+    """
+    Count expired posts still waiting to be reaped (an index-only count on expires_at).
+    """
 
+    async with SessionLocal() as session:
+        result = await session.execute(select(func.count()).select_from(UserPost).where(UserPost.expires_at <= now))
+        return result.scalar_one()
 
-async def delete_expired_posts_loop():
+async def delete_expired_posts(still_leader: Optional[Callable[[], Awaitable[bool]]] = None):
     """
-    Continuously run the `delete_expired_posts` coroutine every 60 seconds.
+    Delete all posts that have expired based on their expiration timestamp, in batches.
 
-    This creates a background loop that periodically cleans up expired posts.
+    Workflow:
+    - Records the current backlog of expired posts.
+    - Deletes batches of up to REAPER_BATCH_SIZE expired posts (see `delete_expired_batch`)
+      until a batch comes back short, pausing REAPER_BATCH_PAUSE_SECONDS in between.
+    - Records how many posts were deleted and how fast.
+    - In partitioned storage, announces the posts that expired since the last run in
+      batches instead (see `announce_expired_batch`) and deletes nothing.
+    - Stops before the next batch once `still_leader` returns False.
 
     Parameters:
-    - None
+    - still_leader (Callable | None): Awaited before each batch; the reaper leader passes
+      its lock check, so an instance that lost the lock stops reaping mid-backlog.
 
     Returns:
     - None
 
-    Behavior:
-    - Runs indefinitely until the application shuts down.
-    - Waits 60 seconds between each execution cycle.
+    Metrics:
+    - reaper.backlog (gauge: expired posts at the start of the run), reaper.posts_per_second (gauge)
+    - reaper.batches, reaper.posts_deleted, reaper.posts_announced, reaper.images_deleted, reaper.errors
+
+    Raises:
+    - Catches and logs any unexpected exceptions to avoid crashing the loop.
     """
-    
-    while True:
-        await delete_expired_posts()
-        await asyncio.sleep(60)  # wait 60 seconds between runs
\ No newline at end of file
+
+    try:
+        now = datetime.utcnow()
+        if POSTS_PARTITIONED:
+            since = await load_announced_until()
+            after = None
+            while True:
+                if still_leader is not None and not await still_leader():
+                    return
+                after = await announce_expired_batch(after, now, since)
+                if after is None:
+                    break
+                await asyncio.sleep(REAPER_BATCH_PAUSE_SECONDS)
+            await save_announced_until(now)
+            return
+
+        metrics.set_gauge("reaper.backlog", await count_expired_posts(now))
+
+        started = time.perf_counter()
+        total = 0
+        while True:
+            if still_leader is not None and not await still_leader():
+                break
+            deleted = await delete_expired_batch(now)
+            total += deleted
+            if deleted < REAPER_BATCH_SIZE:
+                break
+            await asyncio.sleep(REAPER_BATCH_PAUSE_SECONDS)
+
+        if total:
+            elapsed = time.perf_counter() - started
+            metrics.set_gauge("reaper.posts_per_second", round(total / elapsed, 1))
+            logger.info(f"Deleted {total} expired posts in {elapsed:.1f}s")
+
+    except Exception as e:
+        metrics.incr("reaper.errors")
+        logger.error(f"Error deleting expired posts/comments/reactions: {e}")
+
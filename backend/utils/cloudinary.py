@@ -1,28 +1,293 @@
+"""
+Non-blocking media client for Cloudinary.
+
+The synchronous Cloudinary SDK blocks the event loop for the whole HTTP round trip.
+This module talks to Cloudinary's REST API through a pooled `httpx.AsyncClient`
+instead, and splits the work into two layers:
+- A pluggable `MediaBackend` that performs single operations. `CloudinaryBackend`
+  implements it; its base URL comes from CLOUDINARY_API_BASE, so it can point at
+  a local fake media server for testing (see `tests/fake_media.py`).
+- `MediaClient`, which bounds concurrent requests with a semaphore, retries
+  transient failures with jittered exponential backoff, and batches deletes.
+"""
+
+from abc import ABC, abstractmethod
 from fastapi import HTTPException
 import asyncio
-from logger import logger
+import base64
+import hashlib
+import random
+import time
+import uuid
 import os
+from pathlib import Path
+import httpx
 from dotenv import load_dotenv
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-import uuid
-from io import BytesIO 
+from logger import logger
 
 # Load environment variables
 load_dotenv()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True,
-)
-
 # TODO: Change size if needed
 MAX_IMAGE_SIZE_BYTES = 5 * 1024 * 1024 # 5MB
 
+MAX_CONCURRENT_REQUESTS = 8 # In-flight media requests per instance
+MAX_ATTEMPTS = 3 # Attempts per request, including the first
+BACKOFF_BASE_SECONDS = 0.5 # Backoff before retry n is random(0, base * 2**n)
+REQUEST_TIMEOUT_SECONDS = 30
+DELETE_BATCH_SIZE = 100 # Cloudinary's limit of public IDs per delete call
+DELETE_PREFIX_PAGE_SIZE = 1000 # Cloudinary's limit of images deleted per prefix delete call
+DELETE_PREFIX_MAX_PAGES = 100 # Pages per prefix delete before giving up (a retry resumes from the start)
+
+class MediaBackendError(Exception):
+    """
+    Raised by a media backend when a request fails.
+
+    Attributes:
+    - retryable (bool): True for transient failures (network errors, 429, 5xx).
+    - status_code (int | None): HTTP status returned by the backend, if any.
+    """
+
+    def __init__(self, message: str, retryable: bool = True, status_code: int | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+class MediaBackend(ABC):
+    """
+    Interface for media storage backends used by MediaClient.
+
+    Each method performs one operation and raises MediaBackendError on failure.
+    """
+
+    @abstractmethod
+    async def upload(self, image: bytes | Path, public_id: str) -> dict:
+        """Upload image bytes, or stream an image file; return {'url': ..., 'public_id': ...}."""
+
+    @abstractmethod
+    async def destroy(self, public_id: str):
+        """Delete a single image."""
+
+    @abstractmethod
+    async def destroy_many(self, public_ids: list[str]):
+        """Delete up to DELETE_BATCH_SIZE images in one request."""
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str):
+        """Delete every image whose public ID starts with `prefix`."""
+
+    @abstractmethod
+    async def delete_folder(self, folder: str):
+        """Delete an (empty) folder."""
+
+    async def aclose(self):
+        """Release pooled connections."""
+
+class CloudinaryBackend(MediaBackend):
+    """
+    MediaBackend for Cloudinary's Upload and Admin REST APIs over a pooled HTTP client.
+
+    Attributes:
+    - client (httpx.AsyncClient): Connection-pooled client bound to the cloud's API root.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, base_url: str = "https://api.cloudinary.com", transport: httpx.AsyncBaseTransport | None = None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.client = httpx.AsyncClient(
+            base_url=f"{base_url.rstrip('/')}/v1_1/{cloud_name}",
+            transport=transport,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENT_REQUESTS,
+                max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+            ),
+        )
+
+    @classmethod
+    def from_env(cls) -> "CloudinaryBackend":
+        """
+        Build a backend from CLOUDINARY_* environment variables.
+        """
+
+        return cls(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", ""),
+            api_key=os.getenv("CLOUDINARY_API_KEY", ""),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET", ""),
+            base_url=os.getenv("CLOUDINARY_API_BASE", "https://api.cloudinary.com"),
+        )
+
+    def _signed(self, params: dict) -> dict:
+        """
+        Add timestamp, API key and SHA-1 signature to Upload API parameters.
+        """
+
+        params = {**params, "timestamp": str(int(time.time()))}
+        to_sign = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        signature = hashlib.sha1(f"{to_sign}{self.api_secret}".encode()).hexdigest()
+        return {**params, "signature": signature, "api_key": self.api_key}
+
+    async def _request(self, method: str, url: str, **kwargs) -> dict:
+        """
+        Send a request and translate failures into MediaBackendError.
+        """
+
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            raise MediaBackendError(f"{method} {url} failed: {e}")
+
+        if resp.status_code >= 400:
+            retryable = resp.status_code == 429 or resp.status_code >= 500
+            raise MediaBackendError(f"{method} {url} returned {resp.status_code}: {resp.text[:200]}", retryable, resp.status_code)
+        return resp.json()
+
+    async def upload(self, image: bytes | Path, public_id: str) -> dict:
+        params = self._signed({"public_id": public_id, "overwrite": "false", "invalidate": "true"})
+        if isinstance(image, bytes):
+            resp = await self._request("POST", "/image/upload", data=params, files={"file": ("image", image)})
+        else:
+            # httpx streams the file into the multipart body in chunks, so it is never held in memory
+            with open(image, "rb") as f:
+                resp = await self._request("POST", "/image/upload", data=params, files={"file": ("image", f)})
+        url = resp.get("secure_url")
+        if not url:
+            raise MediaBackendError("Cloudinary upload did not return a URL", retryable=False)
+        return {"url": url, "public_id": resp.get("public_id")}
+
+    async def destroy(self, public_id: str):
+        await self._request("POST", "/image/destroy", data=self._signed({"public_id": public_id, "invalidate": "true"}))
+
+    async def destroy_many(self, public_ids: list[str]):
+        await self._request(
+            "DELETE", "/resources/image/upload",
+            params=[("public_ids[]", pid) for pid in public_ids] + [("invalidate", "true")],
+            auth=(self.api_key, self.api_secret),
+        )
+
+    async def delete_prefix(self, prefix: str):
+        # Each call deletes at most DELETE_PREFIX_PAGE_SIZE images and reports the rest as
+        # partial, with a cursor to continue from
+        params = {"prefix": prefix, "invalidate": "true"}
+        for _ in range(DELETE_PREFIX_MAX_PAGES):
+            resp = await self._request("DELETE", "/resources/image/upload", params=params, auth=(self.api_key, self.api_secret))
+            if not resp.get("partial"):
+                return
+            if resp.get("next_cursor"):
+                params["next_cursor"] = resp["next_cursor"]
+        raise MediaBackendError(f"Prefix delete of {prefix} still partial after {DELETE_PREFIX_MAX_PAGES} pages")
+
+    async def delete_folder(self, folder: str):
+        try:
+            await self._request("DELETE", f"/folders/{folder}", auth=(self.api_key, self.api_secret))
+        except MediaBackendError as e:
+            if e.status_code != 404: # Folder never created: nothing to delete
+                raise
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class MediaClient:
+    """
+    Async media client with bounded concurrency, retries and batch deletes.
+
+    Attributes:
+    - backend (MediaBackend): Backend performing the actual requests.
+    - semaphore (asyncio.Semaphore): Caps in-flight requests per instance.
+    """
+
+    def __init__(self, backend: MediaBackend, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+        self.backend = backend
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _call(self, name: str, fn, *args):
+        """
+        Run one backend call under the semaphore, retrying transient failures.
+
+        Backoff before retry n (0-based) is uniform in [0, BACKOFF_BASE_SECONDS * 2**n]
+        ("full jitter"), which spreads retries from many callers apart.
+
+        Raises:
+        - MediaBackendError after MAX_ATTEMPTS, or immediately if not retryable.
+        """
+
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                async with self.semaphore:
+                    return await fn(*args)
+            except MediaBackendError as e:
+                logger.error(f"Media {name} attempt {attempt + 1} failed: {e}")
+                if not e.retryable or attempt == MAX_ATTEMPTS - 1:
+                    raise
+            await asyncio.sleep(random.uniform(0, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    async def upload(self, image: bytes | Path, public_id: str) -> dict:
+        """
+        Upload an image under `public_id`: bytes, or a file path whose contents are streamed
+        (reopened on each attempt, so retries send the whole file again).
+
+        Returns:
+        - dict: {'url': secure URL, 'public_id': stored public ID}
+        """
+
+        return await self._call("upload", self.backend.upload, image, public_id)
+
+    async def destroy(self, public_id: str):
+        """
+        Delete a single image.
+        """
+
+        await self._call("destroy", self.backend.destroy, public_id)
+
+    async def destroy_many(self, public_ids: list[str]):
+        """
+        Delete many images, DELETE_BATCH_SIZE per request, with batches running concurrently.
+
+        Failures are logged per batch and do not stop the other batches.
+        """
+
+        batches = [public_ids[i:i + DELETE_BATCH_SIZE] for i in range(0, len(public_ids), DELETE_BATCH_SIZE)]
+        results = await asyncio.gather(
+            *(self._call("batch delete", self.backend.destroy_many, batch) for batch in batches),
+            return_exceptions=True,
+        )
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to delete {len(batch)} media files: {result}")
+
+    async def delete_folder(self, folder: str):
+        """
+        Delete every image under `folder`, then the folder itself.
+        """
+
+        await self._call("prefix delete", self.backend.delete_prefix, f"{folder}/") # Not user_1 matching user_10
+        await self._call("folder delete", self.backend.delete_folder, folder)
+
+    async def aclose(self):
+        """
+        Close the backend's pooled connections (call on app shutdown).
+        """
+
+        await self.backend.aclose()
+
+
+# Export a single global media client to be used throughout the app
+media_client = MediaClient(CloudinaryBackend.from_env())
+
+def media_folder(user_id, usage: str) -> str:
+    """
+    Return the folder holding a user's images for the given usage ('post' or 'profile').
+    """
+
+    return f"{'post_images' if usage == 'post' else 'user_profiles'}/user_{user_id}"
+
+def new_media_public_id(user_id, usage: str) -> str:
+    """
+    Return a fresh public ID for an image in the user's folder for the given usage.
+    """
+
+    return f"{media_folder(user_id, usage)}/{usage}_{uuid.uuid4().hex[:10]}"
+
 async def upload_photo_to_cloudinary(file_bytes: bytes, user_id: int, usage: str = "post") -> dict:
     """
     Upload an image file (raw bytes) to Cloudinary under a user-specific folder with usage context
@@ -50,38 +315,15 @@ async def upload_photo_to_cloudinary(file_bytes: bytes, user_id: int, usage: str
     if usage not in ["post", "profile"]:
         raise HTTPException(status_code=400, detail="Invalid usage type. Must be 'post' or 'profile'.")
 
-    # Define the folder based on usage
-    folder = f"{'post_images' if usage == 'post' else 'user_profiles'}/user_{user_id}"
+    # Generate a unique public_id inside the user's folder
+    public_id = new_media_public_id(user_id, usage)
 
-    # Generate a unique public_id
-    unique_suffix = uuid.uuid4().hex[:10]
-    public_id = f"{folder}/{usage}_{unique_suffix}"
+    # Upload to Cloudinary (retries are handled by the media client)
+    try:
+        return await media_client.upload(file_bytes, public_id)
+    except MediaBackendError:
+        raise HTTPException(status_code=500, detail="Failed to upload image to Cloudinary")
 
-    # Upload to Cloudinary
-    for attempt in range(3):
-        try:
-            resp = cloudinary.uploader.upload(
-                BytesIO(file_bytes),
-                resource_type="image",
-                folder=folder,
-                public_id=public_id,
-                overwrite=False,  # don't overwrite
-                invalidate=True,
-            )
-            url = resp.get("secure_url")
-            if not url:
-                raise Exception("Cloudinary upload did not return a URL")
-            return {
-                "url": url,
-                "public_id": resp.get("public_id")
-            }
-        except Exception as e:
-            logger.error(f"Cloudinary upload attempt {attempt + 1} failed: {e}")
-            if attempt < 2:
-                await asyncio.sleep(1)
-            else:
-                raise HTTPException(status_code=500, detail="Failed to upload image to Cloudinary")
-            
 async def upload_base64_image_to_cloudinary(base64_str: str) -> str:
     """
     Upload a base64-encoded image string to Cloudinary and return the accessible URL
@@ -96,40 +338,34 @@ async def upload_base64_image_to_cloudinary(base64_str: str) -> str:
     - HTTPException 500 if the upload fails or no URL is returned.
     """
 
-    data_uri = f"data:image/jpeg;base64,{base64_str}"
-
     try:
-        resp = cloudinary.uploader.upload(data_uri)
-        url = resp.get("secure_url")
-        if not url:
-            logger.error("No URL returned from Cloudinary")
-            raise Exception("No URL returned from Cloudinary")
-        return url
+        resp = await media_client.upload(base64.b64decode(base64_str), f"uploads/{uuid.uuid4().hex}")
+        return resp["url"]
 
     except Exception as e:
         logger.exception("Cloudinary upload error")
         raise HTTPException(status_code=500, detail=f"Failed to upload image: {e}")
-    
 
 async def delete_user_cloudinary_folder(user_id: str):
     """
-    Delete all Cloudinary resources under the folder associated with the given user,
-    then delete the folder itself.
+    Delete all Cloudinary resources under the folders associated with the given user,
+    then delete the folders themselves.
 
     Parameters:
-    - user_id (str): The user ID string, used to identify the Cloudinary folder to delete.
+    - user_id (str): The user ID, used to identify the user's post and profile image folders.
 
     Returns:
     - None
 
     Raises:
-    - HTTPException 500 if deletion of resources or folder fails.
+    - HTTPException 500 if deletion of resources or folders fails.
     """
 
     try:
-        folder_path = f"user_photos/{user_id}"
-        cloudinary.api.delete_resources_by_prefix(folder_path)
-        cloudinary.api.delete_folder(folder_path)
+        await asyncio.gather(
+            media_client.delete_folder(media_folder(user_id, "post")),
+            media_client.delete_folder(media_folder(user_id, "profile")),
+        )
     except Exception as e:
         logger.error(f"Failed to delete Cloudinary folder for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to clean up user media")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to clean up user media")
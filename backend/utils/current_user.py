@@ -2,12 +2,19 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from cachetools import TTLCache
+from uuid import uuid4
+import asyncio
 import firebase_admin
 from firebase_admin import credentials, initialize_app
 from models import User
-from database import get_db
+from database import get_db, SessionLocal
 from logger import logger
 from utils.firebase_token import verify_firebase_token
+from utils.metrics import metrics
+from utils.redis_ws_manager import manager, RECONNECT_BASE_SECONDS, RECONNECT_MAX_SECONDS
 import random
 
 # Initialize Firebase Admin SDK once
@@ -17,6 +24,186 @@ if not firebase_admin._apps:
 
 security = HTTPBearer() # HTTP Bearer scheme for token auth
 
+USER_CACHE_TTL_SECONDS = 30 # Max staleness of a cached user if an invalidation message is lost
+USER_CACHE_SIZE = 10_000
+USER_CACHE_CHANNEL = "user_cache_invalidate" # Redis channel carrying "<firebase uid>:<instance id>" messages
+
+# Identity cache: firebase_uid -> detached snapshot of the User row (no relationships)
+_user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+_instance_id = uuid4().hex # Lets an instance skip its own invalidation messages
+_listener_task = None
+
+def _snapshot(user: User) -> User:
+    """
+    Copy a loaded user's column values into a detached instance safe to share across sessions.
+    """
+
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+async def invalidate_cached_user(firebase_uid: str):
+    """
+    Drop a user from the identity cache after their row changes, here and on every other
+    instance (published on USER_CACHE_CHANNEL when Redis is available).
+
+    Parameters:
+    - firebase_uid (str): Firebase UID of the changed user.
+
+    Returns:
+    - None
+
+    Metrics:
+    - user_cache.invalidations, user_cache.publish_failures
+    """
+
+    metrics.incr("user_cache.invalidations")
+    _user_cache.pop(firebase_uid, None)
+
+    if manager.redis_enabled:
+        try:
+            await manager.redis.publish(USER_CACHE_CHANNEL, f"{firebase_uid}:{_instance_id}")
+        except Exception as e:
+            metrics.incr("user_cache.publish_failures")
+            logger.warning(f"User cache invalidation publish failed: {e}")
+
+async def _invalidation_listener():
+    """
+    Drop users named on USER_CACHE_CHANNEL by other instances.
+
+    Clears the whole cache after each resubscription, since messages published while
+    disconnected are lost, and reconnects with jittered exponential backoff.
+    """
+
+    attempt = 0
+    resubscribing = False # Nothing is cached from before the first subscription
+    while True:
+        pubsub = manager.redis.pubsub()
+        try:
+            await pubsub.subscribe(USER_CACHE_CHANNEL)
+            if resubscribing:
+                _user_cache.clear()
+            resubscribing = True
+            attempt = 0
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = message["data"]
+                # Firebase UIDs may contain ":", instance IDs never do
+                firebase_uid, _, sender = (data.decode() if isinstance(data, bytes) else data).rpartition(":")
+                if sender != _instance_id:
+                    _user_cache.pop(firebase_uid, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"User cache invalidation subscription lost: {e}")
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass # Connection already broken
+
+        delay = random.uniform(0, min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * 2 ** attempt))
+        attempt += 1
+        await asyncio.sleep(delay)
+
+def start_user_cache_sync():
+    """
+    Start following identity cache invalidations from other instances (call after `manager.start()`).
+    """
+
+    global _listener_task
+    if _listener_task is None and manager.redis is not None:
+        _listener_task = asyncio.create_task(_invalidation_listener())
+
+async def stop_user_cache_sync():
+    """
+    Stop the invalidation listener (call before `manager.stop()`, which closes the Redis client).
+    """
+
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+async def load_user(db: AsyncSession, firebase_uid: str, *options) -> User | None:
+    """
+    Load a user by Firebase UID through the identity cache.
+
+    Without loader options, a cached user is attached to `db` without any SQL.
+    With options (e.g. selectinload(User.location)), the user is loaded once with
+    those relationships, by primary key when the UID is already cached.
+
+    Parameters:
+    - db (AsyncSession): Session to attach the user to.
+    - firebase_uid (str): Firebase UID from a verified token.
+    - options: SQLAlchemy loader options for relationships the caller needs.
+
+    Returns:
+    - User | None: The user bound to `db`, or None if no user matches.
+    """
+
+    cached = _user_cache.get(firebase_uid)
+    if cached is not None:
+        metrics.incr("user_cache.hits")
+        if not options:
+            return await db.merge(cached, load=False)
+        stmt = select(User).options(*options).where(User.id == cached.id)
+    else:
+        metrics.incr("user_cache.misses")
+        stmt = select(User).options(*options).where(User.firebase_uid == firebase_uid)
+
+    result = await db.execute(stmt)
+    user = result.scalars().first()
+    if user:
+        _user_cache[firebase_uid] = _snapshot(user)
+    return user
+
+async def lookup_user(firebase_uid: str) -> User | None:
+    """
+    Look up a user for a long-lived connection without holding a DB session.
+
+    Answers from the identity cache when possible; otherwise loads the user through a
+    short-lived session that is closed (returning its connection to the pool) before
+    this returns.
+
+    Parameters:
+    - firebase_uid (str): Firebase UID from a verified token.
+
+    Returns:
+    - User | None: A detached snapshot of the user (column values only), or None if no user matches.
+    """
+
+    cached = _user_cache.get(firebase_uid)
+    if cached is not None:
+        metrics.incr("user_cache.hits")
+        return cached
+
+    async with SessionLocal() as session:
+        user = await load_user(session, firebase_uid)
+    return _snapshot(user) if user else None
+
+async def _verified_firebase_uid(credentials: HTTPAuthorizationCredentials) -> str:
+    """
+    Verify the bearer token and return its Firebase UID.
+
+    Raises:
+    - HTTPException 401 Unauthorized: If token verification fails or the token has no UID.
+    """
+
+    token = credentials.credentials
+    decoded_token = await verify_firebase_token(token)
+    firebase_uid = decoded_token.get("uid")
+
+    # Check if the token has a valid Firebase UID
+    if not firebase_uid:
+        logger.error("Token missing UID")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing UID")
+    return firebase_uid
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -24,7 +211,7 @@ async def get_current_user(
 ) -> User:
     """
     Extract and verify the Firebase authentication token from the Authorization header,
-    then retrieve the corresponding User from the database.
+    then retrieve the corresponding User from the identity cache or the database.
 
     Parameters:
     - credentials (HTTPAuthorizationCredentials): Contains the Bearer token from the request header.
@@ -38,18 +225,10 @@ async def get_current_user(
     - HTTPException 404 Not Found: If no user matches the Firebase UID.
     """
 
-    token = credentials.credentials
-    decoded_token = verify_firebase_token(token)
-    firebase_uid = decoded_token.get("uid")
-
-    # Check if the token has a valid Firebase UID
-    if not firebase_uid:
-        logger.error("Token missing UID")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing UID")
+    firebase_uid = await _verified_firebase_uid(credentials)
 
-    # Get the user from the database
-    result = await db.execute(select(User).where(User.firebase_uid == firebase_uid))
-    user = result.scalars().first()
+    # Get the user from the identity cache or the database
+    user = await load_user(db, firebase_uid)
 
     # Check if the user exists
     if not user:
@@ -57,6 +236,33 @@ async def get_current_user(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user # Return the user
 
+def current_user_loader(*options):
+    """
+    Build a `get_current_user` variant that loads the user with the given relationships.
+
+    Lets a route load the user once, with what it needs, instead of resolving the
+    user and then re-selecting it with relationships.
+
+    Parameters:
+    - options: SQLAlchemy loader options (e.g. selectinload(User.location)).
+
+    Returns:
+    - Callable: FastAPI dependency returning the loaded User.
+    """
+
+    async def dependency(
+        credentials: HTTPAuthorizationCredentials = Depends(security),
+        db: AsyncSession = Depends(get_db),
+    ) -> User:
+        firebase_uid = await _verified_firebase_uid(credentials)
+        user = await load_user(db, firebase_uid, *options)
+        if not user:
+            logger.error("User not found")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return user
+
+    return dependency
+
 def blur_and_round(value: float, range: float = 0.02, decimals: int = 1) -> float:
     """
     Adds a small random noise to a floating-point coordinate and rounds it to reduce precision,
@@ -0,0 +1,254 @@
+"""
+Deadline-driven scheduler for reaping expired posts.
+
+Instead of polling on a fixed interval, one backend instance (the leader) keeps a
+min-heap of upcoming `expires_at` deadlines and sleeps exactly until the next one,
+then runs the batched reaper (`utils/clean_up.delete_expired_posts`):
+- Leadership is a Postgres session-level advisory lock held on a dedicated
+  connection. Other instances retry every LEADER_RETRY_SECONDS, so a new leader
+  takes over shortly after the old one stops.
+- The heap is seeded from the database (the next HEAP_MAX_SIZE deadlines) when an
+  instance becomes leader, and again whenever it drains past the seeded horizon.
+  Notified deadlines past the horizon are left to the next seed, and if notifications
+  grow the heap beyond HEAP_MAX_SIZE it is cut back to its earliest HEAP_MAX_SIZE // 2
+  deadlines, with the horizon lowered to match.
+- `create_post` calls `notify_post_expiry`, which issues a `NOTIFY` in the post's
+  transaction; the leader LISTENs on the same connection and pushes the deadline,
+  so posts created on any instance are scheduled as soon as they are committed.
+- Every LEADER_CHECK_SECONDS without a deadline, the leader reseeds and reaps
+  anything overdue, which also verifies its connection is still alive and catches
+  missed notifications.
+- Before each reaper batch and each bucket of partition DDL, the leader checks in
+  `pg_locks` that its connection still holds the lock, and steps down if not.
+- In partitioned storage, the leader also creates and drops post partitions
+  (`utils/post_partitions.maintain_partitions`) when it starts leading and on every
+  check, so partition DDL runs on one instance at a time.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime
+from functools import partial
+from typing import List, Optional
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.pool import NullPool
+from models import UserPost
+from database import create_db_engine, DIRECT_DATABASE_URL
+from logger import logger
+from utils.clean_up import delete_expired_posts
+from utils.post_partitions import maintain_partitions
+from utils.metrics import metrics
+
+LEADER_LOCK_KEY = 7_301_934_211 # Arbitrary app-wide advisory lock ID for the reaper leader
+LEADER_RETRY_SECONDS = 15 # How often non-leaders try to take the lock
+LEADER_CHECK_SECONDS = 300 # Longest the leader sleeps before reseeding and checking its connection
+HEAP_MAX_SIZE = 10_000 # Deadlines loaded per seed, and most kept in the heap
+COALESCE_SECONDS = 1 # Wait this long past a deadline so posts expiring together are reaped together
+
+EXPIRY_CHANNEL = "post_expiry" # NOTIFY channel carrying new posts' expires_at
+
+class LeadershipLost(Exception):
+    """
+    Raised when the leader finds its connection no longer holds the leader lock.
+    """
+
+async def notify_post_expiry(db: AsyncSession, expires_at: datetime):
+    """
+    Tell the reaper leader about a new post's deadline, in the caller's transaction.
+
+    Postgres delivers the notification when the caller commits (and drops it on rollback).
+
+    Parameters:
+    - db (AsyncSession): DB session holding the new post.
+    - expires_at (datetime): The post's expiration time (naive UTC).
+    """
+
+    await db.execute(select(func.pg_notify(EXPIRY_CHANNEL, expires_at.isoformat())))
+
+class ExpiryScheduler:
+    """
+    Reaps expired posts at their deadlines while this instance holds the leader lock.
+
+    Attributes:
+    - deadlines (List[datetime]): Min-heap of upcoming expires_at values.
+    - horizon (datetime | None): Last deadline kept when the seed (or the heap) was
+      truncated at HEAP_MAX_SIZE; later deadlines are loaded by the next seed.
+    - is_leader (bool): True while this instance holds the advisory lock.
+
+    Metrics:
+    - expiry.leader (gauge), expiry.scheduled (gauge), expiry.wakeups, expiry.leader_changes,
+      expiry.heap_trims, expiry.lock_lost
+    """
+
+    def __init__(self):
+        self.deadlines: List[datetime] = []
+        self.horizon: Optional[datetime] = None
+        self.is_leader = False
+        self._wake = asyncio.Event() # Set when an earlier deadline arrives
+
+    def schedule(self, expires_at: datetime):
+        """
+        Add a deadline to the heap (leader only), waking the scheduler if it is the earliest.
+
+        Past HEAP_MAX_SIZE deadlines, the heap is cut back to its earliest HEAP_MAX_SIZE // 2
+        and the horizon lowered to the last one kept, as if the seed had been truncated there.
+
+        Parameters:
+        - expires_at (datetime): Post expiration time (naive UTC).
+        """
+
+        if not self.is_leader or (self.horizon is not None and expires_at > self.horizon):
+            return # Not leading, or beyond the seeded range (the next seed loads it)
+        heapq.heappush(self.deadlines, expires_at)
+        if len(self.deadlines) > HEAP_MAX_SIZE:
+            self.deadlines = heapq.nsmallest(HEAP_MAX_SIZE // 2, self.deadlines) # Sorted, so still a heap
+            self.horizon = self.deadlines[-1]
+            metrics.incr("expiry.heap_trims")
+        metrics.set_gauge("expiry.scheduled", len(self.deadlines))
+        if self.deadlines[0] == expires_at:
+            self._wake.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        # asyncpg listener callback for EXPIRY_CHANNEL notifications
+        try:
+            self.schedule(datetime.fromisoformat(payload))
+        except ValueError:
+            logger.warning(f"Ignoring malformed post expiry notification: {payload!r}")
+
+    async def _seed(self, conn: AsyncConnection):
+        """
+        Load the next HEAP_MAX_SIZE deadlines from the database.
+        """
+
+        result = await conn.execute(
+            select(UserPost.expires_at)
+            .where(UserPost.expires_at > datetime.utcnow())
+            .order_by(UserPost.expires_at)
+            .limit(HEAP_MAX_SIZE)
+        )
+        deadlines = list(result.scalars().all()) # Already sorted, so already a heap
+        await conn.commit() # Don't sit idle in a transaction
+        self.deadlines = deadlines
+        self.horizon = deadlines[-1] if len(deadlines) == HEAP_MAX_SIZE else None
+        metrics.set_gauge("expiry.scheduled", len(self.deadlines))
+
+    async def _still_leader(self, conn: AsyncConnection) -> bool:
+        """
+        Check in `pg_locks` that the leader connection still holds the leader lock.
+
+        A bigint advisory lock is listed with its high and low 32 bits in classid and
+        objid (objsubid 1). A failing connection counts as a lost lock.
+
+        Returns:
+        - bool: True if the lock is still held; otherwise is_leader is cleared.
+        """
+
+        try:
+            held = (await conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid() "
+                "AND granted AND objsubid = 1 AND (classid::bigint << 32) + objid::bigint = :key)"
+            ), {"key": LEADER_LOCK_KEY})).scalar()
+            await conn.commit()
+        except Exception as e:
+            logger.warning(f"Reaper leader lock check failed: {e}")
+            held = False
+        if not held and self.is_leader:
+            self.is_leader = False
+            metrics.incr("expiry.lock_lost")
+        return held
+
+    async def _reap(self, conn: AsyncConnection, maintain: bool = False):
+        """
+        Run the reaper (and partition maintenance if `maintain`), checking the lock before
+        each batch; raise LeadershipLost if it was lost.
+        """
+
+        still_leader = partial(self._still_leader, conn)
+        await delete_expired_posts(still_leader)
+        if maintain and self.is_leader:
+            await maintain_partitions(still_leader)
+        if not self.is_leader:
+            raise LeadershipLost("The reaper leader lock is no longer held")
+
+    async def _lead(self, conn: AsyncConnection):
+        """
+        Sleep until each deadline and reap, until cancelled, the connection fails, or the lock is lost.
+        """
+
+        loop = asyncio.get_running_loop()
+        await self._seed(conn)
+        await self._reap(conn, maintain=True) # Posts that expired while there was no leader
+        last_check = loop.time()
+
+        while True:
+            now = datetime.utcnow()
+            if self.deadlines and self.deadlines[0] <= now:
+                while self.deadlines and self.deadlines[0] <= now:
+                    heapq.heappop(self.deadlines)
+                metrics.incr("expiry.wakeups")
+                await self._reap(conn)
+                if not self.deadlines and self.horizon is not None:
+                    await self._seed(conn) # Drained the seeded range
+                metrics.set_gauge("expiry.scheduled", len(self.deadlines))
+                continue
+
+            delay = LEADER_CHECK_SECONDS - (loop.time() - last_check)
+            if self.deadlines:
+                delay = min(delay, (self.deadlines[0] - now).total_seconds() + COALESCE_SECONDS)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+            if loop.time() - last_check >= LEADER_CHECK_SECONDS:
+                await self._seed(conn) # Also fails fast if the connection is gone
+                await self._reap(conn, maintain=True)
+                last_check = loop.time()
+
+    async def run(self):
+        """
+        Compete for the leader lock and reap expired posts while leading (run from the app lifespan).
+
+        Behavior:
+        - Opens a dedicated connection (outside the pool, on HOBBYMATCH_DIRECT_DATABASE_URL
+          since session locks and LISTEN need a server session of their own) and tries
+          `pg_try_advisory_lock`.
+        - While leader, LISTENs for new deadlines and runs `_lead`; closing the connection
+          (shutdown or failure) releases the lock.
+        - Otherwise, or after an error, retries after LEADER_RETRY_SECONDS.
+        """
+
+        engine = create_db_engine(DIRECT_DATABASE_URL, pgbouncer=False, poolclass=NullPool) # Lock lives as long as the connection
+        try:
+            while True:
+                try:
+                    async with engine.connect() as conn:
+                        locked = (await conn.execute(select(func.pg_try_advisory_lock(LEADER_LOCK_KEY)))).scalar()
+                        await conn.commit()
+                        if locked:
+                            raw = await conn.get_raw_connection()
+                            await raw.driver_connection.add_listener(EXPIRY_CHANNEL, self._on_notify)
+                            self.is_leader = True
+                            metrics.set_gauge("expiry.leader", 1)
+                            metrics.incr("expiry.leader_changes")
+                            logger.info("This instance is now the expired-post reaper leader.")
+                            await self._lead(conn)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Expiry scheduler error: {e}")
+                finally:
+                    if self.is_leader:
+                        logger.info("This instance is no longer the expired-post reaper leader.")
+                    self.is_leader = False
+                    self.deadlines, self.horizon = [], None
+                    metrics.set_gauge("expiry.leader", 0)
+                await asyncio.sleep(LEADER_RETRY_SECONDS)
+        finally:
+            await engine.dispose()
+
+
+# Export a single global scheduler to be used throughout the app
+expiry_scheduler = ExpiryScheduler()
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import UserPost, PostComment, User
+from schemas import PostRead, CommentRead
+from utils.post_stats import load_post_stats, reaction_counts_of
+
+async def load_comments(db: AsyncSession, post_ids: Sequence[UUID]) -> Dict[UUID, List[CommentRead]]:
+    """
+    Load comments with author info for many posts in a single query.
+
+    Parameters:
+    - db (AsyncSession): DB session.
+    - post_ids (Sequence[UUID]): Posts to load comments for.
+
+    Returns:
+    - dict: Maps post ID to its comments, oldest first.
+    """
+
+    comments: Dict[UUID, List[CommentRead]] = defaultdict(list)
+    if not post_ids:
+        return comments
+
+    stmt = (
+        select(PostComment, User)
+        .join(User, User.id == PostComment.user_id)
+        .where(PostComment.post_id.in_(post_ids))
+        .order_by(PostComment.post_id, PostComment.created_at.asc())
+    )
+    for comment, comment_user in await db.execute(stmt):
+        comments[comment.post_id].append(CommentRead(
+            id=comment.id,
+            post_id=comment.post_id,
+            user_id=comment.user_id,
+            content=comment.content,
+            created_at=comment.created_at,
+            user_name=comment_user.name,
+            profile_pic_url=comment_user.profile_pic_url,
+        ))
+    return comments
+
+async def build_post_reads(
+    db: AsyncSession,
+    rows: Sequence[Tuple[UserPost, User]],
+    include_comments: bool = True,
+) -> List[PostRead]:
+    """
+    Assemble serialized posts with reactions and comments using a constant number of queries.
+
+    Reaction and comment counts are read from the post_stats counters, and comments
+    for the whole batch with a `post_id IN (...)` query instead of one query per post.
+
+    Parameters:
+    - db (AsyncSession): DB session.
+    - rows (Sequence[Tuple[UserPost, User]]): Posts paired with their authors, already ordered.
+    - include_comments (bool): Attach full comment lists; otherwise only counts are returned.
+
+    Returns:
+    - List[PostRead]: Posts in the same order as `rows`.
+    """
+
+    post_ids = [post.id for post, _ in rows]
+    stats = await load_post_stats(db, post_ids)
+    comments = await load_comments(db, post_ids) if include_comments else {}
+
+    return [
+        PostRead(
+            id=post.id,
+            user_id=user.id,
+            content=post.content,
+            image_url=post.image_url,
+            image_status=post.image_status.value,
+            hobby_id=post.hobby_id,
+            created_at=post.created_at,
+            expires_at=post.expires_at,
+            name=user.name,
+            profile_pic_url=user.profile_pic_url,
+            reaction_counts=reaction_counts_of(stats.get(post.id)),
+            comment_count=stats[post.id].comment_count if post.id in stats else 0,
+            comments=comments.get(post.id, []) if include_comments else None,
+        )
+        for post, user in rows
+    ]
@@ -0,0 +1,296 @@
+"""
+Two-tier response cache for the public feed.
+
+The public feed is identical for every viewer, so serialized feed pages are cached:
+- Tier 1: an in-process LRU with a short TTL, answered without any I/O.
+- Tier 2 (optional): the Redis instance already used by the WebSocket manager,
+  shared by every backend instance.
+
+Writes drop only the pages they change:
+- `invalidate_post()` (comments, reactions, image processing results) drops the pages
+  holding that post. Each tier indexes its pages by post ID, and a page built from data
+  read before such a write is discarded instead of stored (see `set()`).
+- `invalidate_head()` (new posts) drops the first pages: feed pages are keyset pages,
+  newest first, so a new post cannot appear on a page fetched with a cursor.
+- `invalidate()` (expired-post cleanup) drops every page, since removing posts shifts
+  page contents, by clearing the local tier and bumping a generation number in Redis.
+
+Other instances may serve a page already in their local tier for at most
+LOCAL_TTL_SECONDS after a write.
+
+Feed pages may be built on a read replica (see `utils/read_replicas.py`) that has not
+replayed a write yet. With replicas configured, each invalidation is therefore
+repeated once any replica still in use must have caught up, so a page built from
+pre-write data is not served past that.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from cachetools import TTLCache
+from typing import Iterable, NamedTuple, Optional, Tuple
+from uuid import UUID
+from logger import logger
+from utils.metrics import metrics
+from utils.pagination import MAX_PAGE_SIZE
+from utils.redis_ws_manager import manager
+from utils.read_replicas import replica_router, MAX_REPLICA_LAG_SECONDS, REPLICA_CHECK_SECONDS
+
+LOCAL_MAX_PAGES = 256
+LOCAL_TTL_SECONDS = 5
+REDIS_TTL_SECONDS = 60
+WRITE_HISTORY_POSTS = 100_000 # Recently invalidated posts remembered locally to reject stale page builds
+
+REDIS_GENERATION_KEY = "feed_cache:generation" # Bumped by invalidate(): every page
+REDIS_HEAD_GENERATION_KEY = "feed_cache:head_generation" # Bumped by invalidate_head(): first pages
+REDIS_WRITE_SEQ_KEY = "feed_cache:post_writes" # Sequence number of post invalidations
+REDIS_PAGE_PREFIX = "feed_cache:page"
+REDIS_POST_PAGES_PREFIX = "feed_cache:post_pages" # Set of the page keys holding a post
+REDIS_POST_WRITE_PREFIX = "feed_cache:post_write" # Sequence number of a post's latest invalidation
+
+# Invalidation kinds repeated after replica lag
+ALL_PAGES = "all"
+HEAD_PAGES = "head"
+POST_PAGES = "post"
+
+class FeedCacheSlot(NamedTuple):
+    """
+    Where a feed page lives in each tier, and the cache state seen when it was looked up.
+    """
+
+    page_key: str
+    generation: int
+    head_generation: int
+    write_seq: int
+    redis_key: Optional[str]
+    redis_write_seq: int
+
+class FeedCache:
+    """
+    Caches serialized public feed pages in process and, if available, in Redis.
+
+    Attributes:
+    - local (TTLCache): In-process LRU of page key -> JSON bytes.
+    - post_pages (TTLCache): Post ID -> keys of the local pages holding it.
+    - generation (int): Local generation, bumped by `invalidate()`.
+    - head_generation (int): Local first-page generation, bumped by `invalidate_head()`.
+    - write_seq (int): Local sequence number of post invalidations.
+    - post_writes (TTLCache): Post ID -> `write_seq` of its latest invalidation.
+
+    Metrics:
+    - feed_cache.local_hits, feed_cache.redis_hits, feed_cache.misses, feed_cache.stale_builds
+    - feed_cache.invalidations, feed_cache.head_invalidations, feed_cache.post_invalidations
+    """
+
+    def __init__(self):
+        self.local: TTLCache = TTLCache(maxsize=LOCAL_MAX_PAGES, ttl=LOCAL_TTL_SECONDS)
+        self.post_pages: TTLCache = TTLCache(maxsize=LOCAL_MAX_PAGES * MAX_PAGE_SIZE, ttl=LOCAL_TTL_SECONDS)
+        self.generation = 0
+        self.head_generation = 0
+        self.write_seq = 0
+        self.post_writes: TTLCache = TTLCache(maxsize=WRITE_HISTORY_POSTS, ttl=REDIS_TTL_SECONDS)
+        self.repeats = deque() # (due time, kind, post ID) of invalidations to repeat after replica lag
+        self.repeat_task = None
+
+    @property
+    def redis(self):
+        """
+        Return the shared Redis client if Redis broadcasting is enabled, else None.
+        """
+
+        return manager.redis if manager.redis_enabled else None
+
+    async def get(self, cursor: Optional[str], limit: int) -> Tuple[Optional[bytes], FeedCacheSlot]:
+        """
+        Look up a serialized feed page, local tier first.
+
+        Parameters:
+        - cursor (Optional[str]): Page cursor (None for the first page).
+        - limit (int): Page size.
+
+        Returns:
+        - Tuple[bytes | None, FeedCacheSlot]: Cached JSON body (None on a miss) and the
+          slot to pass to `set()` after building the page on a miss.
+        """
+
+        page_key = f"{cursor or 'first'}:{limit}"
+        slot = FeedCacheSlot(page_key, self.generation, self.head_generation, self.write_seq, None, 0)
+        body = self.local.get(page_key)
+        if body is not None:
+            metrics.incr("feed_cache.local_hits")
+            return body, slot
+
+        if self.redis is not None:
+            try:
+                # Pages are namespaced by the shared generations bumped on whole-feed and first-page writes
+                generation, head_generation, write_seq = (
+                    int(value or 0)
+                    for value in await self.redis.mget(REDIS_GENERATION_KEY, REDIS_HEAD_GENERATION_KEY, REDIS_WRITE_SEQ_KEY)
+                )
+                namespace = f"{generation}.{head_generation}" if cursor is None else str(generation)
+                slot = slot._replace(redis_key=f"{REDIS_PAGE_PREFIX}:{namespace}:{page_key}", redis_write_seq=write_seq)
+                body = await self.redis.get(slot.redis_key)
+            except Exception as e:
+                logger.warning(f"Feed cache Redis read failed: {e}")
+                body = None
+            if body is not None:
+                metrics.incr("feed_cache.redis_hits")
+                self._store_local(page_key, body, [item["id"] for item in json.loads(body)["items"]])
+                return body, slot
+
+        metrics.incr("feed_cache.misses")
+        return None, slot
+
+    async def set(self, slot: FeedCacheSlot, body: bytes, post_ids: Iterable[UUID]):
+        """
+        Store a serialized feed page in both tiers, indexed by the posts it holds.
+
+        A page is not kept if a write invalidated the cache, or one of its posts, after
+        the page was looked up: it may have been built from data read before that write.
+
+        Parameters:
+        - slot (FeedCacheSlot): Slot returned by `get()` for this page.
+        - body (bytes): JSON response body.
+        - post_ids (Iterable[UUID]): Posts on the page.
+        """
+
+        post_ids = [str(post_id) for post_id in post_ids]
+        stale = not (slot.generation == self.generation and slot.head_generation == self.head_generation)
+        stale = stale or any(self.post_writes.get(post_id, 0) > slot.write_seq for post_id in post_ids)
+
+        if self.redis is not None and slot.redis_key is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(slot.redis_key, body, ex=REDIS_TTL_SECONDS)
+                for post_id in post_ids:
+                    pipe.sadd(f"{REDIS_POST_PAGES_PREFIX}:{post_id}", slot.redis_key)
+                    pipe.expire(f"{REDIS_POST_PAGES_PREFIX}:{post_id}", REDIS_TTL_SECONDS)
+                if post_ids:
+                    pipe.mget([f"{REDIS_POST_WRITE_PREFIX}:{post_id}" for post_id in post_ids])
+                results = await pipe.execute()
+                # A post invalidated on any instance after the lookup either found this page
+                # in its index (and deleted it) or left a write marker newer than the lookup
+                if post_ids and any(int(seq or 0) > slot.redis_write_seq for seq in results[-1]):
+                    stale = True
+                    await self.redis.delete(slot.redis_key)
+            except Exception as e:
+                logger.warning(f"Feed cache Redis write failed: {e}")
+
+        if stale:
+            metrics.incr("feed_cache.stale_builds")
+            return
+        self._store_local(slot.page_key, body, post_ids)
+
+    def _store_local(self, page_key: str, body: bytes, post_ids: Iterable[str]):
+        self.local[page_key] = body
+        for post_id in post_ids:
+            self.post_pages[post_id] = self.post_pages.get(post_id, frozenset()) | {page_key}
+
+    async def invalidate_post(self, post_id: UUID):
+        """
+        Drop the cached pages holding a post after a write that changed only that post
+        (a comment, a reaction, or its image becoming ready or failing).
+
+        Parameters:
+        - post_id (UUID): The changed post.
+        """
+
+        metrics.incr("feed_cache.post_invalidations")
+        self._repeat_after_lag(POST_PAGES, post_id)
+        await self._invalidate_post(post_id)
+
+    async def invalidate_head(self):
+        """
+        Drop the cached first pages after a new post, which can only appear on them.
+        """
+
+        metrics.incr("feed_cache.head_invalidations")
+        self._repeat_after_lag(HEAD_PAGES)
+        await self._invalidate_head()
+
+    async def invalidate(self):
+        """
+        Drop all cached feed pages after a write that changes which posts the feed holds
+        beyond the first pages (expired posts).
+
+        Clears the local tier and bumps the shared generation so pages stored under
+        the previous generation are never read again (they expire via their TTL).
+        """
+
+        metrics.incr("feed_cache.invalidations")
+        self._repeat_after_lag(ALL_PAGES)
+        await self._invalidate()
+
+    def _repeat_after_lag(self, kind: str, post_id: Optional[UUID] = None):
+        if not replica_router.enabled:
+            return
+        due = time.monotonic() + MAX_REPLICA_LAG_SECONDS + REPLICA_CHECK_SECONDS # Lag can grow between checks
+        self.repeats.append((due, kind, post_id))
+        if self.repeat_task is None or self.repeat_task.done():
+            self.repeat_task = asyncio.create_task(self._run_repeats())
+
+    async def _run_repeats(self):
+        """
+        Repeat invalidations as they fall due; the queue is in due order since the delay is fixed.
+        """
+
+        while self.repeats:
+            await asyncio.sleep(max(0.0, self.repeats[0][0] - time.monotonic()))
+            due = []
+            while self.repeats and self.repeats[0][0] <= time.monotonic():
+                due.append(self.repeats.popleft())
+            kinds = {kind for _, kind, _ in due}
+            if ALL_PAGES in kinds:
+                await self._invalidate() # Covers every other repeat due now
+                continue
+            if HEAD_PAGES in kinds:
+                await self._invalidate_head()
+            for post_id in {post_id for _, kind, post_id in due if kind == POST_PAGES}:
+                await self._invalidate_post(post_id)
+
+    async def _invalidate_post(self, post_id: UUID):
+        post_id = str(post_id)
+        self.write_seq += 1
+        self.post_writes[post_id] = self.write_seq
+        for page_key in self.post_pages.pop(post_id, ()):
+            self.local.pop(page_key, None)
+
+        if self.redis is not None:
+            try:
+                # The write marker goes first, so a page build that misses this index read still sees it
+                write_seq = await self.redis.incr(REDIS_WRITE_SEQ_KEY)
+                pages_key = f"{REDIS_POST_PAGES_PREFIX}:{post_id}"
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(f"{REDIS_POST_WRITE_PREFIX}:{post_id}", write_seq, ex=REDIS_TTL_SECONDS)
+                pipe.smembers(pages_key)
+                _, page_keys = await pipe.execute()
+                await self.redis.delete(pages_key, *page_keys)
+            except Exception as e:
+                logger.warning(f"Feed cache Redis invalidation failed: {e}")
+
+    async def _invalidate_head(self):
+        self.head_generation += 1
+        for page_key in [key for key in self.local.keys() if key.startswith("first:")]:
+            self.local.pop(page_key, None)
+
+        if self.redis is not None:
+            try:
+                await self.redis.incr(REDIS_HEAD_GENERATION_KEY)
+            except Exception as e:
+                logger.warning(f"Feed cache Redis invalidation failed: {e}")
+
+    async def _invalidate(self):
+        self.generation += 1
+        self.local.clear()
+        self.post_pages.clear()
+
+        if self.redis is not None:
+            try:
+                await self.redis.incr(REDIS_GENERATION_KEY)
+            except Exception as e:
+                logger.warning(f"Feed cache Redis invalidation failed: {e}")
+
+
+# Export a single global instance to be used throughout the app
+feed_cache = FeedCache()
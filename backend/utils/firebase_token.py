@@ -1,8 +1,263 @@
+"""
+Firebase ID token verification with locally cached signing keys.
+
+Firebase ID tokens are RS256 JWTs signed with Google's rotating `securetoken` keys.
+Instead of calling the blocking `firebase_admin.auth.verify_id_token` on the event
+loop for every request, this module:
+- Fetches Google's public certificates once and refreshes them in the background
+  before their Cache-Control max-age runs out. A token with an unknown key ID triggers
+  an immediate refresh at most once per FORCED_REFRESH_INTERVAL_SECONDS; within that
+  window such tokens are rejected without contacting Google, so a flood of forged key
+  IDs cannot turn into a flood of certificate downloads.
+- Verifies signature, audience, issuer and expiry locally with PyJWT, on a worker
+  thread so the event loop is never blocked.
+- Keeps a bounded LRU of SHA-256(token) -> decoded claims, each entry expiring at
+  the token's own `exp`, so repeat requests with the same token skip verification.
+
+If no Firebase project ID can be determined, verification falls back to the Admin
+SDK, still run on a worker thread.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+import httpx
+import jwt
+import firebase_admin
+from cachetools import TLRUCache
+from cryptography.x509 import load_pem_x509_certificate
 from fastapi import HTTPException
 from firebase_admin import auth
 from logger import logger
+from utils.metrics import metrics
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
 
-def verify_firebase_token(id_token: str):
+CLAIMS_CACHE_SIZE = 10_000 # Max verified tokens kept in memory
+DEFAULT_KEYS_MAX_AGE_SECONDS = 60 * 60 # Used when Google sends no max-age
+KEYS_REFRESH_MARGIN_SECONDS = 5 * 60 # Refresh this long before keys expire
+KEYS_RETRY_SECONDS = 30 # Retry delay after a failed refresh
+CLOCK_SKEW_SECONDS = 10 # Allowed clock difference for exp/iat checks
+FORCED_REFRESH_INTERVAL_SECONDS = 60 # Minimum time between refreshes triggered by unknown key IDs
+
+class UnknownSigningKey(Exception):
+    """Raised when a token's `kid` is not among the cached public keys."""
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens against locally cached Google public keys.
+
+    Attributes:
+    - project_id (str | None): Firebase project ID (token audience).
+    - public_keys (dict): Key ID -> RSA public key.
+    - keys_expire_at (float): Unix time after which the keys must be refreshed.
+    - claims_cache (TLRUCache): SHA-256(token) -> decoded claims, expiring at the token's `exp`.
+    - refresh_task (asyncio.Task | None): Background key refresh task.
+    - forced_refresh (asyncio.Task | None): Latest refresh triggered by an unknown key ID.
+    - forced_refresh_at (float): Monotonic time that refresh started.
+
+    Metrics:
+    - firebase_token.forced_refreshes, firebase_token.unknown_key_rejections
+    """
+
+    def __init__(self, certs_url: str = GOOGLE_CERTS_URL, transport: httpx.AsyncBaseTransport | None = None):
+        self.certs_url = certs_url
+        self.transport = transport # Custom HTTP transport for the certificate download (tests)
+        self.project_id = os.getenv("FIREBASE_PROJECT_ID")
+        self.public_keys = {}
+        self.keys_expire_at = 0.0
+        self.claims_cache = TLRUCache(
+            maxsize=CLAIMS_CACHE_SIZE,
+            ttu=lambda _key, claims, _now: claims["exp"],
+            timer=time.time,
+        )
+        self.refresh_task = None
+        self.forced_refresh = None
+        self.forced_refresh_at = float("-inf")
+        self._refresh_lock = asyncio.Lock()
+
+    def _resolve_project_id(self) -> str | None:
+        """
+        Return the configured project ID, falling back to the initialized Firebase app.
+        """
+
+        if not self.project_id:
+            try:
+                self.project_id = firebase_admin.get_app().project_id
+            except ValueError:
+                pass # No Firebase app initialized
+        return self.project_id
+
+    async def refresh_keys(self, force: bool = True):
+        """
+        Download Google's current signing certificates and cache their public keys.
+
+        Parameters:
+        - force (bool): Refresh even if the cached keys are still valid.
+
+        Returns:
+        - None
+
+        Raises:
+        - httpx.HTTPError if the certificates cannot be fetched.
+        """
+
+        async with self._refresh_lock:
+            # Another request may have refreshed the keys while we waited for the lock
+            if not force and self.public_keys and time.time() < self.keys_expire_at:
+                return
+
+            async with httpx.AsyncClient(timeout=10, transport=self.transport) as client:
+                resp = await client.get(self.certs_url)
+                resp.raise_for_status()
+
+            self.public_keys = {
+                kid: load_pem_x509_certificate(pem.encode()).public_key()
+                for kid, pem in resp.json().items()
+            }
+            match = re.search(r"max-age=(\d+)", resp.headers.get("cache-control", ""))
+            max_age = int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE_SECONDS
+            self.keys_expire_at = time.time() + max_age
+            logger.info(f"Firebase signing keys refreshed ({len(self.public_keys)} keys, max-age {max_age}s).")
+
+    async def _refresh_loop(self):
+        """
+        Background task that refreshes the keys shortly before they expire.
+        """
+
+        while True:
+            try:
+                await self.refresh_keys()
+                delay = max(self.keys_expire_at - time.time() - KEYS_REFRESH_MARGIN_SECONDS, KEYS_RETRY_SECONDS)
+            except Exception as e:
+                logger.warning(f"Firebase signing key refresh failed: {e}")
+                delay = KEYS_RETRY_SECONDS
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """
+        Start the background key refresh task (call from the app lifespan).
+        """
+
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """
+        Cancel the background key refresh task.
+        """
+
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    def _decode(self, id_token: str) -> dict:
+        """
+        Verify a token's signature and standard claims (blocking; runs on a worker thread).
+
+        Raises:
+        - UnknownSigningKey if the token's key ID is not cached.
+        - jwt.PyJWTError or ValueError if the token is invalid.
+        """
+
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        key = self.public_keys.get(kid)
+        if key is None:
+            raise UnknownSigningKey(kid)
+
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=self.project_id,
+            issuer=f"https://securetoken.google.com/{self.project_id}",
+            leeway=CLOCK_SKEW_SECONDS,
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        if not claims["sub"] or len(claims["sub"]) > 128:
+            raise ValueError("Invalid subject claim")
+        if claims.get("auth_time", 0) > time.time() + CLOCK_SKEW_SECONDS:
+            raise ValueError("auth_time is in the future")
+
+        claims["uid"] = claims["sub"] # Match the Admin SDK's decoded token shape
+        return claims
+
+    async def _refresh_for_unknown_key(self) -> bool:
+        """
+        Refresh the keys for a token with an unknown key ID, rate limited.
+
+        Tokens arriving while such a refresh is in flight wait for it. Once it is done,
+        no other one starts for FORCED_REFRESH_INTERVAL_SECONDS.
+
+        Returns:
+        - bool: True if the keys were refreshed (retry the token), False if rate limited (reject it).
+
+        Raises:
+        - httpx.HTTPError if the certificates cannot be fetched.
+        """
+
+        if self.forced_refresh is None or self.forced_refresh.done():
+            if time.monotonic() - self.forced_refresh_at < FORCED_REFRESH_INTERVAL_SECONDS:
+                return False
+            metrics.incr("firebase_token.forced_refreshes")
+            self.forced_refresh_at = time.monotonic()
+            self.forced_refresh = asyncio.create_task(self.refresh_keys())
+        # Shielded so a cancelled request does not cancel the refresh other requests wait for
+        await asyncio.shield(self.forced_refresh)
+        return True
+
+    async def verify(self, id_token: str) -> dict:
+        """
+        Verify a Firebase ID token and return its decoded claims.
+
+        Parameters:
+        - id_token (str): The Firebase ID token string.
+
+        Returns:
+        - dict: Decoded claims including `uid`.
+
+        Raises:
+        - UnknownSigningKey if the key ID is unknown even after a refresh, or a refresh is rate limited.
+        - Exception if the token is invalid or expired.
+        """
+
+        token_hash = hashlib.sha256(id_token.encode()).hexdigest()
+        cached = self.claims_cache.get(token_hash)
+        if cached is not None:
+            return cached
+
+        # No project ID to check the audience against: defer to the Admin SDK
+        if not self._resolve_project_id():
+            return await asyncio.to_thread(auth.verify_id_token, id_token)
+
+        if not self.public_keys or time.time() >= self.keys_expire_at:
+            await self.refresh_keys(force=False)
+
+        keys = self.public_keys
+        try:
+            claims = await asyncio.to_thread(self._decode, id_token)
+        except UnknownSigningKey:
+            # Google may have rotated keys since the last refresh. If another request's
+            # refresh replaced the keys while this token was decoded, retry with those.
+            if self.public_keys is keys and not await self._refresh_for_unknown_key():
+                metrics.incr("firebase_token.unknown_key_rejections")
+                raise
+            claims = await asyncio.to_thread(self._decode, id_token)
+
+        self.claims_cache[token_hash] = claims
+        return claims
+
+
+# Export a single global verifier to be used throughout the app
+token_verifier = FirebaseTokenVerifier()
+
+async def verify_firebase_token(id_token: str):
     """
     Verify a Firebase ID token and return the decoded token payload.
 
@@ -17,20 +272,20 @@ def verify_firebase_token(id_token: str):
     - HTTPException 401 Unauthorized: If the user's email is not verified.
 
     Behavior:
-    - Uses Firebase Admin SDK's `verify_id_token` method to verify token authenticity.
+    - Uses the shared `token_verifier`, which checks the signature locally against cached keys.
     - Logs errors for invalid tokens or unverified emails.
     """
-    
+
     try:
-        decoded = auth.verify_id_token(id_token)
-
-        # Ensure the user's email has been verified
-        if not decoded.get("email_verified", False):
-            logger.error("Email not verified")
-            raise HTTPException(status_code=401, detail="Email not verified")
-        return decoded # Return the decoded token payload
-    
+        decoded = await token_verifier.verify(id_token)
+
     # Handle token verification errors
     except Exception as e:
         logger.error(f"Token verification failed: {e}")
         raise HTTPException(status_code=401, detail="Invalid Firebase token")
+
+    # Ensure the user's email has been verified
+    if not decoded.get("email_verified", False):
+        logger.error("Email not verified")
+        raise HTTPException(status_code=401, detail="Email not verified")
+    return decoded # Return the decoded token payload
@@ -0,0 +1,380 @@
+"""
+Background media pipeline for post images.
+
+`create_post` no longer waits for Cloudinary: it spools the upload to a file in
+MEDIA_SPOOL_DIR (`utils/uploads.py`), queues a row referencing it in the `media_jobs`
+table (in the same transaction as the post, whose image is marked `pending_image`)
+and returns immediately. Worker tasks started from the app lifespan then:
+- Claim due jobs with `FOR UPDATE SKIP LOCKED`, so several workers and backend
+  instances can share the queue without double-processing.
+- Upload the image, set the post's `image_url`/`image_public_id`, delete the job,
+  and broadcast an `image_ready` WebSocket event.
+- On a transient failure (network error, 429, 5xx), reschedule the job with
+  exponential backoff. After MAX_JOB_ATTEMPTS, or at once when Cloudinary rejects
+  the image (other 4xx), the job is kept with status `dead` (the dead-letter queue),
+  its post is marked `failed`, and an `image_failed` event is broadcast.
+
+Spooled images are removed once the job completes or Cloudinary rejects the image.
+Images of jobs dead-lettered after their retries are kept for DEAD_JOB_RETENTION_SECONDS,
+so `requeue_dead_media_jobs()` can retry them after an outage; the workers then clear
+them, along with spooled files no job references (e.g. jobs deleted with their post).
+
+Jobs claimed by a worker that died mid-upload become claimable again after
+JOB_LOCK_TIMEOUT_SECONDS.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+from uuid import UUID
+from sqlalchemy import select, update, delete, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import MediaJob, MediaJobStatus, UserPost, ImageStatus
+from database import SessionLocal
+from logger import logger
+from utils.cloudinary import MediaBackendError, media_client, new_media_public_id
+from utils.feed_cache import feed_cache
+from utils.metrics import metrics
+from utils.redis_ws_manager import manager, FEED_TOPIC, post_topic, user_topic
+from utils.uploads import MEDIA_SPOOL_DIR, spool_path
+
+MEDIA_WORKERS = 2 # Worker tasks per instance
+MAX_JOB_ATTEMPTS = 5 # Attempts before a job is dead-lettered
+JOB_RETRY_BASE_SECONDS = 5 # Retry n waits base * 2**(n-1) seconds
+JOB_LOCK_TIMEOUT_SECONDS = 5 * 60 # Reclaim jobs held this long by a crashed worker
+POLL_INTERVAL_SECONDS = 5 # Idle poll interval (enqueues wake workers sooner)
+DEAD_JOB_RETENTION_SECONDS = 24 * 60 * 60 # Keep images of dead-lettered jobs this long for requeueing
+SPOOL_SWEEP_INTERVAL_SECONDS = 60 * 60 # How often idle workers clear images no job needs
+
+# Set after a job is committed on this instance so idle workers pick it up immediately
+_job_available = asyncio.Event()
+
+_next_spool_sweep = 0.0 # Monotonic time of this instance's next spool sweep
+
+def enqueue_media_job(db: AsyncSession, post: UserPost, image_file: str):
+    """
+    Queue an image upload for a post, in the caller's transaction.
+
+    Marks the post `pending_image`; the job becomes visible to workers when the
+    caller commits. Call `notify_media_workers()` after committing.
+
+    Parameters:
+    - db (AsyncSession): DB session holding the new post.
+    - post (UserPost): Post the image belongs to.
+    - image_file (str): Spooled image file, from `utils.uploads.spool_image_upload()`.
+    """
+
+    post.image_status = ImageStatus.pending_image
+    db.add(MediaJob(post_id=post.id, user_id=post.user_id, image_file=image_file))
+
+def notify_media_workers():
+    """
+    Wake idle media workers on this instance.
+    """
+
+    _job_available.set()
+
+async def claim_media_job() -> MediaJob | None:
+    """
+    Claim the next due job, marking it `processing` and counting the attempt.
+
+    Returns:
+    - MediaJob | None: The claimed job (detached), or None if nothing is due.
+    """
+
+    now = datetime.utcnow()
+    next_job = (
+        select(MediaJob.id)
+        .where(or_(
+            and_(MediaJob.status == MediaJobStatus.pending, MediaJob.run_at <= now),
+            and_(
+                MediaJob.status == MediaJobStatus.processing,
+                MediaJob.locked_at <= now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS),
+            ),
+        ))
+        .order_by(MediaJob.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(MediaJob)
+            .where(MediaJob.id == next_job)
+            .values(status=MediaJobStatus.processing, attempts=MediaJob.attempts + 1, locked_at=now)
+            .returning(MediaJob)
+        )
+        job = result.scalars().first()
+        await session.commit()
+        return job
+
+async def complete_media_job(job: MediaJob, upload_result: dict):
+    """
+    Attach an uploaded image to its post, delete the job, and notify clients.
+
+    If the post was deleted or expired while the job ran, the uploaded image is removed again
+    (in partitioned storage an expired post's row stays until its bucket is dropped, but the
+    reaper has already released its images, so nothing would delete this one later).
+    """
+
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(UserPost)
+            .where(UserPost.id == job.post_id, UserPost.expires_at > datetime.utcnow())
+            .values(
+                image_url=upload_result["url"],
+                image_public_id=upload_result["public_id"],
+                image_status=ImageStatus.ready,
+            )
+            .returning(UserPost.id)
+        )
+        post_exists = result.first() is not None
+        await session.execute(delete(MediaJob).where(MediaJob.id == job.id))
+        await session.commit()
+
+    metrics.incr("media_jobs.completed")
+    await remove_spooled_image(job.image_file)
+    if not post_exists:
+        await media_client.destroy(upload_result["public_id"])
+        return
+
+    await feed_cache.invalidate_post(job.post_id)
+    await manager.broadcast({
+        "type": "image_ready",
+        "data": {
+            "post_id": str(job.post_id),
+            "image_url": upload_result["url"],
+        }
+    }, topics=[FEED_TOPIC, post_topic(job.post_id), user_topic(job.user_id)])
+
+async def fail_media_job(job: MediaJob, error: Exception, retryable: bool = True):
+    """
+    Reschedule a failed job with backoff, or dead-letter it once out of attempts.
+
+    Parameters:
+    - job (MediaJob): The failed job.
+    - error (Exception): Failure recorded as the job's last error.
+    - retryable (bool): False to dead-letter the job without further attempts
+      (the request itself was rejected, so retrying cannot succeed).
+    """
+
+    dead = not retryable or job.attempts >= MAX_JOB_ATTEMPTS
+    async with SessionLocal() as session:
+        if dead:
+            values = dict(status=MediaJobStatus.dead, last_error=str(error), locked_at=None, dead_at=datetime.utcnow())
+            if not retryable:
+                values.update(image_file=None, image_data=None) # Requeueing cannot help a rejected image
+            await session.execute(update(MediaJob).where(MediaJob.id == job.id).values(**values))
+            await session.execute(
+                update(UserPost).where(UserPost.id == job.post_id).values(image_status=ImageStatus.failed)
+            )
+        else:
+            delay = JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            await session.execute(
+                update(MediaJob)
+                .where(MediaJob.id == job.id)
+                .values(
+                    status=MediaJobStatus.pending,
+                    last_error=str(error),
+                    locked_at=None,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay),
+                )
+            )
+        await session.commit()
+
+    if dead and not retryable:
+        await remove_spooled_image(job.image_file)
+    if not dead:
+        metrics.incr("media_jobs.retried")
+        logger.warning(f"Media job {job.id} attempt {job.attempts} failed, retrying: {error}")
+        return
+
+    metrics.incr("media_jobs.dead")
+    logger.error(f"Media job {job.id} dead-lettered after {job.attempts} attempts: {error}")
+    await feed_cache.invalidate_post(job.post_id)
+    await manager.broadcast({
+        "type": "image_failed",
+        "data": {
+            "post_id": str(job.post_id),
+        }
+    }, topics=[FEED_TOPIC, post_topic(job.post_id), user_topic(job.user_id)])
+
+async def process_media_job(job: MediaJob):
+    """
+    Upload a claimed job's image and record the outcome.
+    """
+
+    try:
+        image = job_image(job)
+    except FileNotFoundError as e:
+        await fail_media_job(job, e, retryable=False)
+        return
+
+    try:
+        upload_result = await media_client.upload(image, new_media_public_id(job.user_id, "post"))
+    except MediaBackendError as e:
+        await fail_media_job(job, e, retryable=e.retryable)
+        return
+    except Exception as e:
+        await fail_media_job(job, e)
+        return
+    await complete_media_job(job, upload_result)
+
+def job_image(job: MediaJob) -> bytes | Path:
+    """
+    Return a job's image for upload: the path of its spooled file (streamed by the media
+    backend, never read into memory here), or the legacy blob of jobs queued before spooling.
+
+    Raises:
+    - FileNotFoundError if the spooled file is gone.
+    """
+
+    if job.image_file is None:
+        if job.image_data is None:
+            raise FileNotFoundError(f"Media job {job.id} has no image")
+        return job.image_data
+    path = Path(spool_path(job.image_file))
+    if not path.is_file():
+        raise FileNotFoundError(f"Spooled image {job.image_file} of media job {job.id} is gone")
+    return path
+
+async def remove_spooled_image(image_file: str | None):
+    """
+    Delete a spooled image file, if any (already missing is fine).
+    """
+
+    if image_file is None:
+        return
+    try:
+        await asyncio.to_thread(os.remove, spool_path(image_file))
+    except FileNotFoundError:
+        pass
+
+def _old_spool_files(cutoff: float) -> List[str]:
+    try:
+        entries = list(os.scandir(MEDIA_SPOOL_DIR))
+    except FileNotFoundError:
+        return []
+    return [entry.name for entry in entries if entry.is_file() and entry.stat().st_mtime < cutoff]
+
+async def sweep_media_spool() -> int:
+    """
+    Clear images no job needs any more.
+
+    Behavior:
+    - Drops the image reference (and legacy blob) of jobs dead-lettered more than
+      DEAD_JOB_RETENTION_SECONDS ago; the job rows stay as the dead-letter record.
+    - Deletes spooled files older than DEAD_JOB_RETENTION_SECONDS that no job
+      references: those cleared above, jobs deleted with their post, and uploads
+      whose post was never committed.
+
+    Returns:
+    - int: Number of files deleted.
+
+    Metrics:
+    - media_jobs.spool_files_removed
+    """
+
+    async with SessionLocal() as session:
+        await session.execute(
+            update(MediaJob)
+            .where(
+                MediaJob.status == MediaJobStatus.dead,
+                MediaJob.dead_at <= datetime.utcnow() - timedelta(seconds=DEAD_JOB_RETENTION_SECONDS),
+                or_(MediaJob.image_file.isnot(None), MediaJob.image_data.isnot(None)),
+            )
+            .values(image_file=None, image_data=None)
+        )
+        await session.commit()
+
+        old_files = await asyncio.to_thread(_old_spool_files, time.time() - DEAD_JOB_RETENTION_SECONDS)
+        if not old_files:
+            return 0
+        result = await session.execute(select(MediaJob.image_file).where(MediaJob.image_file.in_(old_files)))
+        referenced = set(result.scalars())
+
+    unreferenced = [name for name in old_files if name not in referenced]
+    for name in unreferenced:
+        await remove_spooled_image(name)
+    metrics.incr("media_jobs.spool_files_removed", len(unreferenced))
+    return len(unreferenced)
+
+async def media_worker_loop():
+    """
+    Continuously claim and process media jobs.
+
+    Behavior:
+    - Processes jobs back to back while any are due.
+    - When the queue is empty, sweeps the spool at most every SPOOL_SWEEP_INTERVAL_SECONDS
+      (one worker per instance), then waits for `notify_media_workers()` or POLL_INTERVAL_SECONDS.
+    - Errors are logged and the loop keeps going.
+    """
+
+    global _next_spool_sweep
+    while True:
+        try:
+            job = await claim_media_job()
+            if job is not None:
+                await process_media_job(job)
+                continue
+            if time.monotonic() >= _next_spool_sweep:
+                _next_spool_sweep = time.monotonic() + SPOOL_SWEEP_INTERVAL_SECONDS
+                await sweep_media_spool()
+        except Exception as e:
+            logger.error(f"Media worker error: {e}")
+
+        try:
+            await asyncio.wait_for(_job_available.wait(), POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _job_available.clear()
+
+def start_media_workers() -> List[asyncio.Task]:
+    """
+    Start MEDIA_WORKERS worker tasks (call from the app lifespan).
+
+    Returns:
+    - List[asyncio.Task]: The worker tasks, to be cancelled on shutdown.
+    """
+
+    return [asyncio.create_task(media_worker_loop()) for _ in range(MEDIA_WORKERS)]
+
+async def requeue_dead_media_jobs(post_ids: List[UUID] | None = None) -> int:
+    """
+    Move dead-lettered jobs back onto the queue, e.g. after fixing a media outage.
+
+    Jobs whose image was cleared (rejected by Cloudinary, or dead for longer than
+    DEAD_JOB_RETENTION_SECONDS) stay dead.
+
+    Parameters:
+    - post_ids (List[UUID] | None): Only requeue jobs for these posts (default: all dead jobs).
+
+    Returns:
+    - int: Number of jobs requeued.
+    """
+
+    condition = and_(
+        MediaJob.status == MediaJobStatus.dead,
+        or_(MediaJob.image_file.isnot(None), MediaJob.image_data.isnot(None)),
+    )
+    if post_ids is not None:
+        condition = and_(condition, MediaJob.post_id.in_(post_ids))
+
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(MediaJob)
+            .where(condition)
+            .values(status=MediaJobStatus.pending, attempts=0, run_at=datetime.utcnow(), dead_at=None)
+            .returning(MediaJob.post_id)
+        )
+        requeued = result.scalars().all()
+        await session.execute(
+            update(UserPost).where(UserPost.id.in_(requeued)).values(image_status=ImageStatus.pending_image)
+        )
+        await session.commit()
+
+    notify_media_workers()
+    return len(requeued)
@@ -0,0 +1,58 @@
+"""
+Minimal in-process metrics registry.
+
+Components record counters (monotonic totals) and gauges (current values) by name,
+and `GET /metrics` returns a snapshot of everything recorded by this instance.
+"""
+
+from collections import defaultdict
+from typing import Dict
+
+class Metrics:
+    """
+    Stores named counters and gauges for the current process.
+
+    Attributes:
+    - counters (Dict[str, int]): Monotonic totals (e.g. cache hits).
+    - gauges (Dict[str, float]): Point-in-time values (e.g. open connections).
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+
+    def incr(self, name: str, amount: int = 1):
+        """
+        Increase a counter.
+
+        Parameters:
+        - name (str): Counter name, dot-separated by component (e.g. "feed_cache.misses").
+        - amount (int): Amount to add (default 1).
+        """
+
+        self.counters[name] += amount
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Set a gauge to its current value.
+
+        Parameters:
+        - name (str): Gauge name.
+        - value (float): Current value.
+        """
+
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of all counters and gauges.
+
+        Returns:
+        - dict: {"counters": {...}, "gauges": {...}}
+        """
+
+        return {"counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+
+# Export a single global registry to be used throughout the app
+metrics = Metrics()
@@ -0,0 +1,333 @@
+"""
+Pure ASGI middleware for cross-cutting response handling.
+
+Unlike Starlette's `BaseHTTPMiddleware`, these wrap the ASGI `send` callable directly:
+no extra task or memory stream per request, and streaming responses pass through.
+
+- `RequestContextMiddleware` gives every HTTP request an ID (for log lines and the
+  `X-Request-ID` header) and times it.
+- `CrossOriginIsolationMiddleware` adds the COOP/COEP headers to every HTTP response.
+- `UploadSizeLimitMiddleware` caps multipart (file upload) request bodies before they
+  are parsed, so an oversized upload is never spooled to disk.
+- `ConditionalCompressionMiddleware` makes GET responses conditional and compressed:
+  - Every 200 response gets a strong ETag: the one the route set (e.g. the catalog
+    version in `utils/catalog.py`) or a hash of the body. A request whose
+    If-None-Match matches is answered with `304 Not Modified` and no body.
+  - Bodies of at least MIN_COMPRESS_BYTES with a compressible content type are
+    compressed with brotli (if the `brotli` package is installed) or gzip, whichever
+    the client prefers in Accept-Encoding. The ETag gets an encoding suffix
+    (`"<hash>-br"`), so each encoding has its own strong validator.
+  - Compressed bodies are kept per (ETag, encoding) in a small LRU, so a cached feed
+    page or catalog is compressed once rather than on every request.
+
+Responses sent in several body chunks (streaming) are passed through untouched.
+`bench_middleware.py` compares this stack with the previous `BaseHTTPMiddleware` one.
+"""
+
+import gzip
+import hashlib
+import re
+import time
+from uuid import uuid4
+from typing import List, Optional, Tuple
+from cachetools import LRUCache
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from fastapi import HTTPException
+from logger import logger, request_id_var
+from utils.metrics import metrics
+from utils.uploads import MAX_UPLOAD_BODY_BYTES
+
+try:
+    import brotli
+    brotli_available = True
+except ImportError:
+    brotli_available = False # Fall back to gzip only
+
+MIN_COMPRESS_BYTES = 1024 # Smaller bodies gain less than the Content-Encoding overhead
+GZIP_LEVEL = 5 # 1 (fastest) .. 9 (smallest)
+BROTLI_QUALITY = 4 # 0 (fastest) .. 11 (smallest); low levels suit dynamic responses
+COMPRESSED_CACHE_ENTRIES = 256 # Compressed bodies kept per (ETag, encoding)
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+SLOW_REQUEST_MS = 1000 # Requests slower than this are logged with their request ID
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$") # Incoming X-Request-ID values kept as-is
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header, or None for identity.
+
+    Codings with q=0 are refused; among accepted ones the highest q wins, brotli on ties.
+    """
+
+    if not accept_encoding:
+        return None
+    supported = ("br", "gzip") if brotli_available else ("gzip",)
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Return True if an If-None-Match header matches `etag`, ignoring weak prefixes and
+    the encoding suffix this middleware appends.
+    """
+
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/").strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == "*" or tag == opaque or tag in (f"{opaque}-br", f"{opaque}-gzip"):
+            return True
+    return False
+
+class RequestContextMiddleware:
+    """
+    Assign each HTTP request an ID and measure how long it takes.
+
+    Behavior:
+    - Reuses a well-formed incoming X-Request-ID (e.g. from a proxy), else generates one.
+    - Exposes the ID as `request.state.request_id` and to log lines (`logger.request_id_var`).
+    - Adds `X-Request-ID` and `Server-Timing: app;dur=<ms until headers>` to the response.
+
+    Metrics:
+    - http.requests, http.request_ms (total), http.server_errors, http.slow_requests
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get("x-request-id")
+        request_id = incoming if incoming and REQUEST_ID_PATTERN.match(incoming) else uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500 # Until the app starts a response
+
+        async def send_with_context(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers.append("Server-Timing", f"app;dur={(time.perf_counter() - started) * 1000:.1f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.incr("http.requests")
+            metrics.incr("http.request_ms", round(elapsed_ms))
+            if status_code >= 500:
+                metrics.incr("http.server_errors")
+            if elapsed_ms >= SLOW_REQUEST_MS:
+                metrics.incr("http.slow_requests")
+                logger.warning(f"Slow request: {scope['method']} {scope['path']} -> {status_code} in {elapsed_ms:.0f} ms")
+            request_id_var.reset(token)
+
+class CrossOriginIsolationMiddleware:
+    """
+    Add cross-origin isolation headers to every HTTP response.
+
+    Headers added:
+    - Cross-Origin-Opener-Policy: Ensures same-origin isolation.
+    - Cross-Origin-Embedder-Policy: Blocks loading cross-origin resources without CORS.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["Cross-Origin-Opener-Policy"] = "same-origin"
+                headers["Cross-Origin-Embedder-Policy"] = "require-corp"
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject multipart request bodies larger than `max_bytes` before the form is parsed.
+
+    Starlette writes file parts to temporary files while parsing the form, before the
+    route runs, so a cap checked in the route comes after the whole body was spooled.
+
+    Behavior:
+    - A Content-Length above `max_bytes` is answered with 413 without reading the body.
+    - Otherwise the body is counted as it is received; once it passes `max_bytes`
+      (chunked uploads, or a Content-Length that understates the body), receiving
+      stops with a 413 HTTPException, which the route's form parsing passes on.
+    - Other request bodies (JSON) pass through untouched.
+
+    Metrics:
+    - http.oversized_uploads
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = MAX_UPLOAD_BODY_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload too large (max {self.max_bytes / (1024 * 1024):.1f} MB)"
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            metrics.incr("http.oversized_uploads")
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_capped() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    metrics.incr("http.oversized_uploads")
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_capped, send)
+
+class ConditionalCompressionMiddleware:
+    """
+    Add ETags, answer If-None-Match with 304, and compress GET responses.
+
+    Metrics:
+    - http.not_modified, http.compressed, http.compressed_cache_hits
+    - http.bytes_uncompressed, http.bytes_compressed (bodies that were compressed, before and after)
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.compressed: LRUCache = LRUCache(maxsize=COMPRESSED_CACHE_ENTRIES)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message # Held back until the body shows whether it is complete
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Streaming response: send it unchanged
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            for outgoing in self._finish(start, message.get("body", b""), if_none_match, encoding):
+                await send(outgoing)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _finish(self, start: Message, body: bytes, if_none_match: Optional[str], encoding: Optional[str]) -> List[Message]:
+        """
+        Turn a complete response into the messages to send: a 304, or the (compressed) body.
+        """
+
+        headers = MutableHeaders(scope=start)
+        compressible = (
+            len(body) >= MIN_COMPRESS_BYTES
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        else:
+            encoding = None
+
+        etag = None
+        if start["status"] == 200:
+            etag = headers.get("etag") or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if etag_matches(if_none_match, etag):
+                metrics.incr("http.not_modified")
+                headers["ETag"] = self._encoded_etag(etag, encoding)
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                start["status"] = 304
+                return [start, {"type": "http.response.body", "body": b""}]
+            headers["ETag"] = self._encoded_etag(etag, encoding)
+
+        if encoding is not None:
+            body = self._compressed_body(body, etag, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+        return [start, {"type": "http.response.body", "body": body}]
+
+    @staticmethod
+    def _encoded_etag(etag: str, encoding: Optional[str]) -> str:
+        if encoding is None or not etag.endswith('"'):
+            return etag
+        return f'{etag[:-1]}-{encoding}"'
+
+    def _compressed_body(self, body: bytes, etag: Optional[str], encoding: str) -> bytes:
+        key: Optional[Tuple[str, str]] = (etag, encoding) if etag is not None else None
+        compressed = self.compressed.get(key) if key is not None else None
+        if compressed is not None:
+            metrics.incr("http.compressed_cache_hits")
+        else:
+            compressed = _compress(body, encoding)
+            if key is not None:
+                self.compressed[key] = compressed
+        metrics.incr("http.compressed")
+        metrics.incr("http.bytes_uncompressed", len(body))
+        metrics.incr("http.bytes_compressed", len(compressed))
+        return compressed
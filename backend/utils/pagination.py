@@ -0,0 +1,98 @@
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """
+    Encode a keyset position into an opaque, URL-safe cursor string.
+
+    Parameters:
+    - created_at (datetime): Sort timestamp of the last row on the page.
+    - row_id (UUID): ID of the last row on the page (tie-breaker).
+
+    Returns:
+    - str: Opaque cursor to pass back as `cursor` for the next page.
+    """
+
+    raw = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Parameters:
+    - cursor (str): Opaque cursor string from a previous page.
+
+    Returns:
+    - Tuple[datetime, UUID]: The (created_at, id) keyset position.
+
+    Raises:
+    - HTTPException 400 if the cursor is malformed.
+    """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_keyset(stmt, created_col, id_col, cursor: Optional[str], limit: int, descending: bool = True):
+    """
+    Apply keyset ordering, the cursor predicate, and the page limit to a select statement.
+
+    Rows are ordered by (created_at, id) so that the position is unique, and the
+    statement fetches one extra row to tell whether another page exists. Unlike
+    OFFSET, the cost of a page does not grow with its depth.
+
+    Parameters:
+    - stmt (Select): Base select statement with filters already applied.
+    - created_col (Column): Timestamp column to order by.
+    - id_col (Column): Unique ID column used as tie-breaker.
+    - cursor (str, optional): Cursor from the previous page, or None for the first page.
+    - limit (int): Page size.
+    - descending (bool): Newest first when True (default).
+
+    Returns:
+    - Select: Statement ordered and limited to `limit + 1` rows.
+    """
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        position = tuple_(created_col, id_col)
+        if descending:
+            stmt = stmt.where(position < tuple_(created_at, row_id))
+        else:
+            stmt = stmt.where(position > tuple_(created_at, row_id))
+
+    if descending:
+        stmt = stmt.order_by(created_col.desc(), id_col.desc())
+    else:
+        stmt = stmt.order_by(created_col.asc(), id_col.asc())
+    return stmt.limit(limit + 1)
+
+def split_page(rows: list, limit: int, key) -> Tuple[list, Optional[str]]:
+    """
+    Trim the extra look-ahead row and build the cursor for the next page.
+
+    Parameters:
+    - rows (list): Rows returned by a statement built with `apply_keyset`.
+    - limit (int): Requested page size.
+    - key (Callable): Returns (created_at, id) for a row.
+
+    Returns:
+    - Tuple[list, Optional[str]]: Rows for this page and the next cursor (None on the last page).
+    """
+
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(*key(page[-1]))
@@ -0,0 +1,174 @@
+"""
+Partition maintenance for partitioned post storage (HOBBYMATCH_POST_STORAGE=partitioned).
+
+In partitioned storage (`db_partitioned_posts.sql`), `user_posts` is range-partitioned
+by `expires_at`, and `post_comments`, `post_reactions` and `post_stats` by their post's
+`post_expires_at`, into PARTITION_INTERVAL buckets with matching names
+(`user_posts_p202610161400`, `post_comments_p202610161400`, ...). A post and all of
+its rows therefore live in partitions of the same bucket, and expiry becomes DDL:
+- `ensure_partitions` creates the next PARTITIONS_AHEAD buckets ahead of the inserts
+  that need them.
+- `drop_expired_partitions` drops each bucket once all of its posts have been expired
+  for DROP_GRACE: the child partitions first, then the `user_posts` partition is
+  detached and dropped. No rows are deleted, so there are no dead tuples to vacuum
+  and almost no WAL.
+
+The reaper leader (`utils/expiry_scheduler.py`) runs `maintain_partitions` when it
+takes the lock and on every leader check. Clients are told about expired posts at
+their deadlines as in row storage (see `utils/clean_up.py`); the rows only go later.
+"""
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from database import engine, POSTS_PARTITIONED
+from logger import logger
+from utils.metrics import metrics
+
+PARTITION_INTERVAL = timedelta(hours=1) # Width of each bucket (must match db_partitioned_posts.sql)
+PARTITIONS_AHEAD = 48 # Buckets kept ahead of now (posts expire up to 24 hours out)
+DROP_GRACE = timedelta(minutes=15) # How long a bucket outlives its last post, so clients hear about expiries first
+DDL_LOCK_TIMEOUT = "2s" # Give up on partition DDL rather than queue behind long queries (retried next check)
+
+PARENT_TABLE = "user_posts"
+CHILD_TABLES = ("post_stats", "post_reactions", "post_comments") # Dropped before the parent partition
+
+def partition_bucket(moment: datetime) -> datetime:
+    """
+    Return the start of the bucket holding `moment`.
+    """
+
+    return datetime.min + (moment - datetime.min) // PARTITION_INTERVAL * PARTITION_INTERVAL
+
+def partition_name(table: str, bucket: datetime) -> str:
+    """
+    Return the name of `table`'s partition for the bucket starting at `bucket`.
+    """
+
+    return f"{table}_p{bucket:%Y%m%d%H%M}"
+
+async def list_partitions(conn: AsyncConnection, table: str) -> List[datetime]:
+    """
+    List the bucket starts of `table`'s existing partitions, oldest first.
+    """
+
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    )
+    buckets = []
+    for name in result.scalars():
+        try:
+            buckets.append(datetime.strptime(name.rsplit("_p", 1)[1], "%Y%m%d%H%M"))
+        except (IndexError, ValueError):
+            continue # Not one of ours
+    return sorted(buckets)
+
+async def ensure_partitions(now: datetime, still_leader: Optional[Callable[[], Awaitable[bool]]] = None) -> int:
+    """
+    Create any missing partitions for the next PARTITIONS_AHEAD buckets.
+
+    Each bucket's four partitions are created in one transaction, parent first.
+
+    Parameters:
+    - now (datetime): Current time (naive UTC).
+    - still_leader (Callable | None): Awaited before each bucket's DDL; stops when it returns False.
+
+    Returns:
+    - int: Number of buckets created.
+    """
+
+    created = 0
+    async with engine.connect() as conn:
+        existing = set(await list_partitions(conn, PARENT_TABLE))
+        await conn.commit()
+
+        first = partition_bucket(now)
+        for i in range(PARTITIONS_AHEAD):
+            bucket = first + i * PARTITION_INTERVAL
+            if bucket in existing:
+                continue
+            if still_leader is not None and not await still_leader():
+                break
+            bounds = f"FROM ('{bucket.isoformat()}') TO ('{(bucket + PARTITION_INTERVAL).isoformat()}')"
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            for table in (PARENT_TABLE, *CHILD_TABLES):
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(table, bucket)} PARTITION OF {table} FOR VALUES {bounds}"
+                ))
+            await conn.commit()
+            created += 1
+    return created
+
+async def drop_expired_partitions(now: datetime, still_leader: Optional[Callable[[], Awaitable[bool]]] = None) -> int:
+    """
+    Drop every bucket whose posts have all been expired for at least DROP_GRACE.
+
+    Per bucket, in one transaction: delete the media jobs of its posts (media_jobs is
+    not partitioned), drop its child partitions, then detach and drop its `user_posts`
+    partition.
+
+    Parameters:
+    - now (datetime): Current time (naive UTC).
+    - still_leader (Callable | None): Awaited before each bucket's DDL; stops when it returns False.
+
+    Returns:
+    - int: Number of buckets dropped.
+    """
+
+    dropped = 0
+    async with engine.connect() as conn:
+        buckets = await list_partitions(conn, PARENT_TABLE)
+        await conn.commit()
+
+        for bucket in buckets:
+            if bucket + PARTITION_INTERVAL > now - DROP_GRACE:
+                break # Buckets are sorted, so the rest are newer
+            if still_leader is not None and not await still_leader():
+                break
+            posts = partition_name(PARENT_TABLE, bucket)
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            await conn.execute(text(f"DELETE FROM media_jobs WHERE post_id IN (SELECT id FROM {posts})"))
+            for table in CHILD_TABLES:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(table, bucket)}"))
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {posts}"))
+            await conn.execute(text(f"DROP TABLE {posts}"))
+            await conn.commit()
+            dropped += 1
+    return dropped
+
+async def maintain_partitions(still_leader: Optional[Callable[[], Awaitable[bool]]] = None):
+    """
+    Create upcoming partitions and drop expired ones (no-op in row storage).
+
+    Parameters:
+    - still_leader (Callable | None): The reaper leader's lock check, awaited before each
+      bucket's DDL so an instance that lost the lock stops before running more.
+
+    Behavior:
+    - Called by the reaper leader only, so partition DDL never runs concurrently.
+    - Errors (e.g. a lock timeout) are logged; the next leader check retries.
+
+    Metrics:
+    - partitions.created, partitions.dropped, partitions.errors
+    """
+
+    if not POSTS_PARTITIONED:
+        return
+    try:
+        now = datetime.utcnow()
+        created = await ensure_partitions(now, still_leader)
+        dropped = await drop_expired_partitions(now, still_leader)
+        metrics.incr("partitions.created", created)
+        metrics.incr("partitions.dropped", dropped)
+        if created or dropped:
+            logger.info(f"Post partitions: created {created} buckets, dropped {dropped}")
+    except Exception as e:
+        metrics.incr("partitions.errors")
+        logger.error(f"Post partition maintenance failed: {e}")
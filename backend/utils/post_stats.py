@@ -0,0 +1,252 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Sequence
+from uuid import UUID
+from sqlalchemy import select, update, func, or_, any_, bindparam
+from sqlalchemy.dialects.postgresql import insert, ARRAY, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import UserPost, PostComment, PostReaction, PostStats, ReactionType
+from database import SessionLocal
+from logger import logger
+
+RECONCILE_INTERVAL_SECONDS = 10 * 60 # 10 minutes
+RECONCILE_BATCH_SIZE = 500 # Posts whose counter rows are locked and recounted per transaction
+
+# Conflict target for counter upserts: the primary key, which includes post_expires_at in partitioned storage
+STATS_KEY_COLUMNS = list(PostStats.__table__.primary_key.columns)
+
+# Counter column for each reaction type (e.g. ReactionType.like -> PostStats.like_count)
+REACTION_COUNT_COLUMNS = {rtype: getattr(PostStats, f"{rtype.value}_count") for rtype in ReactionType}
+
+def reaction_counts_of(stats: PostStats | None) -> Dict[str, int]:
+    """
+    Convert a counter row into the `reaction_counts` dict used by PostRead.
+
+    Parameters:
+    - stats (PostStats | None): Counter row, or None if the post has none yet.
+
+    Returns:
+    - dict: {reaction_type: count}, omitting types with no reactions.
+    """
+
+    if stats is None:
+        return {}
+    counts = {rtype.value: getattr(stats, column.key) for rtype, column in REACTION_COUNT_COLUMNS.items()}
+    return {rtype: count for rtype, count in counts.items() if count > 0}
+
+async def load_post_stats(db: AsyncSession, post_ids: Sequence[UUID]) -> Dict[UUID, PostStats]:
+    """
+    Load counter rows for many posts in a single query.
+
+    Parameters:
+    - db (AsyncSession): DB session.
+    - post_ids (Sequence[UUID]): Posts to load counters for.
+
+    Returns:
+    - dict: Maps post ID to its PostStats row.
+    """
+
+    if not post_ids:
+        return {}
+    result = await db.execute(select(PostStats).where(PostStats.post_id.in_(post_ids)))
+    return {stats.post_id: stats for stats in result.scalars()}
+
+async def bump_post_stats(db: AsyncSession, post_id: UUID, post_expires_at: datetime, column, delta: int):
+    """
+    Atomically add `delta` to one counter of a post within the caller's transaction.
+
+    Uses an upsert so posts created before the counter row existed are healed on write;
+    any resulting drift is repaired by `reconcile_post_stats`.
+
+    Parameters:
+    - db (AsyncSession): DB session (not committed here).
+    - post_id (UUID): Post whose counter changes.
+    - post_expires_at (datetime): The post's expires_at (stored with the counter row).
+    - column (Column): PostStats counter column to update.
+    - delta (int): Amount to add (negative to decrement).
+
+    Returns:
+    - None
+    """
+
+    stmt = (
+        insert(PostStats)
+        .values({PostStats.post_id: post_id, PostStats.post_expires_at: post_expires_at, column: max(delta, 0)})
+        .on_conflict_do_update(
+            index_elements=STATS_KEY_COLUMNS,
+            set_={column.key: func.greatest(column + delta, 0)},
+        )
+    )
+    await db.execute(stmt)
+
+async def bump_reaction_count(db: AsyncSession, post_id: UUID, post_expires_at: datetime, reaction_type: ReactionType, delta: int):
+    """
+    Adjust the counter for one reaction type on a post.
+
+    Parameters:
+    - db (AsyncSession): DB session (not committed here).
+    - post_id (UUID): Reacted post.
+    - post_expires_at (datetime): The post's expires_at.
+    - reaction_type (ReactionType): Reaction type whose counter changes.
+    - delta (int): +1 when added, -1 when removed.
+
+    Returns:
+    - None
+    """
+
+    await bump_post_stats(db, post_id, post_expires_at, REACTION_COUNT_COLUMNS[ReactionType(reaction_type)], delta)
+
+async def bump_comment_count(db: AsyncSession, post_id: UUID, post_expires_at: datetime, delta: int):
+    """
+    Adjust the comment counter on a post.
+
+    Parameters:
+    - db (AsyncSession): DB session (not committed here).
+    - post_id (UUID): Commented post.
+    - post_expires_at (datetime): The post's expires_at.
+    - delta (int): +1 when added, -1 when removed.
+
+    Returns:
+    - None
+    """
+
+    await bump_post_stats(db, post_id, post_expires_at, PostStats.comment_count, delta)
+
+def _reconcile_statements():
+    """
+    Build the statements of one reconciliation batch, with the batch's post IDs bound as
+    one `post_ids` array so SQLAlchemy compiles each statement once rather than per batch.
+    """
+
+    post_ids = bindparam("post_ids", type_=ARRAY(PG_UUID(as_uuid=True)))
+
+    create_missing = insert(PostStats).from_select(
+        ["post_id", "post_expires_at"],
+        select(UserPost.id, UserPost.expires_at).where(UserPost.id == any_(post_ids)),
+    ).on_conflict_do_nothing()
+
+    lock = (
+        select(PostStats.post_id)
+        .where(PostStats.post_id == any_(post_ids))
+        .order_by(PostStats.post_id)
+        .with_for_update()
+    )
+
+    reaction_totals = (
+        select(
+            PostReaction.post_id,
+            *[
+                func.count().filter(PostReaction.type == rtype).label(column.key)
+                for rtype, column in REACTION_COUNT_COLUMNS.items()
+            ],
+        )
+        .where(PostReaction.post_id == any_(post_ids))
+        .group_by(PostReaction.post_id)
+        .subquery()
+    )
+    comment_totals = (
+        select(PostComment.post_id, func.count().label("comment_count"))
+        .where(PostComment.post_id == any_(post_ids))
+        .group_by(PostComment.post_id)
+        .subquery()
+    )
+
+    counter_keys = [column.key for column in REACTION_COUNT_COLUMNS.values()] + ["comment_count"]
+    actual = (
+        select(
+            UserPost.id.label("post_id"),
+            *[func.coalesce(reaction_totals.c[key], 0).label(key) for key in counter_keys[:-1]],
+            func.coalesce(comment_totals.c.comment_count, 0).label("comment_count"),
+        )
+        .outerjoin(reaction_totals, reaction_totals.c.post_id == UserPost.id)
+        .outerjoin(comment_totals, comment_totals.c.post_id == UserPost.id)
+        .where(UserPost.id == any_(post_ids))
+        .subquery()
+    )
+    repair = (
+        update(PostStats)
+        .where(PostStats.post_id == actual.c.post_id)
+        .where(or_(*[getattr(PostStats, key) != actual.c[key] for key in counter_keys]))
+        .values({key: actual.c[key] for key in counter_keys})
+    )
+    return create_missing, lock, repair
+
+CREATE_MISSING_STATS, LOCK_STATS, REPAIR_STATS = _reconcile_statements()
+
+async def reconcile_post_stats_batch(session: AsyncSession, post_ids: List[UUID]) -> int:
+    """
+    Recount the counters of one batch of posts and repair those that drifted.
+
+    Workflow:
+    - Creates missing counter rows (zeros), so every post in the batch has a row to lock.
+    - Locks the batch's counter rows (`FOR UPDATE`, in post ID order). A concurrent
+      `bump_post_stats` either committed before the lock, so its reaction or comment is
+      counted, or waits for this transaction and then applies its delta on top of the
+      repaired value; either way no increment is lost.
+    - Counts reactions per type and comments for the batch, then rewrites only the rows
+      whose stored counters differ. The count runs after the lock: in READ COMMITTED each
+      statement sees every commit made before it started.
+
+    Parameters:
+    - session (AsyncSession): DB session; the caller commits, which releases the locks.
+    - post_ids (List[UUID]): Posts to check.
+
+    Returns:
+    - int: Number of counter rows repaired.
+    """
+
+    # Core execution on the session's connection: with parameters, the ORM would run the insert as a bulk insert
+    conn = await session.connection()
+    params = {"post_ids": post_ids}
+    await conn.execute(CREATE_MISSING_STATS, params)
+    await conn.execute(LOCK_STATS, params)
+    result = await conn.execute(REPAIR_STATS, params)
+    return result.rowcount
+
+async def reconcile_post_stats(batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """
+    Recompute every unexpired post's counters from the source tables and repair any drift.
+
+    Walks unexpired posts in post ID order, `batch_size` at a time, and reconciles each
+    batch in its own short transaction (see `reconcile_post_stats_batch`), so counter
+    rows are only locked for one batch and concurrent bumps are never overwritten.
+
+    Parameters:
+    - batch_size (int): Posts per transaction.
+
+    Returns:
+    - int: Number of counter rows repaired.
+    """
+
+    repaired = 0
+    after = None
+    now = datetime.utcnow()
+    while True:
+        async with SessionLocal() as session:
+            query = select(UserPost.id).where(UserPost.expires_at > now)
+            if after is not None:
+                query = query.where(UserPost.id > after)
+            post_ids = (await session.execute(query.order_by(UserPost.id).limit(batch_size))).scalars().all()
+            if not post_ids:
+                return repaired
+            repaired += await reconcile_post_stats_batch(session, list(post_ids))
+            await session.commit()
+        after = post_ids[-1]
+
+async def reconcile_post_stats_loop():
+    """
+    Continuously run `reconcile_post_stats` every RECONCILE_INTERVAL_SECONDS.
+
+    Behavior:
+    - Runs indefinitely until the application shuts down.
+    - Logs the number of repaired rows; errors are logged and the loop keeps going.
+    """
+
+    while True:
+        try:
+            repaired = await reconcile_post_stats()
+            if repaired:
+                logger.warning(f"Post stats reconciliation repaired {repaired} rows")
+        except Exception as e:
+            logger.error(f"Post stats reconciliation failed: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
@@ -0,0 +1,114 @@
+"""
+Coalesces engagement updates into batched `post_stats` WebSocket frames.
+
+Broadcasting one frame per reaction click floods subscribers of popular posts with
+tiny messages. Instead, routes mark a post here after committing a counter change
+and, once per window, a single frame per post is broadcast to the post's topic with
+its counts as stored in `post_stats` at flush time:
+
+    {"type": "post_stats", "data": {"post_id": ..., "reactions": {"like": 12, "sad": 1}, "comments": 4}}
+
+Frames carry absolute counts rather than changes, so a frame a client missed, or
+got twice (one per backend instance for the same window), is corrected by the next
+one instead of leaving the client's counts off for good.
+
+The window opens with the first update after a flush, so no update waits longer than
+WINDOW_SECONDS (or less, if MAX_PENDING_POSTS posts are pending and the batch is
+flushed early).
+"""
+
+import asyncio
+from typing import Dict
+from uuid import UUID
+from database import SessionLocal
+from logger import logger
+from utils.metrics import metrics
+from utils.post_stats import load_post_stats, reaction_counts_of
+from utils.redis_ws_manager import manager, post_topic
+
+WINDOW_SECONDS = 0.2 # Maximum delay before an update is broadcast (100-250 ms works well)
+MAX_PENDING_POSTS = 1000 # Flush early once this many posts have pending updates
+
+class PostStatsBatcher:
+    """
+    Collects posts whose counters changed and broadcasts one `post_stats` frame per post per window.
+
+    Attributes:
+    - window (float): Batching window in seconds.
+    - pending (Dict[UUID, int]): Post ID -> number of updates waiting for the next flush.
+    - flush_task (asyncio.Task | None): Timer flushing the current window.
+
+    Metrics:
+    - post_stats_batcher.updates, post_stats_batcher.frames, post_stats_batcher.frames_saved
+    """
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        self.pending: Dict[UUID, int] = {}
+        self.flush_task = None
+
+    def add(self, post_id: UUID):
+        """
+        Record that a post's counters changed (call after committing the change); its
+        counts are broadcast at the end of the current window.
+
+        Parameters:
+        - post_id (UUID): Post whose counters changed.
+        """
+
+        self.pending[post_id] = self.pending.get(post_id, 0) + 1
+        metrics.incr("post_stats_batcher.updates")
+
+        if len(self.pending) >= MAX_PENDING_POSTS:
+            self._schedule(0)
+        elif self.flush_task is None:
+            self._schedule(self.window)
+
+    def _schedule(self, delay: float):
+        """
+        Start the flush timer, replacing a longer pending one.
+        """
+
+        if self.flush_task is not None:
+            if delay > 0:
+                return
+            self.flush_task.cancel()
+        self.flush_task = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Post stats batch broadcast failed: {e}")
+
+    async def flush(self):
+        """
+        Load the current counts of every pending post in one query and broadcast one
+        `post_stats` frame per post. Posts without a counter row (deleted) are skipped.
+        """
+
+        batch, self.pending = self.pending, {}
+        if not batch:
+            return
+        async with SessionLocal() as session:
+            stats = await load_post_stats(session, list(batch))
+
+        for post_id, updates in batch.items():
+            if post_id not in stats:
+                continue
+            await manager.broadcast({
+                "type": "post_stats",
+                "data": {
+                    "post_id": str(post_id),
+                    "reactions": reaction_counts_of(stats[post_id]),
+                    "comments": stats[post_id].comment_count,
+                }
+            }, topics=[post_topic(post_id)])
+            metrics.incr("post_stats_batcher.frames")
+            metrics.incr("post_stats_batcher.frames_saved", updates - 1)
+
+
+# Export a single global batcher to be used throughout the app
+post_stats_batcher = PostStatsBatcher()
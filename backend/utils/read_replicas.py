@@ -0,0 +1,228 @@
+"""
+Read-replica routing for read-only endpoints.
+
+Read-heavy endpoints whose results may lag slightly (public feed and user lists) take `get_read_db` instead of `get_db`. It hands out a session on a
+streaming replica from HOBBYMATCH_REPLICA_URLS (comma-separated asyncpg URLs),
+round-robin, and falls back to the primary when:
+- no replicas are configured,
+- a replica failed its last health check or a connection attempt, or
+- a replica's replication lag exceeds MAX_REPLICA_LAG_SECONDS.
+
+Writes and read-after-write paths (e.g. the reload at the end of `update_my_profile`)
+keep using `get_db`, so they always see their own changes.
+
+A background task (started from the app lifespan) checks every replica each
+REPLICA_CHECK_SECONDS and records its lag. Each round first reads the primary's
+current WAL position, so a replica counts as caught up only once it has replayed
+everything the primary had written; a replica whose WAL receiver is not streaming
+(disconnected from the primary) fails the check, since its lag cannot be known.
+"""
+
+import asyncio
+import os
+from itertools import count
+from typing import List, Optional
+from sqlalchemy import text, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from database import SessionLocal, create_db_engine, engine as primary_engine
+from logger import logger
+from utils.metrics import metrics
+
+REPLICA_URLS = [url.strip() for url in os.getenv("HOBBYMATCH_REPLICA_URLS", "").split(",") if url.strip()]
+MAX_REPLICA_LAG_SECONDS = 2.0 # Replicas further behind than this are skipped
+REPLICA_CHECK_SECONDS = 5 # Health and lag check interval
+REPLICA_CHECK_TIMEOUT_SECONDS = 2 # A check slower than this marks the replica unhealthy
+
+# The primary's current WAL position, read before the replicas are checked
+PRIMARY_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+
+# Seconds the replica is behind the primary:
+# - zero on a database that is not a replica at all (e.g. a second database used for local testing);
+# - NULL (unknown) when its WAL receiver is not streaming, or it has replayed nothing yet;
+# - zero once it has replayed up to :primary_lsn (an idle primary would otherwise look like
+#   growing lag), or up to what it received when the primary's position is unknown;
+# - otherwise the age of the last transaction it replayed.
+LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "WHEN pg_last_wal_replay_lsn() >= COALESCE(CAST(CAST(:primary_lsn AS TEXT) AS pg_lsn), pg_last_wal_receive_lsn()) THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+class Replica:
+    """
+    One read replica and its latest health check.
+
+    Attributes:
+    - engine (AsyncEngine): Pooled engine for the replica.
+    - sessions (sessionmaker): Session factory bound to `engine`.
+    - healthy (bool): Last check (or connection attempt) succeeded.
+    - lag (float | None): Replication lag in seconds at the last check.
+    """
+
+    def __init__(self, url: str):
+        self.engine: AsyncEngine = create_db_engine(url)
+        self.sessions = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.healthy = False # Until the first check passes
+        self.lag: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= MAX_REPLICA_LAG_SECONDS
+
+class ReplicaRouter:
+    """
+    Picks a replica session for read-only requests, or the primary when none is usable.
+
+    Attributes:
+    - replicas (List[Replica]): Configured replicas.
+    - check_task (asyncio.Task | None): Background health check loop.
+
+    Metrics:
+    - replicas.reads, replicas.fallbacks, replicas.check_failures, replicas.connect_failures
+    - replicas.usable (gauge), replicas.max_lag_seconds (gauge)
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self.check_task: Optional[asyncio.Task] = None
+        self._next = count()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        """
+        Return the next usable replica in round-robin order, or None to use the primary.
+        """
+
+        usable = [replica for replica in self.replicas if replica.usable]
+        if not usable:
+            return None
+        return usable[next(self._next) % len(usable)]
+
+    async def primary_lsn(self) -> Optional[str]:
+        """
+        Return the primary's current WAL position, or None if it cannot be read in time
+        (replicas are then compared with what they received instead).
+        """
+
+        async def query():
+            async with primary_engine.connect() as conn:
+                return (await conn.execute(PRIMARY_LSN_SQL)).scalar()
+
+        try:
+            return await asyncio.wait_for(query(), REPLICA_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not read the primary's WAL position for the replica checks: {e}")
+            return None
+
+    async def _query_lag(self, replica: Replica, primary_lsn: Optional[str]) -> float:
+        async with replica.engine.connect() as conn:
+            lag = (await conn.execute(LAG_SQL, {"primary_lsn": primary_lsn})).scalar()
+        if lag is None:
+            raise RuntimeError("replication lag unknown (WAL receiver not streaming, or nothing replayed yet)")
+        return float(lag)
+
+    async def check(self, replica: Replica, primary_lsn: Optional[str] = None):
+        """
+        Refresh one replica's health and lag.
+
+        Parameters:
+        - replica (Replica): Replica to check.
+        - primary_lsn (str | None): Primary WAL position the replica must have replayed to count as caught up.
+        """
+
+        try:
+            replica.lag = await asyncio.wait_for(self._query_lag(replica, primary_lsn), REPLICA_CHECK_TIMEOUT_SECONDS)
+            if not replica.healthy:
+                logger.info(f"Read replica {replica.name} is healthy (lag {replica.lag:.1f}s).")
+            replica.healthy = True
+        except Exception as e:
+            if replica.healthy:
+                logger.warning(f"Read replica {replica.name} failed its health check: {e}")
+            replica.healthy = False
+            metrics.incr("replicas.check_failures")
+
+    async def check_all(self):
+        """
+        Check every replica concurrently and record the results.
+        """
+
+        primary_lsn = await self.primary_lsn()
+        await asyncio.gather(*(self.check(replica, primary_lsn) for replica in self.replicas))
+        lags = [replica.lag for replica in self.replicas if replica.healthy and replica.lag is not None]
+        metrics.set_gauge("replicas.usable", sum(replica.usable for replica in self.replicas))
+        metrics.set_gauge("replicas.max_lag_seconds", round(max(lags), 3) if lags else -1)
+
+    async def _check_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(REPLICA_CHECK_SECONDS)
+
+    async def start(self):
+        """
+        Run the first health check and start checking in the background (no-op without replicas).
+        """
+
+        if not self.enabled:
+            return
+        await self.check_all() # Route reads to replicas from the first request
+        self.check_task = asyncio.create_task(self._check_loop())
+
+    async def stop(self):
+        """
+        Stop the health checks and close the replica connection pools.
+        """
+
+        if self.check_task is not None:
+            self.check_task.cancel()
+            try:
+                await self.check_task
+            except asyncio.CancelledError:
+                pass
+            self.check_task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+# Export a single global router to be used throughout the app
+replica_router = ReplicaRouter(REPLICA_URLS)
+
+async def get_read_db():
+    """
+    Async generator dependency that provides a session for read-only work.
+
+    Yields a session on a usable replica (connected lazily, so cached responses cost
+    no connection). A replica whose connection fails mid-request is skipped until its
+    next health check passes. Use `get_db` for writes and for reads that must see the caller's own writes.
+
+    Yields:
+    - AsyncSession: Replica session, or a primary session when no replica is usable.
+    """
+
+    replica = replica_router.pick()
+    if replica is None:
+        if replica_router.enabled:
+            metrics.incr("replicas.fallbacks")
+        async with SessionLocal() as session:
+            yield session
+        return
+
+    metrics.incr("replicas.reads")
+    async with replica.sessions() as session:
+        try:
+            yield session
+        except (exc.OperationalError, exc.InterfaceError, OSError) as e:
+            # Stop routing to the replica until its next health check passes
+            replica.healthy = False
+            metrics.incr("replicas.connect_failures")
+            logger.warning(f"Read replica {replica.name} failed a request: {e}")
+            raise
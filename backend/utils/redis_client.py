@@ -0,0 +1,39 @@
+"""
+Shared Redis client factory.
+
+Reads the Redis location from the HOBBYMATCH_REDIS_URL environment variable and
+falls back to a local Redis server when it is not set. The special URL
+`fakeredis://` returns an in-process fakeredis client, which lets the WebSocket
+manager and caches run in tests without a Redis server.
+"""
+
+import os
+from dotenv import load_dotenv
+from logger import logger
+
+# Load environment variables
+load_dotenv()
+
+REDIS_URL = os.getenv("HOBBYMATCH_REDIS_URL")
+FAKEREDIS_SCHEME = "fakeredis://"
+
+def create_redis_client():
+    """
+    Create an asyncio Redis client for the configured URL.
+
+    Returns:
+    - Redis | FakeRedis: Client instance (connections are opened lazily).
+
+    Raises:
+    - ImportError if the redis package (or fakeredis, in fakeredis mode) is not installed.
+    """
+
+    if REDIS_URL and REDIS_URL.startswith(FAKEREDIS_SCHEME):
+        from fakeredis import FakeAsyncRedis
+        logger.info("Using fakeredis in-process Redis client.")
+        return FakeAsyncRedis()
+
+    from redis.asyncio import Redis
+    if REDIS_URL:
+        return Redis.from_url(REDIS_URL)
+    return Redis() # Default local Redis server
@@ -11,13 +11,46 @@ Key Features:
 - Redis-enabled broadcasting when available
 - Graceful fallback to in-memory broadcasting
 - Centralized WebSocket management
+- Per-connection bounded send queues drained by a writer task, so one slow client
+  never delays the others and broadcasting never waits on a socket
+- Each event is JSON-encoded once (with orjson when installed) and the same text
+  frame is sent to every socket and forwarded through Redis without re-parsing
+- Topic subscriptions ("feed", "hobby:<id>", "post:<id>", "user:<id>"): events go
+  only to connections subscribed to one of their topics, and each connection gets
+  an event at most once even if it matches several topics
+- Managed Redis lifecycle: `start()`/`stop()` are called from the app lifespan; the
+  pub/sub connection is health-checked and re-established with backoff, and events
+  published while it was down are replayed from a Redis Stream
+- Resumable connections: every broadcast event carries a sequence number ("seq"), and
+  a client reconnecting with the last seq it saw gets only the events it missed (or
+  a `resync_required` message if they are no longer available)
+- Admission control (per-instance and per-user connection caps) and an application-level
+  heartbeat that reaps sockets which stopped answering
 """
 
 import asyncio
 import json
+import random
+import re
+import time
+from collections import OrderedDict, deque
 from fastapi import WebSocket
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from logger import logger
+from utils.metrics import metrics
+from utils.redis_client import create_redis_client
+
+# Use orjson for encoding events if installed; it is several times faster than json.
+try:
+    import orjson
+
+    def encode_event(message: dict) -> str:
+        """Encode an event as compact JSON text."""
+        return orjson.dumps(message).decode()
+except ImportError:
+    def encode_event(message: dict) -> str:
+        """Encode an event as compact JSON text."""
+        return json.dumps(message, separators=(",", ":"))
 
 # Attempt to import Redis support for asyncio.
 try:
@@ -27,61 +60,280 @@ except ImportError:
     logger.warning("Redis not available, falling back to in-memory broadcasting.")
     redis_available = False # Fallback to in-memory broadcasting
 
-REDIS_CHANNEL = "ws_broadcast"
+REDIS_CHANNEL = "ws_broadcast" # Events for topic T are published on "ws_broadcast:T"
+REDIS_STREAM = "ws_events" # Recent events, replayed by instances whose pub/sub connection dropped
+
+STREAM_MAXLEN = 10_000 # Approximate number of events kept for replay
+REPLAY_BATCH_SIZE = 500 # Stream entries read per XRANGE while replaying
+REPLAY_SLACK_MS = 1_000 # Also replay this far before the last seen event (concurrent publishers)
+RECENT_EVENT_IDS = 4096 # Event IDs remembered to skip events delivered twice around a replay
+HEALTH_CHECK_INTERVAL_SECONDS = 15 # PING the pub/sub connection after this long without messages
+RECONNECT_BASE_SECONDS = 0.5 # Reconnect attempt n waits random(0, base * 2**n) seconds
+RECONNECT_MAX_SECONDS = 30 # Upper bound for the reconnect delay
+
+REPLAY_BUFFER_SIZE = 2_000 # Recent events kept in memory, used to resume clients while Redis is down
+MAX_RESUME_EVENTS = 100 # Clients that missed more events than this must resync (keep below SEND_QUEUE_SIZE)
+
+# Subscription topics
+FEED_TOPIC = "feed" # Public feed: new, deleted and updated posts
+TOPIC_PATTERN = re.compile(r"^(feed|(hobby|post|user):[0-9a-f-]{32,36})$")
+MAX_TOPICS_PER_CONNECTION = 200
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+def _stream_id_key(event_id: str) -> tuple:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def _with_seq(seq: str, payload: str) -> str:
+    # Splice the sequence number into an encoded event object without re-encoding it
+    return f'{{"seq":"{seq}"' + ("," if len(payload) > 2 else "") + payload[1:]
+
+def _payload_seq(payload: str) -> Optional[str]:
+    if not payload.startswith('{"seq":"'):
+        return None
+    return payload[8:payload.index('"', 8)]
+
+def hobby_topic(hobby_id) -> str:
+    return f"hobby:{hobby_id}"
+
+def post_topic(post_id) -> str:
+    return f"post:{post_id}"
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+SEND_QUEUE_SIZE = 256 # Messages buffered per connection
+SEND_TIMEOUT_SECONDS = 10 # A single send taking longer than this disconnects the client
+SLOW_CONSUMER_POLICY = "disconnect" # Full queue: "disconnect" the client, or "drop_oldest" message
+
+MAX_CONNECTIONS_PER_INSTANCE = 10_000 # Further connections are refused with code 1013 (try again later)
+MAX_CONNECTIONS_PER_USER = 5 # Further connections by the same user are refused with code 1008
+HEARTBEAT_INTERVAL_SECONDS = 30 # Send {"type": "ping"} to every client this often
+HEARTBEAT_TIMEOUT_SECONDS = 75 # Close clients that sent nothing (not even a pong) for this long
+PING_PAYLOAD = encode_event({"type": "ping"})
+
+class ClientConnection:
+    """
+    A connected WebSocket client with its own bounded send queue and writer task.
+
+    Attributes:
+    - websocket (WebSocket): The client connection.
+    - queue (asyncio.Queue): Outbound pre-encoded JSON messages waiting to be sent.
+    - writer_task (asyncio.Task | None): Task sending queued messages in order.
+    - topics (Set[str]): Topics the client is subscribed to.
+    - held (List[str] | None): While resuming, live messages queued after the missed events.
+    - resumed (Set[str]): Sequence numbers already sent on resume.
+    - user_id (str | None): Authenticated user, counted against MAX_CONNECTIONS_PER_USER.
+    - last_seen (float): Event loop time of the client's last message (or of connecting).
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[str] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.last_seen = asyncio.get_running_loop().time()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer_task = None
+        self.topics: Set[str] = set()
+        self.held: Optional[List[str]] = None # Live messages held back while missed events are fetched
+        self.resumed: Set[str] = set() # Seqs sent on resume, skipped if they also arrive live
 
 class RedisWebSocketManager:
     """
     Manages WebSocket connections and broadcasts messages to connected clients.
 
     Features:
-    - Maintains a list of active WebSocket connections.
-    - Supports broadcasting messages locally to all connections.
-    - If Redis is available, publishes and subscribes to a Redis channel to enable
-      cross-instance WebSocket message broadcasting in distributed environments.
-    - Automatically falls back to local broadcasting if Redis is unavailable or errors occur.
+    - Maintains the active WebSocket connections, each with a bounded send queue
+      drained by its own writer task.
+    - Indexes connections by subscribed topic; broadcasting enqueues a message only
+      for subscribers of its topics, so cost scales with interested clients. Clients
+      whose queue is full are handled by SLOW_CONSUMER_POLICY.
+    - If Redis is available, appends each event to a Redis Stream and publishes it to
+      one Redis channel per topic, listening on all of them with a pattern subscription,
+      enabling cross-instance broadcasting.
+    - Falls back to local broadcasting while Redis is unavailable, reconnects with
+      backoff, and replays the events it missed from the stream once reconnected.
 
     Attributes:
-    - active_connections (List[WebSocket]): List of currently connected WebSocket clients.
-    - redis_enabled (bool): Flag indicating if Redis-based pub/sub is enabled.
-    - redis (Redis | None): Redis client instance, or None if Redis is disabled.
-    - pubsub_task (asyncio.Task | None): Background task listening for Redis pub/sub messages.
+    - active_connections (Dict[WebSocket, ClientConnection]): Currently connected WebSocket clients.
+    - subscribers (Dict[str, Set[ClientConnection]]): Topic -> subscribed clients.
+    - redis_enabled (bool): True while subscribed to Redis pub/sub; broadcasts go through Redis only then.
+    - redis (Redis | None): Redis client instance, or None before `start()` or without Redis.
+    - pubsub_task (asyncio.Task | None): Background task keeping the Redis subscription alive.
+    - last_event_id (str | None): Stream ID of the newest event received, where replay resumes.
+    - recent_events (OrderedDict[str, bool]): Recently received event IDs -> whether delivered by replay.
+    - replay_buffer (deque): Recent (seq, topics, payload) events, for resuming clients while Redis is down.
+    - user_connections (Dict[str, int]): User ID -> number of open connections.
+    - heartbeat_task (asyncio.Task | None): Background task pinging clients and reaping dead ones.
+
+    Metrics:
+    - ws.connections (gauge), ws.users (gauge), ws.messages_dropped, ws.slow_consumer_disconnects
+    - ws.rejected_instance_cap, ws.rejected_user_cap, ws.heartbeat_timeouts
+    - ws.redis_connected (gauge), ws.redis_reconnects, ws.redis_publish_failures,
+      ws.redis_replayed, ws.redis_replay_gaps, ws.resumes, ws.resumed_events, ws.resyncs
     """
 
     def __init__(self):
-        # Initialize active connections list and Redis client if available
-        self.active_connections: List[WebSocket] = []
-        self.redis_enabled = redis_available
+        # Initialize connection state; Redis is connected by start()
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.subscribers: Dict[str, Set[ClientConnection]] = {}
+        self.redis_enabled = False
         self.redis = None
         self.pubsub_task = None
+        self.last_event_id = None
+        self.recent_events: OrderedDict = OrderedDict()
+        self.replay_buffer: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self._last_seq = (0, 0) # Highest seq seen, so local sequence numbers keep increasing
+        self.user_connections: Dict[str, int] = {}
+        self.heartbeat_task = None
+        self._closing = set() # Pending slow-consumer close tasks
+
+    async def start(self):
+        """
+        Start the heartbeat task, create the Redis client and start the pub/sub listener
+        (call from the app lifespan).
 
-        if self.redis_enabled:
-            try:
-                self.redis = Redis() # Initialize Redis client
-                # Start background async task to listen for Redis pub/sub messages
-                self.pubsub_task = asyncio.create_task(self._redis_listener())
-                logger.info("Redis initialized for WebSocket broadcasting.")
-            except Exception as e:
-                logger.warning(f"Redis initialization failed: {e}")
-                self.redis_enabled = False
+        Redis is skipped if the redis package is missing or the listener is already running;
+        broadcasting then stays local.
+
+        Returns:
+        - None
+        """
+
+        if self.heartbeat_task is None:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        if not redis_available or self.pubsub_task is not None:
+            return
+        try:
+            self.redis = create_redis_client() # Initialize Redis client
+        except Exception as e:
+            logger.warning(f"Redis initialization failed: {e}")
+            return
+        # Start background async task to listen for Redis pub/sub messages
+        self.pubsub_task = asyncio.create_task(self._redis_listener())
+        logger.info("Redis initialized for WebSocket broadcasting.")
 
-    async def connect(self, websocket: WebSocket):
+    async def stop(self):
         """
-        Accept and register a new WebSocket connection.
+        Stop the background tasks and close the Redis client (call on app shutdown).
+
+        Returns:
+        - None
+        """
+
+        for task in (self.heartbeat_task, self.pubsub_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.heartbeat_task = self.pubsub_task = None
+        self.redis_enabled = False
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        topics: Iterable[str] = (FEED_TOPIC,),
+        since: Optional[str] = None,
+        user_id=None,
+    ) -> bool:
+        """
+        Admit, accept and register a new WebSocket connection and start its writer task.
+
+        The connection is refused (see `refuse()`) with code 1013 if the instance already has
+        MAX_CONNECTIONS_PER_INSTANCE connections, or 1008 if the user already has
+        MAX_CONNECTIONS_PER_USER.
+
+        When `since` is given, the events for the connection's topics broadcast after that
+        sequence number are sent first, followed by live events (without duplicates). If
+        they are no longer available, a `resync_required` message is sent instead.
 
         Parameters:
         - websocket (WebSocket): The incoming WebSocket connection to accept.
+        - topics (Iterable[str]): Initial topic subscriptions (default: the public feed).
+        - since (str | None): Last sequence number the client received before reconnecting.
+        - user_id (UUID | None): Authenticated user opening the connection.
 
         Returns:
-        - None
+        - bool: True if the connection was accepted, False if it was refused.
         """
 
-        await websocket.accept() # Accept incoming WebSocket connection (handshake)
-        self.active_connections.append(websocket) # Track active connection
+        user_id = str(user_id) if user_id is not None else None
+        if len(self.active_connections) >= MAX_CONNECTIONS_PER_INSTANCE:
+            metrics.incr("ws.rejected_instance_cap")
+            logger.warning("WebSocket refused: instance connection limit reached")
+            await self.refuse(websocket, 1013) # Try again later
+            return False
+        if user_id is not None and self.user_connections.get(user_id, 0) >= MAX_CONNECTIONS_PER_USER:
+            metrics.incr("ws.rejected_user_cap")
+            logger.warning(f"WebSocket refused: user {user_id} connection limit reached")
+            await self.refuse(websocket, 1008) # Policy violation
+            return False
+
+        # Register before the handshake so concurrent connects see the new counts
+        client = ClientConnection(websocket, user_id)
+        self.active_connections[websocket] = client # Track active connection
+        if user_id is not None:
+            self.user_connections[user_id] = self.user_connections.get(user_id, 0) + 1
+        self.subscribe(websocket, topics)
+        self._update_gauges()
+        try:
+            await websocket.accept() # Accept incoming WebSocket connection (handshake)
+        except Exception:
+            self._remove(websocket)
+            raise
+
+        if since is not None:
+            client.held = [] # Hold live events until the missed ones are queued
+            missed = await self.events_since(since, client.topics)
+            held, client.held = client.held, None
+            if missed is None:
+                metrics.incr("ws.resyncs")
+                self._enqueue(client, encode_event({"type": "resync_required", "data": {"since": since}}))
+                missed = []
+            else:
+                metrics.incr("ws.resumes")
+                metrics.incr("ws.resumed_events", len(missed))
+            for _, payload in missed:
+                self._enqueue(client, payload)
+            client.resumed = {seq for seq, _ in missed} # May still arrive from Redis
+            for payload in held:
+                self._enqueue(client, payload)
+
+        if websocket not in self.active_connections: # Dropped while resuming
+            return False
+        client.writer_task = asyncio.create_task(self._writer(client))
         logger.info("WebSocket connected.")
+        return True
+
+    async def refuse(self, websocket: WebSocket, code: int):
+        """
+        Refuse a connection with a WebSocket close code the client can see.
+
+        Closing before the handshake makes the server answer the upgrade with HTTP 403,
+        so the client only sees a failed connection (close code 1006) and cannot tell a
+        full server from a bad token. The handshake is completed first, then the
+        connection is closed with `code`.
+
+        Parameters:
+        - websocket (WebSocket): Connection not accepted yet.
+        - code (int): Close code, e.g. 1008 (policy violation) or 1013 (try again later).
+        """
+
+        try:
+            await websocket.accept()
+            await websocket.close(code=code)
+        except Exception:
+            pass # Client already gone
 
     async def disconnect(self, websocket: WebSocket):
         """
-        Remove and clean up a WebSocket connection.
+        Remove and clean up a WebSocket connection, stopping its writer task.
 
         Parameters:
         - websocket (WebSocket): The WebSocket connection to remove.
@@ -90,86 +342,518 @@ class RedisWebSocketManager:
         - None
         """
 
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket) # Remove from active connections
+        if self._remove(websocket):
             logger.info("WebSocket disconnected.")
 
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> Set[str]:
+        """
+        Subscribe a connection to topics, ignoring invalid topics and any beyond MAX_TOPICS_PER_CONNECTION.
+
+        Parameters:
+        - websocket (WebSocket): A connected WebSocket.
+        - topics (Iterable[str]): Topics to add.
+
+        Returns:
+        - Set[str]: The connection's topics after subscribing.
+        """
+
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return set()
+        for topic in topics:
+            if len(client.topics) >= MAX_TOPICS_PER_CONNECTION:
+                break
+            if TOPIC_PATTERN.match(topic):
+                client.topics.add(topic)
+                self.subscribers.setdefault(topic, set()).add(client)
+        return client.topics
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> Set[str]:
+        """
+        Unsubscribe a connection from topics.
+
+        Parameters:
+        - websocket (WebSocket): A connected WebSocket.
+        - topics (Iterable[str]): Topics to remove.
+
+        Returns:
+        - Set[str]: The connection's remaining topics.
+        """
+
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return set()
+        for topic in topics:
+            client.topics.discard(topic)
+            self._drop_subscriber(topic, client)
+        return client.topics
+
+    def touch(self, websocket: WebSocket):
+        """
+        Record that a client is alive (call on every message received from it).
+
+        Parameters:
+        - websocket (WebSocket): A connected WebSocket.
+        """
+
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.last_seen = asyncio.get_running_loop().time()
+
+    def send(self, websocket: WebSocket, message: dict):
+        """
+        Queue a message for a single connection (e.g. a reply to a client request).
+
+        Parameters:
+        - websocket (WebSocket): A connected WebSocket.
+        - message (dict): The message payload to send.
+        """
+
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            self._enqueue(client, encode_event(message))
+
+    def _drop_subscriber(self, topic: str, client: ClientConnection):
+        """
+        Remove a client from a topic's index, deleting the topic when it has no subscribers left.
+        """
+
+        subscribers = self.subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self.subscribers[topic]
+
+    def _remove(self, websocket: WebSocket) -> bool:
+        """
+        Unregister a connection and cancel its writer task (unless called from it).
+
+        Returns:
+        - bool: True if the connection was registered.
+        """
+
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return False
+        for topic in client.topics:
+            self._drop_subscriber(topic, client)
+        if client.user_id is not None:
+            remaining = self.user_connections.get(client.user_id, 1) - 1
+            if remaining:
+                self.user_connections[client.user_id] = remaining
+            else:
+                self.user_connections.pop(client.user_id, None)
+        self._update_gauges()
+        if client.writer_task is not None and client.writer_task is not asyncio.current_task():
+            client.writer_task.cancel()
+        return True
+
+    def _update_gauges(self):
+        metrics.set_gauge("ws.connections", len(self.active_connections))
+        metrics.set_gauge("ws.users", len(self.user_connections))
+
+    async def _close_slow_consumer(self, client: ClientConnection, reason: str):
+        """
+        Disconnect a client that cannot keep up and close its socket.
+        """
+
+        self._remove(client.websocket)
+        metrics.incr("ws.slow_consumer_disconnects")
+        logger.warning(f"Disconnecting slow WebSocket client: {reason}")
+        try:
+            await client.websocket.close(code=1013) # Try again later
+        except Exception:
+            pass # Socket already closed
+
+    async def _heartbeat_loop(self):
+        """
+        Every HEARTBEAT_INTERVAL_SECONDS, ping each client and close those that sent
+        nothing for HEARTBEAT_TIMEOUT_SECONDS.
+
+        Clients answer pings with {"action": "pong"}; any message counts as a sign of life.
+        Sockets whose peer vanished without closing would otherwise be kept forever.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            now = loop.time()
+            for websocket, client in list(self.active_connections.items()):
+                if now - client.last_seen <= HEARTBEAT_TIMEOUT_SECONDS:
+                    self._enqueue(client, PING_PAYLOAD)
+                    continue
+                self._remove(websocket) # Unregister now; the close may take a while
+                metrics.incr("ws.heartbeat_timeouts")
+                task = asyncio.create_task(self._close_idle(client))
+                self._closing.add(task) # Keep a reference until the close finishes
+                task.add_done_callback(self._closing.discard)
+
+    async def _close_idle(self, client: ClientConnection):
+        """
+        Close a socket that missed its heartbeats.
+        """
+
+        logger.warning("Closing unresponsive WebSocket client: heartbeat timed out")
+        try:
+            await asyncio.wait_for(client.websocket.close(code=1001), SEND_TIMEOUT_SECONDS) # Going away
+        except Exception:
+            pass # Peer already gone
+
+    async def _writer(self, client: ClientConnection):
+        """
+        Send a client's queued messages in order until it disconnects.
+
+        A send that fails or exceeds SEND_TIMEOUT_SECONDS disconnects the client.
+        """
+
+        try:
+            while True:
+                payload = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(payload), SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            await self._close_slow_consumer(client, "send timed out")
+        except Exception as e:
+            logger.warning(f"WebSocket send failed: {e}")
+            await self.disconnect(client.websocket) # Remove faulty connection
+
+    def _enqueue(self, client: ClientConnection, payload: str):
+        """
+        Queue a message for a client without waiting, applying SLOW_CONSUMER_POLICY if its queue is full.
+        """
+
+        if client.held is not None:
+            client.held.append(payload)
+            return
+        if client.resumed:
+            seq = _payload_seq(payload)
+            if seq in client.resumed:
+                client.resumed.discard(seq) # Already sent on resume
+                return
+        try:
+            client.queue.put_nowait(payload)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if SLOW_CONSUMER_POLICY == "drop_oldest":
+            client.queue.get_nowait() # Make room by discarding the oldest queued message
+            client.queue.put_nowait(payload)
+            metrics.incr("ws.messages_dropped")
+        else:
+            self._remove(client.websocket) # Unregister now so later broadcasts skip it
+            task = asyncio.create_task(self._close_slow_consumer(client, "send queue full"))
+            self._closing.add(task) # Keep a reference until the close finishes
+            task.add_done_callback(self._closing.discard)
+
     async def _redis_listener(self):
         """
-        Background async task that listens to Redis pub/sub channel messages.
+        Background async task that keeps the Redis pub/sub subscription alive.
 
         Behavior:
-        - Subscribes to a Redis channel.
-        - On receiving messages, parses JSON and broadcasts to local WebSocket clients.
-        - Logs warnings and disables Redis if errors occur.
+        - Pattern-subscribes to every topic channel ("ws_broadcast:*") and enables Redis
+          broadcasting, then replays events missed while disconnected (see `_replay_missed`).
+        - Forwards received messages to local subscribers (see `_redis_message`).
+        - When the connection fails or a health check goes unanswered, disables Redis
+          broadcasting (local fallback) and reconnects with jittered exponential backoff.
 
         Returns:
         - None
         """
 
-        try:
+        attempt = 0
+        while True:
             pubsub = self.redis.pubsub() # Create Redis pub/sub interface
-            await pubsub.subscribe(REDIS_CHANNEL)  # Subscribe to broadcast channel
-            logger.info("Subscribed to Redis channel for WebSocket events.")
-
-            async for message in pubsub.listen():
-                # Ignore non-message events (e.g., subscription confirmations)
-                if message is None or message["type"] != "message":
-                    continue # Skip non-message events
+            try:
+                await pubsub.psubscribe(f"{REDIS_CHANNEL}:*") # Subscribe to all topic channels
+                self.redis_enabled = True
+                metrics.set_gauge("ws.redis_connected", 1)
+                logger.info("Subscribed to Redis channels for WebSocket events.")
+                await self._replay_missed()
+                attempt = 0
+                await self._listen(pubsub)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis pub/sub connection lost, broadcasting locally: {e}")
+            finally:
+                self.redis_enabled = False
+                metrics.set_gauge("ws.redis_connected", 0)
                 try:
-                    data = json.loads(message["data"])  # Parse JSON payload
-                    await self._broadcast_local(data) # Broadcast locally 
-                except Exception as e:
-                    logger.warning(f"Redis listener error: {e}")
-        except Exception as e:
-            logger.warning(f"Redis listener stopped: {e}")
-            self.redis_enabled = False # Disable Redis fallback on error
+                    await pubsub.aclose()
+                except Exception:
+                    pass # Connection already broken
+
+            delay = random.uniform(0, min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * 2 ** attempt))
+            attempt += 1
+            metrics.incr("ws.redis_reconnects")
+            await asyncio.sleep(delay)
+
+    async def _listen(self, pubsub):
+        """
+        Forward pub/sub messages until the connection fails.
+
+        After HEALTH_CHECK_INTERVAL_SECONDS without traffic the connection is PINGed; if
+        nothing (not even the PONG) arrives within another interval, it is considered dead.
+
+        Raises:
+        - ConnectionError if a health check goes unanswered, or the client's error if the connection breaks.
+        """
+
+        loop = asyncio.get_running_loop()
+        last_activity = loop.time()
+        awaiting_pong = False
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=HEALTH_CHECK_INTERVAL_SECONDS)
+            if message is None:
+                if loop.time() - last_activity < HEALTH_CHECK_INTERVAL_SECONDS:
+                    continue
+                if awaiting_pong:
+                    raise ConnectionError("Redis health check timed out")
+                await pubsub.ping()
+                awaiting_pong = True
+                last_activity = loop.time()
+                continue
+
+            last_activity = loop.time()
+            awaiting_pong = False
+            if message["type"] != "pmessage":
+                continue # Skip non-message events (e.g., PONG replies)
+            try:
+                self._redis_message(message["channel"], message["data"])
+            except Exception as e:
+                logger.warning(f"Redis listener error: {e}")
+
+    async def _replay_missed(self):
+        """
+        Deliver events from the Redis Stream that were published while this instance was not subscribed.
+
+        Replays entries from REPLAY_SLACK_MS before the last received event onward, skipping
+        events already delivered. On first connect nothing is replayed; the current Redis time
+        becomes the resume point. Logs a gap if the stream no longer holds the resume point.
+        """
 
-    async def _broadcast_local(self, message: dict):
+        if self.last_event_id is None:
+            seconds, microseconds = await self.redis.time()
+            self.last_event_id = f"{seconds * 1000 + microseconds // 1000}-0"
+            return
+
+        ms, _ = _stream_id_key(self.last_event_id)
+        start = f"{max(ms - REPLAY_SLACK_MS, 0)}-0"
+        oldest = await self.redis.xrange(REDIS_STREAM, count=1)
+        if oldest and _stream_id_key(_text(oldest[0][0])) > _stream_id_key(self.last_event_id):
+            metrics.incr("ws.redis_replay_gaps")
+            logger.warning(f"Redis stream no longer holds events after {self.last_event_id}; some were missed")
+
+        replayed = 0
+        async for event_id, topics, payload in self._stream_entries(start):
+            if event_id in self.recent_events:
+                continue # Delivered before the connection dropped
+            self._remember_event(event_id, replayed=True)
+            self._buffer_event(event_id, topics, payload)
+            await self._broadcast_local(payload, topics)
+            replayed += 1
+
+        if replayed:
+            metrics.incr("ws.redis_replayed", replayed)
+            logger.info(f"Replayed {replayed} WebSocket events missed while Redis was disconnected.")
+
+    async def _stream_entries(self, start: str):
         """
-        Send a JSON message to all currently connected WebSocket clients locally.
+        Iterate over the replay stream from `start` (inclusive) in REPLAY_BATCH_SIZE reads.
+
+        Yields:
+        - Tuple[str, List[str], str]: Event ID, topics, and the encoded event with its seq.
+        """
+
+        while True:
+            entries = await self.redis.xrange(REDIS_STREAM, min=start, max="+", count=REPLAY_BATCH_SIZE)
+            for entry_id, fields in entries:
+                event_id = _text(entry_id)
+                header, payload = _text(fields.get(b"data", fields.get("data"))).split("\n", 1)
+                yield event_id, header.split(","), _with_seq(event_id, payload)
+            if len(entries) < REPLAY_BATCH_SIZE:
+                return
+            ms, seq = _stream_id_key(_text(entries[-1][0]))
+            start = f"{ms}-{seq + 1}"
+
+    async def events_since(self, since: str, topics: Iterable[str]) -> Optional[List[Tuple[str, str]]]:
+        """
+        Find the events for the given topics broadcast after a sequence number.
+
+        Reads the Redis Stream when Redis is enabled, else the in-memory replay buffer.
 
         Parameters:
-        - message (dict): The message payload to send.
+        - since (str): Last sequence number the client received.
+        - topics (Iterable[str]): The client's topics.
 
         Returns:
-        - None
+        - List[Tuple[str, str]] | None: (seq, encoded event) pairs in order, or None if the
+          client must resync: `since` is invalid or older than the retained events, or more
+          than MAX_RESUME_EVENTS events were missed.
         """
 
-        # Send message to all active WebSocket clients locally
-        for conn in self.active_connections:
+        try:
+            since_key = _stream_id_key(since)
+        except ValueError:
+            return None
+        topics = set(topics)
+
+        if self.redis_enabled and self.redis:
             try:
-                await conn.send_json(message) # Send JSON message to client
+                oldest = await self.redis.xrange(REDIS_STREAM, count=1)
+                if not oldest or _stream_id_key(_text(oldest[0][0])) > since_key:
+                    return None
+                missed = []
+                async for event_id, event_topics, payload in self._stream_entries(f"{since_key[0]}-{since_key[1] + 1}"):
+                    if topics.intersection(event_topics):
+                        if len(missed) == MAX_RESUME_EVENTS:
+                            return None
+                        missed.append((event_id, payload))
+                return missed
             except Exception as e:
-                logger.warning(f"WebSocket send failed: {e}")
-                await self.disconnect(conn)  # Remove faulty connection
+                logger.warning(f"Reading missed events from Redis failed, using local buffer: {e}")
+
+        if not self.replay_buffer or _stream_id_key(self.replay_buffer[0][0]) > since_key:
+            return None
+        missed = [
+            (seq, payload) for seq, event_topics, payload in self.replay_buffer
+            if _stream_id_key(seq) > since_key and topics.intersection(event_topics)
+        ]
+        return missed if len(missed) <= MAX_RESUME_EVENTS else None
+
+    def _buffer_event(self, seq: str, topics: Iterable[str], payload: str):
+        """
+        Keep an event in the in-memory replay buffer.
+        """
+
+        self.replay_buffer.append((seq, tuple(topics), payload))
+        self._last_seq = max(self._last_seq, _stream_id_key(seq))
+
+    def _next_local_seq(self) -> str:
+        """
+        Sequence number for an event broadcast without Redis, in the same "<ms>-<n>"
+        format as stream IDs and above every seq seen so far.
+        """
+
+        seq = max((int(time.time() * 1000), 0), (self._last_seq[0], self._last_seq[1] + 1))
+        self._last_seq = seq
+        return f"{seq[0]}-{seq[1]}"
+
+    def _remember_event(self, event_id: str, replayed: bool = False):
+        """
+        Record a received event ID, keeping the newest RECENT_EVENT_IDS and the resume point.
+        """
+
+        if event_id not in self.recent_events:
+            self.recent_events[event_id] = replayed
+            if len(self.recent_events) > RECENT_EVENT_IDS:
+                self.recent_events.popitem(last=False)
+        if self.last_event_id is None or _stream_id_key(event_id) > _stream_id_key(self.last_event_id):
+            self.last_event_id = event_id
+
+    def _redis_message(self, channel, data):
+        """
+        Deliver an event received on one topic channel to local subscribers.
+
+        Messages are "<event id>\n<topic>,<topic>...\n<json with seq>". An event with several topics
+        arrives once per topic; a client gets it from the first of the event's topics it is
+        subscribed to, so it is delivered exactly once. Events already delivered by a
+        replay are skipped.
+        """
+
+        channel, data = _text(channel), _text(data)
+        topic = channel[len(REDIS_CHANNEL) + 1:]
+        event_id, header, payload = data.split("\n", 2)
+        if self.recent_events.get(event_id):
+            return # Delivered by the replay after reconnecting
+        topics = header.split(",")
+        if event_id not in self.recent_events:
+            self._remember_event(event_id)
+            self._buffer_event(event_id, topics, payload)
+
+        earlier = topics[:topics.index(topic)] if topic in topics else []
+        for client in list(self.subscribers.get(topic, ())):
+            if not any(t in client.topics for t in earlier):
+                self._enqueue(client, payload)
+
+    async def _broadcast_local(self, payload: str, topics: Iterable[str]):
+        """
+        Queue an encoded JSON message for local subscribers of any of the given topics.
+
+        Never waits on a socket: each client's writer task sends the message. Iterates
+        over snapshots, so clients may connect or disconnect during the broadcast.
+
+        Parameters:
+        - payload (str): The JSON-encoded message, shared by all clients.
+        - topics (Iterable[str]): Topics of the event; each subscriber gets it once.
 
-    async def broadcast(self, message: dict):
+        Returns:
+        - None
         """
-        Broadcast a message to all clients.
 
-        If Redis is enabled, publishes the message to the Redis channel
-        for cross-instance broadcasting. Otherwise, broadcasts locally.
+        delivered = set()
+        for topic in topics:
+            for client in list(self.subscribers.get(topic, ())):
+                if client not in delivered:
+                    delivered.add(client)
+                    self._enqueue(client, payload)
+
+    async def broadcast(self, message: dict, topics: Iterable[str] = (FEED_TOPIC,)):
+        """
+        Broadcast a message to the clients subscribed to any of its topics.
+
+        The message is encoded once; the same JSON text is published to Redis and
+        sent to every socket. If Redis is enabled, appends the message to the replay
+        stream and publishes it to each topic's Redis channel for cross-instance
+        broadcasting. Otherwise, or if publishing fails, broadcasts locally.
+
+        Clients receive the event with a "seq" field: its stream ID, or a local sequence
+        number in the same format when broadcast without Redis.
 
         Parameters:
         - message (dict): The message payload to broadcast.
+        - topics (Iterable[str]): Topics the event belongs to (default: the public feed).
 
         Returns:
         - None
         """
 
+        topics = list(dict.fromkeys(topics)) # Deduplicate, keeping order
+        payload = encode_event(message)
+
         # Publish message to Redis if enabled; else broadcast locally
         if self.redis_enabled and self.redis:
+            event_id = None
             try:
-                # Publish JSON stringified message to Redis channel
-                await self.redis.publish(REDIS_CHANNEL, json.dumps(message))
+                # Append to the replay stream; the entry ID identifies the event on every instance
+                entry = f"{','.join(topics)}\n{payload}"
+                event_id = _text(await self.redis.xadd(
+                    REDIS_STREAM, {"data": entry}, maxlen=STREAM_MAXLEN, approximate=True
+                ))
+                # Publish the ID, topic list and JSON text to each topic's channel in one round trip
+                data = f"{event_id}\n{','.join(topics)}\n{_with_seq(event_id, payload)}"
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for topic in topics:
+                        pipe.publish(f"{REDIS_CHANNEL}:{topic}", data)
+                    await pipe.execute()
                 return
             except Exception as e:
+                metrics.incr("ws.redis_publish_failures")
                 logger.error(f"Redis publish failed, falling back to local: {e}")
-                self.redis_enabled = False  # Disable Redis fallback on failure
+                if event_id is not None:
+                    self._remember_event(event_id, replayed=True) # Don't deliver it again from a replay
+                    payload = _with_seq(event_id, payload)
+                    self._buffer_event(event_id, topics, payload)
+                    await self._broadcast_local(payload, topics)
+                    return
 
         # Fallback: broadcast message locally to active connections
-        await self._broadcast_local(message)
+        seq = self._next_local_seq()
+        payload = _with_seq(seq, payload)
+        self._buffer_event(seq, topics, payload)
+        await self._broadcast_local(payload, topics)
 
 
 # Export a single global instance to be used throughout the app
@@ -0,0 +1,168 @@
+"""
+Size-capped, chunked reading of uploaded images.
+
+Starlette spools multipart file parts to a temporary file once they pass 1 MB, so
+an upload is never held in memory before the route reads it. The whole multipart
+body is capped at MAX_UPLOAD_BODY_BYTES before it is parsed
+(`utils/middleware.UploadSizeLimitMiddleware`), so an oversized upload is never
+spooled either. This module then reads the image from the spool with a hard byte cap:
+- The file's size (known once spooled) is checked first, so oversized uploads are
+  rejected without reading a single byte.
+- The image type is sniffed from the first bytes (magic numbers), not trusted from
+  the client's Content-Type, and non-images are rejected before the body is read.
+- The accepted file is read in one allocation of its exact size; if the size is
+  unknown it is read in CHUNK_SIZE pieces and reading stops as soon as the byte
+  cap is passed.
+
+Post images are not read into memory at all: `spool_image_upload()` copies them to a
+file in MEDIA_SPOOL_DIR, which the background media workers (`utils/media_jobs.py`)
+upload from. With several backend instances, MEDIA_SPOOL_DIR must be shared storage
+(e.g. a network volume), since any instance's workers may claim a job.
+"""
+
+import asyncio
+import os
+import tempfile
+from uuid import uuid4
+from fastapi import HTTPException, UploadFile
+from utils.cloudinary import MAX_IMAGE_SIZE_BYTES
+
+CHUNK_SIZE = 64 * 1024 # 64KB
+SNIFF_BYTES = 12 # Enough to identify every accepted format
+FORM_FIELDS_MAX_BYTES = 64 * 1024 # Multipart framing and text fields sent along with an image
+MAX_UPLOAD_BODY_BYTES = MAX_IMAGE_SIZE_BYTES + FORM_FIELDS_MAX_BYTES # Multipart request body cap
+MEDIA_SPOOL_DIR = os.getenv("HOBBYMATCH_MEDIA_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "hobbymatch_media"))
+
+# Leading bytes of each accepted image format
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+
+def sniff_image_type(head: bytes) -> str | None:
+    """
+    Detect an image format from its first bytes.
+
+    Parameters:
+    - head (bytes): At least the first 12 bytes of the file.
+
+    Returns:
+    - str | None: MIME type (jpeg, png, gif or webp), or None if not a supported image.
+    """
+
+    for signature, mime in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+def image_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Image too large (max {max_bytes / (1024 * 1024):.1f} MB)")
+
+async def check_image_upload(file: UploadFile, max_bytes: int):
+    """
+    Reject an upload whose spooled size exceeds `max_bytes` or that is not an image,
+    leaving the file positioned at its start.
+
+    Raises:
+    - HTTPException 400 if the file is empty.
+    - HTTPException 413 if the file exceeds `max_bytes`.
+    - HTTPException 415 if the file is not a JPEG, PNG, GIF or WebP image.
+    """
+
+    if file.size is not None and file.size > max_bytes:
+        raise image_too_large(max_bytes)
+
+    head = await file.read(SNIFF_BYTES)
+    if not head:
+        raise HTTPException(status_code=400, detail="Empty image file")
+    if sniff_image_type(head) is None:
+        raise HTTPException(status_code=415, detail="Unsupported image type (use JPEG, PNG, GIF or WebP)")
+    await file.seek(0)
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MAX_IMAGE_SIZE_BYTES) -> bytes:
+    """
+    Read an uploaded image in chunks, enforcing the size cap and image type.
+
+    Parameters:
+    - file (UploadFile): Uploaded file part.
+    - max_bytes (int): Maximum accepted size (default MAX_IMAGE_SIZE_BYTES).
+
+    Returns:
+    - bytes: The image contents.
+
+    Raises:
+    - HTTPException 413 if the file exceeds `max_bytes`.
+    - HTTPException 415 if the file is not a JPEG, PNG, GIF or WebP image.
+    """
+
+    await check_image_upload(file, max_bytes)
+    too_large = image_too_large(max_bytes)
+
+    # Spooled size known and within the cap: read it in one allocation, no chunk copies
+    if file.size is not None:
+        data = await file.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise too_large
+        return data
+
+    chunks, received = [], 0
+    while chunk := await file.read(CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def _copy_capped(source, path: str, max_bytes: int) -> bool:
+    """
+    Copy a file object to `path` in chunks; return False (and remove `path`) once `max_bytes` is passed.
+    """
+
+    received = 0
+    with open(path, "xb") as target:
+        while chunk := source.read(CHUNK_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                break
+            target.write(chunk)
+    if received > max_bytes:
+        os.remove(path)
+        return False
+    return True
+
+async def spool_image_upload(file: UploadFile, max_bytes: int = MAX_IMAGE_SIZE_BYTES) -> str:
+    """
+    Copy an uploaded image into MEDIA_SPOOL_DIR, enforcing the size cap and image type.
+
+    The copy runs in a worker thread, in CHUNK_SIZE pieces, so neither the event loop
+    nor memory holds the image.
+
+    Parameters:
+    - file (UploadFile): Uploaded file part.
+    - max_bytes (int): Maximum accepted size (default MAX_IMAGE_SIZE_BYTES).
+
+    Returns:
+    - str: Name of the spooled file within MEDIA_SPOOL_DIR (see `spool_path()`).
+
+    Raises:
+    - HTTPException 413 if the file exceeds `max_bytes`.
+    - HTTPException 415 if the file is not a JPEG, PNG, GIF or WebP image.
+    """
+
+    await check_image_upload(file, max_bytes)
+    name = uuid4().hex
+    os.makedirs(MEDIA_SPOOL_DIR, exist_ok=True)
+    if not await asyncio.to_thread(_copy_capped, file.file, spool_path(name), max_bytes):
+        raise image_too_large(max_bytes)
+    return name
+
+def spool_path(name: str) -> str:
+    """
+    Return the path of a spooled image file.
+    """
+
+    return os.path.join(MEDIA_SPOOL_DIR, name)
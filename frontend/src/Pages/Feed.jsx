@@ -1,12 +1,14 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import PostCard from "../components/PostCard";
 import { fetchAllHobbies } from "../services/API/hobby";
-import {createFeedWebSocket} from "../services/functions/websocket";
+import { fetchPublicFeed } from "../services/API/posts";
+import {createFeedWebSocket, subscribeToPosts} from "../services/functions/websocket";
 import "./Feed.css";
 
 /**
  * Feed component displays the main posts feed for the user.
- * It fetches all hobbies, fetches posts, listens for real-time updates via WebSocket,
+ * It fetches all hobbies, fetches posts page by page (the next page loads when the user
+ * scrolls to the bottom or clicks "Load more"), listens for real-time updates via WebSocket,
  * and supports refreshing individual posts upon reactions or comments.
  *
  * @param {Object} props
@@ -18,8 +20,12 @@ import "./Feed.css";
 export default function Feed({ user, token }) {
   const [posts, setPosts] = useState(null);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const [hobbyMap, setHobbyMap] = useState({});
+  const socketRef = useRef(null);
+  const loadingMoreRef = useRef(false); // Guards against scroll events firing while a page loads
 
   useEffect(() => {
   /**
@@ -43,28 +49,71 @@ export default function Feed({ user, token }) {
   }, []);
 
   /**
-   * Fetches posts feed data from backend API and updates state.
+   * Fetches the first page of the feed from backend API and replaces the loaded posts.
    * On error, sets the error state to display an error message.
    */
   async function fetchFeed() {
     try {
-      const res = await fetch("http://localhost:8000/posts/feed");
-      if (!res.ok) throw new Error("Failed to load feed");
-      const data = await res.json();
-      setPosts(data);
+      const data = await fetchPublicFeed();
+      setPosts(data.items);
+      setNextCursor(data.next_cursor);
+      // Receive comment and reaction updates for the loaded posts
+      if (socketRef.current) {
+        subscribeToPosts(socketRef.current, data.items.map((p) => p.id));
+      }
     } catch (err) {
       setError(err.message);
     }
   }
 
+  /**
+   * Fetches the next page of the feed and appends it to the loaded posts.
+   * Does nothing while a page is loading or when the last page has been reached.
+   */
+  async function loadMore() {
+    if (!nextCursor || loadingMoreRef.current) return;
+    loadingMoreRef.current = true;
+    setLoadingMore(true);
+    try {
+      const data = await fetchPublicFeed(nextCursor);
+      // Skip posts already shown (e.g. received over the WebSocket)
+      setPosts((prevPosts) => {
+        const seen = new Set(prevPosts.map((p) => p.id));
+        return [...prevPosts, ...data.items.filter((p) => !seen.has(p.id))];
+      });
+      setNextCursor(data.next_cursor);
+      if (socketRef.current) {
+        subscribeToPosts(socketRef.current, data.items.map((p) => p.id));
+      }
+    } catch (err) {
+      console.error("Failed to load more posts:", err);
+    } finally {
+      loadingMoreRef.current = false;
+      setLoadingMore(false);
+    }
+  }
+
+  /**
+   * Loads the next page when the feed is scrolled close to its bottom.
+   *
+   * @param {UIEvent} event - Scroll event of the feed container.
+   */
+  function handleScroll(event) {
+    const { scrollTop, scrollHeight, clientHeight } = event.currentTarget;
+    if (scrollHeight - scrollTop - clientHeight < 300) {
+      loadMore();
+    }
+  }
+
   // On mount: fetch initial feed and setup WebSocket for real-time post updates
   useEffect(() => {
+    const feed = createFeedWebSocket(token, { setPosts, onResync: fetchFeed });
+    socketRef.current = feed;
     fetchFeed();
-    const socket = createFeedWebSocket(token, { setPosts, refreshPostById });
 
     // Cleanup WebSocket connection on unmount
     return () => {
-      socket.close();
+      feed.close();
     };
   }, []);
 
@@ -114,9 +163,9 @@ export default function Feed({ user, token }) {
     );
   }
 
-  // Render each post
+  // Render each post, then the next-page control
   return (
-    <main className="feed-container">
+    <main className="feed-container" onScroll={handleScroll}>
       {posts.map((post) => (
         <PostCard
           key={post.id}
@@ -127,6 +176,11 @@ export default function Feed({ user, token }) {
           hobbyMap={hobbyMap}
         />
       ))}
+      {nextCursor && (
+        <button className="feed-load-more" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? "Loading..." : "Load more"}
+        </button>
+      )}
     </main>
   );
 }
@@ -44,11 +44,13 @@ export async function createPost({
 }
 
 /**
- * Fetch the public feed of posts.
- * @returns {Promise<object[]>} Array of public post objects.
+ * Fetch a page of the public feed of posts.
+ * @param {string|null} [cursor] - `next_cursor` from the previous page, or null for the first page.
+ * @returns {Promise<{items: object[], next_cursor: string|null}>} Page of public post objects.
  */
-export async function fetchPublicFeed() {
-  const response = await fetch(`${POSTS_URL}/feed`);
+export async function fetchPublicFeed(cursor = null) {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const response = await fetch(`${POSTS_URL}/feed${query}`);
   if (!response.ok) throw new Error("Failed to fetch feed");
   return await response.json();
 }
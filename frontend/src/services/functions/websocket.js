@@ -4,52 +4,164 @@
  * @param {string} token - Firebase authentication token for user authorization.
  * @param {Object} handlers - Object containing handler functions for feed updates.
  * @param {function} handlers.setPosts - Function to update the list of posts in state.
- * @param {function} handlers.refreshPostById - Function to refresh a single post by its ID.
+ * @param {function} handlers.onResync - Function to refetch the feed when missed events are no longer available.
  *
- * @returns {WebSocket} The WebSocket instance connected to the feed.
+ * @returns {Object} Feed connection: `socket` (the current WebSocket), `close()`, and its subscription state.
  *
  * @description
  * Establishes a WebSocket connection to receive real-time feed events such as new posts,
  * comments, reactions, and post deletions. Updates are applied via the provided handler functions.
+ * The socket starts subscribed to the "feed" topic; comment and reaction events are only sent
+ * for posts subscribed to with `subscribeToPosts`, which happens automatically for new posts.
+ * If the connection drops, it reconnects with backoff, passing the last event sequence number
+ * so the server sends only the missed events (or "resync_required", which calls `onResync`).
+ * A connection refused with close code 1008 (policy violation) is not retried.
  */
-export function createFeedWebSocket(token, { setPosts, refreshPostById }) {
-  const socket = new WebSocket(`ws://localhost:8000/ws/feed?token=${token}`);
+export function createFeedWebSocket(token, { setPosts, onResync }) {
+  const feed = { socket: null, lastSeq: null, postTopics: new Set(), closed: false };
+  let retries = 0;
 
-  socket.onopen = () => console.log("WebSocket connected");
-  socket.onerror = (e) => console.error("WebSocket error:", e);
-  socket.onclose = () => console.log("WebSocket disconnected");
+  const connect = () => {
+    const topics = ["feed", ...feed.postTopics].join(",");
+    const since = feed.lastSeq ? `&since=${feed.lastSeq}` : "";
+    const socket = new WebSocket(`ws://localhost:8000/ws/feed?token=${token}&topics=${topics}${since}`);
+    feed.socket = socket;
+
+    socket.onopen = () => console.log("WebSocket connected");
+    socket.onerror = (e) => console.error("WebSocket error:", e);
+    socket.onclose = (event) => {
+      console.log("WebSocket disconnected", event.code);
+      if (event.code === 1008) {
+        // Refused by policy (bad token or too many connections): retrying cannot help
+        feed.closed = true;
+      }
+      if (!feed.closed) {
+        // Reconnect with jittered exponential backoff (at most 30s); refused connections
+        // (1013, try again later) are opened and then closed, so the backoff is only reset
+        // once the server has sent something
+        setTimeout(connect, Math.random() * Math.min(30000, 1000 * 2 ** retries++));
+      }
+    };
+    socket.onmessage = (event) => {
+      retries = 0;
+      handleMessage(JSON.parse(event.data));
+    };
+  };
+
+  feed.close = () => {
+    feed.closed = true;
+    feed.socket.close();
+  };
 
   /**
    * Handles incoming WebSocket messages from the feed.
-   * @param {MessageEvent} event - WebSocket message event containing a JSON payload.
+   * @param {Object} message - Parsed JSON message.
    *
    * @description
-   * Parses the message payload and applies the corresponding update to the UI.
+   * Records the message's sequence number, then applies the corresponding update to the UI.
    * Supported message types are:
    * - "new_post": add new post to the top of the list
-   * - "new_comment" or "new_reaction": refresh the post with the given ID
-   * - "delete_post": remove the post with the given ID from the list
-   * All other message types are ignored.
+   * - "new_comment": append the comment to its post's thread
+   * - "post_stats": replace a post's reaction and comment counts with the current ones
+   * - "delete_posts": remove the posts with the given IDs from the list
+   * - "image_ready" or "image_failed": update the image of a post created in the pending_image state
+   * - "resync_required": events were missed and are no longer available; refetch the feed
+   * - "ping": heartbeat from the server; answered with a pong so the connection is kept open
+   * All other message types (e.g. "subscriptions" acknowledgements) are ignored.
    */
-  socket.onmessage = (event) => {
-    const message = JSON.parse(event.data);
+  const handleMessage = (message) => {
+    if (message.seq) {
+      feed.lastSeq = message.seq;
+    }
     switch (message.type) {
       case "new_post":
         setPosts((prev) => [message.data, ...prev]);
+        subscribeToPosts(feed, [message.data.id]);
         break;
       case "new_comment":
-      case "new_reaction":
-        refreshPostById(message.data.post_id);
+        setPosts((prev) =>
+          prev.map((p) =>
+            p.id === message.data.post_id && !p.comments?.some((c) => c.id === message.data.id)
+              ? { ...p, comments: [...(p.comments || []), message.data] }
+              : p
+          )
+        );
+        break;
+      case "post_stats":
+        setPosts((prev) =>
+          prev.map((p) =>
+            p.id === message.data.post_id
+              ? { ...p, reaction_counts: message.data.reactions, comment_count: message.data.comments }
+              : p
+          )
+        );
+        break;
+      case "delete_posts": {
+        const deleted = new Set(message.data.post_ids);
+        const topics = message.data.post_ids.map((id) => `post:${id}`);
+        setPosts((prev) => prev.filter((p) => !deleted.has(p.id)));
+        topics.forEach((topic) => feed.postTopics.delete(topic));
+        sendSubscription(feed.socket, "unsubscribe", topics);
+        break;
+      }
+      case "image_ready":
+        setPosts((prev) =>
+          prev.map((p) =>
+            p.id === message.data.post_id
+              ? { ...p, image_url: message.data.image_url, image_status: "ready" }
+              : p
+          )
+        );
+        break;
+      case "image_failed":
+        setPosts((prev) =>
+          prev.map((p) => (p.id === message.data.post_id ? { ...p, image_status: "failed" } : p))
+        );
+        break;
+      case "ping":
+        feed.socket.send(JSON.stringify({ action: "pong" }));
         break;
-      case "delete_post":
-        setPosts((prev) => prev.filter((p) => p.id !== message.data.post_id));
+      case "resync_required":
+        feed.lastSeq = null;
+        onResync();
         break;
       default:
         break;
     }
   };
 
-  return socket;
+  connect();
+  return feed;
+}
+
+/**
+ * Sends a subscribe/unsubscribe request for topics, waiting for the socket to open if needed.
+ *
+ * @param {WebSocket} socket - The feed connection's current WebSocket.
+ * @param {"subscribe"|"unsubscribe"} action - Subscription change to make.
+ * @param {string[]} topics - Topics such as "feed", "hobby:<id>" or "post:<id>".
+ */
+function sendSubscription(socket, action, topics) {
+  const send = () => socket.send(JSON.stringify({ action, topics }));
+  if (socket.readyState === WebSocket.OPEN) {
+    send();
+  } else if (socket.readyState === WebSocket.CONNECTING) {
+    socket.addEventListener("open", send, { once: true });
+  }
+}
+
+/**
+ * Subscribes to comment and reaction events for the given posts.
+ *
+ * @param {Object} feed - Feed connection created by `createFeedWebSocket`.
+ * @param {string[]} postIds - IDs of the posts being displayed.
+ */
+export function subscribeToPosts(feed, postIds) {
+  const topics = postIds.map((id) => `post:${id}`);
+  topics.forEach((topic) => feed.postTopics.add(topic)); // Restored on reconnect
+  if (topics.length > 0) {
+    sendSubscription(feed.socket, "subscribe", topics);
+  }
 }
 
 // TODO: When scaling beyond feed updates, consider replacing this with a generic `createAppWebSocket` function.